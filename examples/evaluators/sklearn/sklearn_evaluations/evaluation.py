@@ -15,16 +15,30 @@
 #
 ##############################################################################
 
-import importlib
+import itertools
+import multiprocessing
 import os
+import pickle
+import traceback
 import numpy as np
 import json
 import time
+from collections import deque, OrderedDict
+from multiprocessing import shared_memory
 
+import pandas
+import scipy
+import scipy.sparse
+import sklearn
 from sklearn.preprocessing import MultiLabelBinarizer
 
 from mistk.evaluation.abstract_evaluation_plugin import AbstractEvaluationPlugin
+from mistk.evaluation.plugin_manager import resolve_metric
 from mistk.evaluation.util.convert import csv_Predictions_to_DataFrame, csv_Groundtruth_to_DataFrame
+from mistk.evaluation.util.align import align_predictions
+from mistk.evaluation.util.matrix import build_confidence_matrix
+from mistk.evaluation.util.leaderboard import set_names, write_leaderboard
+from mistk.evaluation.util.accumulate import accumulates, accumulate_metrics
 from mistk import logger
 
 class SklearnEvaluation (AbstractEvaluationPlugin):
@@ -46,169 +60,611 @@ class SklearnEvaluation (AbstractEvaluationPlugin):
         :param ground_truth_path: The directory path where the ground_truth.csv file is located
         :param evaluation_path: A directory path to where the evaluation.json output file will be stored
         :param properties: A dictionary of key value pairs for evaluation plugin arguments. 
+            'metric_workers' sets the number of worker processes computing metrics in 
+            parallel (defaults to 1, computing the metrics in this process) and 
+            'metric_timeout' the time, in seconds, after which a metric is abandoned 
+            (defaults to no timeout).  With a timeout, metrics are computed by worker 
+            processes even if there is a single worker.
+            'sparse' keeps the label and confidence matrices of multiclass and multilabel 
+            assessments in scipy.sparse form (defaults to false).
+            'cache' set to false neither reuses nor stores the inputs and metric results 
+            cached from evaluations of the same files (defaults to true).
+            'incremental' set to true streams the files in chunks of 'chunk_size' rows 
+            (defaults to 100000) to compute the metrics which can be accumulated, such as 
+            accuracy, precision, recall, F-scores, confusion matrices and regression errors, 
+            with bounded memory.  The other metrics are computed from the files loaded at once.
+        :returns: The path of the JSON file of the results
         """
+        eval_dict, = self._evaluate_sets(assessment_type, metrics, [input_data_path], 
+                                         evaluation_input_format, ground_truth_path, properties)
+        return _write_results(eval_dict, evaluation_path)
+            
+    def do_evaluate_batch(self, assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, evaluation_path, properties):
+        """
+        Performs metrics' evaluation of several prediction sets against the same ground truth. 
+        The ground truth is read once and the metrics of all the sets are computed in parallel. 
+        Stores the assessment results of each set as a JSON file in a sub directory of the 
+        evaluation_path named after the set, along with a leaderboard.json file combining them.
+        
+        :param assessment_type: The evaluation assessment type. One of {'BinaryClassification', 
+            'MultilabelClassification', 'MulticlassClassification', 'Regression'}
+        :param metrics: Specific metrics to evaluate against instead of all metrics defined by assessment_type
+        :param input_data_paths: Paths to the input data of each prediction set
+        :param evaluation_input_format: The format of the input data
+        :param ground_truth_path: The directory path where the ground_truth.csv file is located
+        :param evaluation_path: A directory path to where the output files will be stored
+        :param properties: A dictionary of key value pairs for evaluation plugin arguments, 
+            as described by do_evaluate
+        """
+        eval_dicts = self._evaluate_sets(assessment_type, metrics, input_data_paths, 
+                                         evaluation_input_format, ground_truth_path, properties)
+        sets = []
+        for name, input_data_path, eval_dict in zip(set_names(input_data_paths), input_data_paths, eval_dicts):
+            # the layout of the default do_evaluate_batch, a directory per set
+            set_path = os.path.join(evaluation_path, name)
+            os.makedirs(set_path, exist_ok=True)
+            sets.append((name, input_data_path, _write_results(eval_dict, set_path), eval_dict))
+        
+        filename = write_leaderboard(evaluation_path, sets, assessment_type, ground_truth_path)
+        logger.info("Wrote leaderboard to " + filename)
+    
+    def _evaluate_sets(self, assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, properties):
+        """
+        Evaluates the metrics of prediction sets against the same ground truth.  The ground 
+        truth is read at most once, and the metrics of all the sets run in the same worker pool.
+        The metrics of a set are submitted as soon as the set is read, and at most 
+        _PENDING_SETS sets are read ahead of the set whose results are being collected.
+        
+        :returns: The list of the dictionaries of metric results of each set
+        """
+        properties = properties or {}
+        sparse = str(properties.get('sparse', False)).lower() == 'true'
+        cache = self.cache if str(properties.get('cache', True)).lower() == 'true' else None
+        incremental = str(properties.get('incremental', False)).lower() == 'true'
+        chunk_size = int(properties.get('chunk_size') or _CHUNK_SIZE)
         if evaluation_input_format not in "predictions":
             msg = "EvaluationInputFormat %s is not supported by this Metric Evaluator, only 'predictions' are supported" % evaluation_input_format
             logger.error(msg)
             raise Exception(msg)
  
-        # load prediction results
-        full_predictions_path = os.path.join(input_data_path, "predictions.csv")
-        results_df = csv_Predictions_to_DataFrame(full_predictions_path)
-        
-        # load ground truth
         full_ground_truth_path = os.path.join(ground_truth_path, "ground_truth.csv")
-        truth_df = csv_Groundtruth_to_DataFrame(full_ground_truth_path)
+        truth_hash = None
+        if cache and cache.enabled:
+            truth_hash = cache.file_hash(full_ground_truth_path)
         
-        # match ground truth to results by id 
-        truth_df = truth_df.loc[truth_df['rowid'].isin(results_df['rowid'])]
-            
-        # sort the rows by id
-        results_df.sort_values(by='rowid', inplace=True)
-        truth_df.sort_values(by='rowid', inplace=True)
+        truth = []
+        def load_truth():
+            """
+            Loads the ground truth on first use, shared by all the prediction sets
+            """
+            if not truth:
+                truth.append(csv_Groundtruth_to_DataFrame(full_ground_truth_path))
+            return truth[0]
         
         logger.debug('Running for metrics %s' % metrics)
-            
-        if assessment_type == "MultilabelClassification" or assessment_type == "MulticlassClassification":
-            # create matrices for labels and confidence
-            label_mlb = MultiLabelBinarizer()
-            parsed_truth_labels = (truth_df['labels'].str.split().values.tolist()
-                                   if truth_df['labels'].dtype == 'object' 
-                                   else np.array(np.transpose(np.matrix(truth_df['labels'].values))))
-            parsed_results_labels = (results_df['labels'].str.split().values.tolist()
-                                     if results_df['labels'].dtype == 'object' 
-                                     else np.array(np.transpose(np.matrix(results_df['labels'].values))))
-            label_mlb.fit(np.append(parsed_truth_labels, parsed_results_labels, axis=0))
-            truth_labels_matrix = label_mlb.transform(parsed_truth_labels)
-            results_labels_matrix = label_mlb.transform(parsed_results_labels)
-            
-            if 'confidence' in results_df and not results_df['confidence'].hasnans:
-                parsed_confidence = (results_df['confidence'].str.split().values.tolist()
-                                     if results_df['confidence'].dtype == 'object' 
-                                     else np.array(np.transpose(np.matrix(results_df['confidence'].values))))
-                confidence_matrix = np.empty(results_labels_matrix.shape)
-                label_classes = label_mlb.classes_.tolist()
-                for row_index, row in enumerate(parsed_results_labels):
-                    confidence_row = np.zeros(results_labels_matrix.shape[1])
-                    for col_index, col in enumerate(row):
-                        label_pos = label_classes.index(col)
-                        confidence_row[label_pos] = np.float64(parsed_confidence[row_index][col_index])  #pylint: disable=no-member
-                    confidence_matrix[row_index] = confidence_row
-        elif assessment_type == "Regression":
-            if truth_df['labels'].dtype == 'object':
-                truth_labels_matrix = truth_df['labels'].str.split().values.tolist()
-                for index, item in enumerate(truth_labels_matrix):
-                    truth_labels_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
-            else:
-                truth_labels_matrix = truth_df['labels'].values
-                
-            if results_df['labels'].dtype == 'object':
-                results_labels_matrix = results_df['labels'].str.split().values.tolist()
-                for index, item in enumerate(results_labels_matrix):
-                    results_labels_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
-            else:
-                results_labels_matrix = results_df['labels'].values
-                
-            if results_df['confidence'].dtype == 'object':
-                confidence_matrix = results_df['confidence'].str.split().values.tolist()
-                for index, item in enumerate(confidence_matrix):
-                    confidence_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
-            else:
-                confidence_matrix = results_df['confidence'].values
-        else:
-            truth_labels_matrix = (truth_df['labels'].str.split().values.tolist()
-                                   if truth_df['labels'].dtype == 'object' 
-                                   else truth_df['labels'].values)
-            results_labels_matrix = (results_df['labels'].str.split().values.tolist() 
-                                     if results_df['labels'].dtype == 'object' 
-                                     else results_df['labels'].values)
-            confidence_matrix = (results_df['confidence'].str.split().values.tolist() 
-                                 if results_df['confidence'].dtype == 'object' 
-                                 else results_df['confidence'].values)
-    
-        eval_dict = {}
-        modules_cache = {}
-        
-        for counter, metric in enumerate(metrics):
-            logger.info(metric.package + " : " +  metric.method)
-            if metric.package not in modules_cache:
-                module = None
-                name = metric.package
-                try:
-                    importlib.invalidate_caches()
-                    module = importlib.import_module(name)
-                except Exception:
-                    logger.exception("Exception importing plugin module " + name)
-                if module:
-                    modules_cache[metric.package] = module
-                else:
-                    logger.warn("Cannot load " + metric.package)
+        methods = _resolve_methods(metrics)
+        
+        workers = int(properties.get('metric_workers') or 1)
+        timeout = float(properties['metric_timeout']) if properties.get('metric_timeout') else None
+        
+        eval_dicts = []
+        # the sets whose metrics are being computed, of which at most _PENDING_SETS are 
+        # held at once so the inputs of every set are not in memory together
+        pending = deque()
+        with _MetricRunner(workers, timeout) as runner:
+            for input_data_path in input_data_paths:
+                if len(pending) >= _PENDING_SETS:
+                    eval_dicts.append(_eval_dict(runner, *pending.popleft(), assessment_type, cache))
+                pending.append(self._submit_set(runner, assessment_type, methods, input_data_path, 
+                                                full_ground_truth_path, load_truth, truth_hash, 
+                                                cache, sparse, incremental, chunk_size))
+            while pending:
+                eval_dicts.append(_eval_dict(runner, *pending.popleft(), assessment_type, cache))
+        return eval_dicts
+    
+    def _submit_set(self, runner, assessment_type, methods, input_data_path, full_ground_truth_path, 
+                    load_truth, truth_hash, cache, sparse, incremental, chunk_size):
+        """
+        Evaluates the metrics of a prediction set which are cached or accumulated, and 
+        submits the others to the metric runner
+        
+        :returns: The (entries, label_classes, pending) of the set, where entries are the 
+            (metric, metric_key, result) of each metric, the result being None for the 
+            metrics submitted, and pending the jobs submitted
+        """
+        full_predictions_path = os.path.join(input_data_path, "predictions.csv")
+        
+        # the matrices computed from the same files are reused from the cache
+        inputs_key = classes_key = label_classes = None
+        if truth_hash:
+            inputs_key = cache.key(cache.file_hash(full_predictions_path), 
+                                   truth_hash, assessment_type, sparse, _LIBRARY_VERSIONS)
+            classes_key = cache.key(inputs_key, 'label_classes')
+        
+        entries = []
+        accumulated = []
+        remaining = []
+        inputs = None
+        jobs = []
+        for metric, method in methods:
+            parameters = metric.data_parameters
+            metric_key = None
+            if inputs_key:
+                metric_key = cache.key(inputs_key, metric.package + '.' + metric.method, 
+                                       metric.default_args, 
+                                       [parameters.truth_labels, parameters.truth_bounds, 
+                                        parameters.prediction_labels, parameters.prediction_scores, 
+                                        parameters.prediction_bounds])
+                cached = cache.get(metric_key)
+                if cached is not None:
+                    logger.debug("Using cached result of " + metric.method)
+                    entries.append((metric, None, ('ok', cached)))
                     continue
+            if incremental and accumulates(assessment_type, metric):
+                accumulated.append((len(entries), metric, metric_key))
             else:
-                logger.debug("Loading cached module")
-                module = modules_cache[metric.package]
-                        
-            if hasattr(module, metric.method):
-                logger.debug("Calling " + metric.method + " in " + metric.package)
-                method = getattr(module, metric.method)
-                
-                args = metric.default_args or {}
-                if metric.data_parameters.truth_labels:
-                    args[metric.data_parameters.truth_labels] = truth_labels_matrix
-                        
-                if metric.data_parameters.truth_bounds and not truth_df['bounds'].hasnans:
-                    args[metric.data_parameters.truth_bounds] = truth_df['bounds'].values
-                    
-                if metric.data_parameters.prediction_labels:
-                    args[metric.data_parameters.prediction_labels] = results_labels_matrix
-                        
-                if metric.data_parameters.prediction_scores and 'confidence' in results_df and not results_df['confidence'].hasnans:           
-                    args[metric.data_parameters.prediction_scores] = confidence_matrix
-                    
-                if metric.data_parameters.prediction_bounds and not results_df['bounds'].hasnans:
-                    args[metric.data_parameters.prediction_bounds] = results_df['bounds'].values
-                                            
-                try:
-                    evalResult = method(**args)
-                except Exception:
-                    logger.error("Something bad happened calling " + metric.method, exc_info=True)
-                else:
-                    logger.debug("Result is " + str(evalResult))
-                    if isinstance(evalResult, np.ndarray):
-                        # convert to native types
-                        evalResultAsList = evalResult.tolist()
-                        if assessment_type == "MultilabelClassification" or assessment_type == "MulticlassClassification":
-                            # map labels to their values in the results
-                            label_classes = label_mlb.classes_.tolist()
-                            if len(evalResultAsList) == len(label_classes):
-                                evalResultAsDict = {}
-                                for index, label in enumerate(label_classes):
-                                    evalResultAsDict[str(label)] = evalResultAsList[index]
-                                eval_dict[metric.object_info.name] = evalResultAsDict
-                            else:
-                                eval_dict[metric.object_info.name] = evalResultAsList
-                        else:
-                            eval_dict[metric.object_info.name] = evalResultAsList
-                    elif isinstance(evalResult, np.generic):
-                        # convert to native type
-                        evalResultAsScalar = np.asscalar(evalResult)
-                        eval_dict[metric.object_info.name] = evalResultAsScalar
-                    elif isinstance(evalResult, tuple) or isinstance(evalResult, list):
-                        # kind of a cheat to cover the case where a native type has numpy elements
-                        # which some scikit-learn methods inexplicably return
-                        eval_dict[metric.object_info.name] = np.array(evalResult).tolist()
-                    else:
-                        eval_dict[metric.object_info.name] = evalResult
+                remaining.append((len(entries), metric, method, metric_key))
+            entries.append(None)
+        
+        if accumulated:
+            # the files are streamed in chunks rather than loaded at once
+            logger.info("Accumulating %d metrics in chunks of %d rows" % (len(accumulated), chunk_size))
+            results, label_classes = accumulate_metrics(assessment_type, [metric for _, metric, _ in accumulated], 
+                                                        full_predictions_path, full_ground_truth_path, chunk_size)
+            for (index, metric, metric_key), result in zip(accumulated, results):
+                if result[0] == 'ok' and metric_key:
+                    cache.put(metric_key, result[1])
+                entries[index] = (metric, None, result)
+            if classes_key:
+                cache.put(classes_key, label_classes)
+        elif classes_key and not remaining:
+            # all the results are cached, as are the classes they are reported by
+            label_classes = cache.get(classes_key, _NOT_CACHED)
+        
+        if remaining or label_classes is _NOT_CACHED:
+            # the matrices computed from the same files are reused from the cache
+            inputs = cache.get(inputs_key) if inputs_key else None
+            if inputs is None:
+                inputs = _prepare_inputs(assessment_type, full_predictions_path, load_truth(), sparse)
+                if inputs_key:
+                    cache.put(inputs_key, inputs)
             else:
-                logger.warn(metric.method + " does not exist in " + metric.package)  
-                
-            logger.info("Completed metric " + str(counter + 1))
-                
-        eval_dict_json = json.dumps(eval_dict, indent=2) 
-        filename = evaluation_path + "/eval_results_" + str(int(time.time())) + ".json"
-        logger.info("Writing eval results to " + filename) 
-        with open(filename, mode='w') as writer:
-            writer.write(eval_dict_json)
+                logger.info("Using cached evaluation inputs of " + input_data_path)
+            label_classes = inputs['label_classes']
+            if classes_key:
+                cache.put(classes_key, label_classes)
+            
+            for index, metric, method, metric_key in remaining:
+                entries[index] = (metric, metric_key, None)
+                jobs.append((metric, method, _input_names(metric, inputs)))
+        return entries, label_classes, runner.submit(inputs, jobs)
     
     def do_terminate(self):
         AbstractEvaluationPlugin.do_terminate(self)
+
+# the default number of rows read at once by incremental evaluations
+_CHUNK_SIZE = 100000
+
+# the label classes of evaluations whose classes are not in the cache
+_NOT_CACHED = object()
+
+# the number of prediction sets read ahead of the set whose metric results are collected
+_PENDING_SETS = 2
+
+# the versions of the libraries computing the cached inputs and metric results
+_LIBRARY_VERSIONS = {'numpy': np.__version__, 'pandas': pandas.__version__,
+                     'scipy': scipy.__version__, 'sklearn': sklearn.__version__}
+
+def _write_results(eval_dict, evaluation_path):
+    """
+    Writes the metric results of an evaluation as a JSON file
+    
+    :param eval_dict: The dictionary of the metric results
+    :param evaluation_path: The directory in which the file is written
+    :returns: The path of the file
+    """
+    filename = evaluation_path + "/eval_results_" + str(int(time.time())) + ".json"
+    logger.info("Writing eval results to " + filename) 
+    with open(filename, mode='w') as writer:
+        writer.write(json.dumps(eval_dict, indent=2))
+    return filename
+
+def _resolve_methods(metrics):
+    """
+    Resolves the methods of the metrics, from the process wide cache of the plugin 
+    manager.  Metrics whose method cannot be found are left out.
+    
+    :param metrics: The metrics to resolve
+    :return: List of the (metric, method) of each metric found
+    """
+    methods = []
+    for metric in metrics:
+        logger.info(metric.package + " : " +  metric.method)
+        method = resolve_metric(metric.package, metric.method)
+        if method is None:
+            logger.warn("Cannot load " + metric.package + "." + metric.method)
+            continue
+        methods.append((metric, method))
+    return methods
+
+def _to_native(evalResult, assessment_type, label_classes):
+    """
+    Converts the result of a metric to native types which can be written as JSON
+    
+    :param evalResult: The result of the metric
+    :param assessment_type: The evaluation assessment type
+    :param label_classes: The label classes of classification assessments
+    :return: The converted result
+    """
+    if isinstance(evalResult, np.ndarray):
+        # convert to native types
+        evalResultAsList = evalResult.tolist()
+        if assessment_type == "MultilabelClassification" or assessment_type == "MulticlassClassification":
+            # map labels to their values in the results
+            if len(evalResultAsList) == len(label_classes):
+                evalResultAsDict = {}
+                for index, label in enumerate(label_classes):
+                    evalResultAsDict[str(label)] = evalResultAsList[index]
+                return evalResultAsDict
+        return evalResultAsList
+    elif isinstance(evalResult, np.generic):
+        # convert to native type
+        return np.asscalar(evalResult)
+    elif isinstance(evalResult, tuple) or isinstance(evalResult, list):
+        # kind of a cheat to cover the case where a native type has numpy elements
+        # which some scikit-learn methods inexplicably return
+        return np.array(evalResult).tolist()
+    return evalResult
+
+def _prepare_inputs(assessment_type, predictions_path, truth_df, sparse=False):
+    """
+    Reads and aligns the predictions and ground truth, and builds the inputs of the metrics
+    
+    :param assessment_type: The evaluation assessment type
+    :param predictions_path: The path of the predictions csv file
+    :param truth_df: The ground truth DataFrame, left unchanged
+    :param sparse: Whether multiclass and multilabel matrices are built in scipy.sparse form
+    :return: Dictionary of the truth and results labels, the prediction scores, the truth 
+        and results bounds (None if not available) and the label classes (None if not 
+        classification)
+    """
+    # load prediction results
+    results_df = csv_Predictions_to_DataFrame(predictions_path)
+    
+    # match ground truth to results by id
+    results_df, truth_df, alignment = align_predictions(results_df, truth_df)
+    logger.info('Aligned predictions with ground truth: %s' % alignment)
+    
+    label_classes = None
+    if assessment_type == "MultilabelClassification" or assessment_type == "MulticlassClassification":
+        # create matrices for labels and confidence
+        label_mlb = MultiLabelBinarizer(sparse_output=sparse)
+        parsed_truth_labels = (truth_df['labels'].str.split().values.tolist()
+                               if truth_df['labels'].dtype == 'object' 
+                               else np.array(np.transpose(np.matrix(truth_df['labels'].values))))
+        parsed_results_labels = (results_df['labels'].str.split().values.tolist()
+                                 if results_df['labels'].dtype == 'object' 
+                                 else np.array(np.transpose(np.matrix(results_df['labels'].values))))
+        # the classes are the union of the labels, gathered without copying them
+        label_mlb.fit(itertools.chain(parsed_truth_labels, parsed_results_labels))
+        truth_labels_matrix = label_mlb.transform(parsed_truth_labels)
+        results_labels_matrix = label_mlb.transform(parsed_results_labels)
+        label_classes = label_mlb.classes_.tolist()
+        
+        if 'confidence' in results_df and not results_df['confidence'].hasnans:
+            parsed_confidence = (results_df['confidence'].str.split().values.tolist()
+                                 if results_df['confidence'].dtype == 'object' 
+                                 else np.array(np.transpose(np.matrix(results_df['confidence'].values))))
+            confidence_matrix = build_confidence_matrix(parsed_results_labels, parsed_confidence, 
+                                                        label_mlb.classes_, sparse=sparse)
+    elif assessment_type == "Regression":
+        if truth_df['labels'].dtype == 'object':
+            truth_labels_matrix = truth_df['labels'].str.split().values.tolist()
+            for index, item in enumerate(truth_labels_matrix):
+                truth_labels_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
+        else:
+            truth_labels_matrix = truth_df['labels'].values
+            
+        if results_df['labels'].dtype == 'object':
+            results_labels_matrix = results_df['labels'].str.split().values.tolist()
+            for index, item in enumerate(results_labels_matrix):
+                results_labels_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
+        else:
+            results_labels_matrix = results_df['labels'].values
+            
+        if results_df['confidence'].dtype == 'object':
+            confidence_matrix = results_df['confidence'].str.split().values.tolist()
+            for index, item in enumerate(confidence_matrix):
+                confidence_matrix[index] = np.array(item, dtype=np.float64)  #pylint: disable=no-member
+        else:
+            confidence_matrix = results_df['confidence'].values
+    else:
+        truth_labels_matrix = (truth_df['labels'].str.split().values.tolist()
+                               if truth_df['labels'].dtype == 'object' 
+                               else truth_df['labels'].values)
+        results_labels_matrix = (results_df['labels'].str.split().values.tolist() 
+                                 if results_df['labels'].dtype == 'object' 
+                                 else results_df['labels'].values)
+        confidence_matrix = (results_df['confidence'].str.split().values.tolist() 
+                             if results_df['confidence'].dtype == 'object' 
+                             else results_df['confidence'].values)
+    
+    has_scores = 'confidence' in results_df and not results_df['confidence'].hasnans
+    return {'truth_labels': truth_labels_matrix,
+            'results_labels': results_labels_matrix,
+            'scores': confidence_matrix if has_scores else None,
+            'truth_bounds': None if truth_df['bounds'].hasnans else truth_df['bounds'].values,
+            'results_bounds': None if results_df['bounds'].hasnans else results_df['bounds'].values,
+            'label_classes': label_classes}
+
+def _input_names(metric, inputs):
+    """
+    Returns the names of the inputs passed to the arguments of a metric
+    
+    :param metric: The metric
+    :param inputs: The inputs of the prediction set, as returned by _prepare_inputs
+    :return: Dictionary of the input names, by argument name
+    """
+    parameters = metric.data_parameters
+    names = {}
+    if parameters.truth_labels:
+        names[parameters.truth_labels] = 'truth_labels'
+        
+    if parameters.truth_bounds and inputs['truth_bounds'] is not None:
+        names[parameters.truth_bounds] = 'truth_bounds'
+        
+    if parameters.prediction_labels:
+        names[parameters.prediction_labels] = 'results_labels'
+        
+    if parameters.prediction_scores and inputs['scores'] is not None:
+        names[parameters.prediction_scores] = 'scores'
+        
+    if parameters.prediction_bounds and inputs['results_bounds'] is not None:
+        names[parameters.prediction_bounds] = 'results_bounds'
+    return names
+
+def _metric_args(default_args, names, inputs):
+    """
+    Returns the arguments of a metric
+    
+    :param default_args: The default arguments of the metric, left untouched
+    :param names: The names of the inputs passed to the arguments, as returned by _input_names
+    :param inputs: The inputs of the prediction set
+    :return: Dictionary of the arguments
+    """
+    args = dict(default_args or {})
+    args.update((arg, inputs[name]) for arg, name in names.items())
+    return args
+
+def _eval_dict(runner, entries, label_classes, pending, assessment_type, cache):
+    """
+    Collects the metric results of a prediction set, storing the new ones in the cache
+    
+    :param runner: The metric runner the metrics were submitted to
+    :param entries: The (metric, metric_key, result) of each metric, the result being None 
+        for the metrics submitted
+    :param label_classes: The label classes of classification assessments
+    :param pending: The jobs submitted to the runner, in the order of the entries
+    :param assessment_type: The evaluation assessment type
+    :param cache: The evaluation cache, or None if not used
+    :return: The dictionary of the metric results, by metric name
+    """
+    # results are in the order of the metrics, whichever metric completed first
+    results = iter(runner.results(pending))
+    eval_dict = {}
+    for counter, (metric, metric_key, result) in enumerate(entries):
+        status, evalResult = result or next(results)
+        if status == 'ok' and metric_key and not result:
+            cache.put(metric_key, evalResult)
+        if status == 'timeout':
+            logger.error("Timed out after %s seconds calling %s" % (runner.timeout, metric.method))
+        elif status == 'error':
+            logger.error("Something bad happened calling " + metric.method + "\n" + evalResult)
+        else:
+            logger.debug("Result is " + str(evalResult))
+            eval_dict[metric.object_info.name] = _to_native(evalResult, assessment_type, label_classes)
+            
+        logger.info("Completed metric " + str(counter + 1))
+    return eval_dict
+
+class _MetricRunner:
+    """
+    Runs metric jobs, one after the other in this process if there is a single worker and 
+    no timeout, or otherwise in worker processes started by a fork server (or spawned where 
+    there is no fork server).  The inputs of a prediction set are pickled once into shared 
+    memory, from which each worker loads them once, and the workers resolve the metric 
+    methods by name.  Workers still running metrics which timed out are terminated when 
+    the runner is closed.
+    """
+    
+    def __init__(self, workers, timeout=None):
+        """
+        Initializes the runner
+        
+        :param workers: The maximum number of worker processes
+        :param timeout: The time, in seconds, after which a metric is abandoned
+        """
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        # metrics running in this process could not be abandoned
+        self._inline = workers <= 1 and timeout is None
+        self._pool = None
+        # the number of jobs submitted whose results were not collected
+        self._queued = 0
+        # the shared memory of the inputs of the sets whose results were not collected
+        self._segments = set()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        for segment in list(self._segments):
+            self._release(segment)
+    
+    def submit(self, inputs, jobs):
+        """
+        Submits the metric jobs of a prediction set, which are run at once if they run in 
+        this process
+        
+        :param inputs: The inputs of the prediction set, as returned by _prepare_inputs
+        :param jobs: List of (metric, method, names) tuples, names being the names of the 
+            inputs passed to the metric's arguments
+        :return: The pending jobs, to pass to results
+        """
+        if self._inline:
+            return None, [_call_metric(method, _metric_args(metric.default_args, names, inputs))
+                          for metric, method, names in jobs]
+        if not jobs:
+            return None, []
+        pool = self._start()
+        segment = self._share(inputs)
+        pending = []
+        for metric, _, names in jobs:
+            # a job starts at the latest once the jobs queued ahead of it had their time
+            deadline = None
+            if self.timeout is not None:
+                deadline = time.monotonic() + self.timeout * (self._queued // self.workers + 1)
+            pending.append((pool.apply_async(_run_metric, (segment.name, metric.package, metric.method, 
+                                                           metric.default_args, names)), 
+                            deadline))
+            self._queued += 1
+        return segment, pending
+    
+    def results(self, pending):
+        """
+        Waits for the results of submitted jobs
+        
+        :param pending: The pending jobs returned by submit
+        :return: List of the (status, result) of each job, in the order of the jobs.  The status 
+            is one of 'ok', 'error' (the result being the traceback) or 'timeout'.
+        """
+        segment, pending = pending
+        if segment is None:
+            return pending
+        results = []
+        for result, deadline in pending:
+            try:
+                results.append(result.get(None if deadline is None 
+                                          else max(0, deadline - time.monotonic())))
+            except multiprocessing.TimeoutError:
+                results.append(('timeout', None))
+            except Exception:
+                # the result of the metric could not be returned from the worker
+                results.append(('error', traceback.format_exc()))
+            self._queued -= 1
+        self._release(segment)
+        return results
+    
+    def _share(self, inputs):
+        """
+        Pickles the inputs of a prediction set into shared memory
+        
+        :return: The shared memory
+        """
+        data = pickle.dumps(inputs, protocol=pickle.HIGHEST_PROTOCOL)
+        segment = shared_memory.SharedMemory(create=True, size=len(data))
+        self._segments.add(segment)
+        segment.buf[:len(data)] = data
+        return segment
+    
+    def _release(self, segment):
+        """
+        Frees the shared memory of the inputs of a prediction set
+        """
+        self._segments.discard(segment)
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def _start(self):
+        """
+        Starts the worker processes, on first use
+        
+        :return: The pool of worker processes
+        """
+        if self._pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                # the workers are forked from a server which imported this module, and its 
+                # dependencies, once.  Has no effect once the server is running.
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(self.workers)
+            # the time the workers take to start is not counted against the metrics
+            self._pool.apply(os.getpid)
+        return self._pool
+
+# the inputs of the prediction sets loaded by a worker process, by shared memory name, 
+# least recently used first
+_worker_inputs = OrderedDict()
+
+def _shared_inputs(name):
+    """
+    Returns the inputs of a prediction set in a worker process, loaded from shared memory 
+    by the first job of the set.  The inputs of the _PENDING_SETS sets used last are kept.
+    
+    :param name: The name of the shared memory
+    :return: The inputs of the prediction set
+    """
+    inputs = _worker_inputs.get(name)
+    if inputs is None:
+        segment = shared_memory.SharedMemory(name)
+        try:
+            inputs = pickle.loads(segment.buf)
+        finally:
+            segment.close()
+        _worker_inputs[name] = inputs
+        while len(_worker_inputs) > _PENDING_SETS:
+            _worker_inputs.popitem(last=False)
+    _worker_inputs.move_to_end(name)
+    return inputs
+
+def _run_metric(name, package, method, default_args, names):
+    """
+    Runs a metric job in a worker process
+    
+    :param name: The name of the shared memory of the inputs of the prediction set
+    :param package: The name of the package of the metric method
+    :param method: The name of the metric method
+    :param default_args: The default arguments of the metric
+    :param names: The names of the inputs passed to the metric's arguments
+    :return: The (status, result) of the metric
+    """
+    resolved = resolve_metric(package, method)
+    if resolved is None:
+        return 'error', "Cannot load " + package + "." + method
+    try:
+        inputs = _shared_inputs(name)
+    except Exception:
+        return 'error', traceback.format_exc()
+    return _call_metric(resolved, _metric_args(default_args, names, inputs))
+
+def _call_metric(method, args):
+    """
+    Calls a metric method.  Metrics rejecting scipy.sparse arguments, with a TypeError 
+    or ValueError, are called again with dense arguments.
+    
+    :return: The ('ok', result) of the metric, or ('error', traceback) if it failed
+    """
+    logger.debug("Calling " + method.__name__)
+    try:
+        return 'ok', method(**args)
+    except (TypeError, ValueError):
+        error = traceback.format_exc()
+    except Exception:
+        return 'error', traceback.format_exc()
+    dense = {name: value.toarray() for name, value in args.items() if scipy.sparse.issparse(value)}
+    if not dense:
+        return 'error', error
+    # the metric does not support sparse inputs
+    logger.warning("Calling " + method.__name__ + " with dense inputs")
+    try:
+        return 'ok', method(**dict(args, **dense))
+    except Exception:
+        return 'error', traceback.format_exc()
@@ -212,8 +212,14 @@ class ScikitLearnLogisticRegressionModel(AbstractModel):
         for key, value in data_map.items():
             logger.debug('Predicting class for key ' + key)
             # assumes image has already been reshaped appropriately for the model
-            image = base64.b64decode(value)
-            image = np.frombuffer(image)
+            if isinstance(value, str):
+                image = np.frombuffer(base64.b64decode(value))
+            elif isinstance(value, np.ndarray):
+                # sent binary framed in .npy format
+                image = value.ravel()
+            else:
+                # sent binary framed as raw bytes, no copy needed
+                image = np.frombuffer(value)
             prediction = self._regr.predict([image])
             detailed_data[key] = self._regr.predict_proba([image])
             logger.debug('Predicting: ' + str(prediction))
@@ -23,9 +23,15 @@ import six
 
 import mistk.data
 from mistk import logger
+import mistk.cfg as cfg
 import json, inspect
 import re
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 NATIVE_TYPES_MAPPING = {
     'int': int,
     'long': int,
@@ -50,115 +56,257 @@ class PresumptiveJSONEncoder(FlaskJSONEncoder):
         
         :param o: The object to create an encoder for
         """
-        if hasattr(o, 'swagger_types') and hasattr(o, 'attribute_map'):
+        fields = _swagger_fields(o)
+        if fields is not None:
             dikt = {}
-            for attr, _ in six.iteritems(o.swagger_types):
+            for attr, key in fields:
                 value = getattr(o, attr)
                 if value is None and not self.include_nulls:
                     continue
-                attr = o.attribute_map[attr]
-                dikt[attr] = value
+                dikt[key] = value
             return dikt
         return FlaskJSONEncoder.default(self, o)
 
+# (attribute, json name) pairs of the swagger model classes, None for other classes
+_model_fields = {}
+
+def _swagger_fields(o):
+    """
+    Gets the (attribute, json name) pairs to serialize for an object, computed once per class
+    
+    :param o: The object to serialize
+    :return: Tuple of (attribute, json name) pairs, or None if the object is not a swagger model
+    """
+    cls = o.__class__
+    try:
+        return _model_fields[cls]
+    except KeyError:
+        pass
+    fields = None
+    if hasattr(o, 'swagger_types') and hasattr(o, 'attribute_map'):
+        fields = tuple((attr, o.attribute_map[attr]) for attr in o.swagger_types)
+    _model_fields[cls] = fields
+    return fields
+
+_encoder = PresumptiveJSONEncoder()
+
+# orjson is used, when installed, unless disabled in the DATA section of the MISTK config
+_use_orjson = orjson is not None and \
+    str(cfg.get('DATA', 'mistk.data.json.orjson', 'true')).lower() == 'true'
+if _use_orjson:
+    # datetimes are passed to the default function to be formatted as by the stdlib encoder
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+def _orjson_default(o):
+    """
+    Converts the objects orjson cannot serialize natively, as done by PresumptiveJSONEncoder
+    
+    :param o: The object to convert
+    """
+    return _encoder.default(o)
+
+def encode_bytes(obj):
+    """
+    Serializes an object to UTF-8 encoded json, using orjson when available
+    
+    :param obj: The object to serialize
+    :return: The json bytes
+    """
+    if _use_orjson:
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS)
+    return _encoder.encode(obj).encode('UTF-8')
+
+def encode(obj):
+    """
+    Serializes an object to a json string, using orjson when available
+    
+    :param obj: The object to serialize
+    :return: The json string
+    """
+    if _use_orjson:
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS).decode('UTF-8')
+    return _encoder.encode(obj)
+
+# compiled decoders, keyed by model class and by (type, module) respectively
+_model_decoders = {}
+_type_decoders = {}
+# compiled converters, keyed by (source class, model class) and by (type, module) respectively
+_model_converters = {}
+_type_converters = {}
+
+
 def deserialize_model(data, klass):
     """
-    Deserializes list or dict to model.
+    Deserializes list or dict to model.  The decoder of each model class is compiled on 
+    first use and cached. 
 
     :param data: dict, list.
     :type data: dict | list
     :param klass: class literal.
     :return: model object.
     """
+    decoder = _model_decoders.get(klass)
+    if decoder is None:
+        decoder = _model_decoders[klass] = _compile_model(klass)
+    return decoder(data)
+
+
+def _model_schema(klass):
+    """
+    Retrieves the swagger metadata of a model class
+
+    :param klass: class literal.
+    :return: The attribute map, swagger types and the module in which type names are 
+        resolved, or None if the class has no swagger types
+    """
     if not klass.swagger_types:
         # server object
         instance = klass()
         if not instance.swagger_types:
-            return data
-        attribute_map = instance.attribute_map
-        swagger_types = instance.swagger_types
+            return None
+        return instance.attribute_map, instance.swagger_types, None
     else:
-        # client object
-        attribute_map = klass.attribute_map
-        swagger_types = klass.swagger_types
-
-    kwargs = {}
-    for attr, attr_type in six.iteritems(swagger_types):
-        if data is not None \
-                and attribute_map[attr] in data \
-                and isinstance(data, (list, dict)):
-            value = data[attribute_map[attr]]
-            if type(attr_type) == str:
-                # client objects use strings
-                kwargs[attr] = _deserialize(value, attr_type, inspect.getmodule(klass))
-            else:
-                kwargs[attr] = _deserialize(value, attr_type)
-
-    instance = klass(**kwargs)
+        # client object, whose types are names in its module
+        return klass.attribute_map, klass.swagger_types, inspect.getmodule(klass)
 
-    # TODO handle alternate module name
-    if isinstance(instance, mistk.data.ObjectReference):
-        if instance.instance and instance.kind:
-            assert hasattr(mistk.data, instance.kind), \
-            "ObjectReference has invalid kind value: " + instance.kind
-            klass2 = getattr(mistk.data, instance.kind)
-            instance.instance = deserialize_model(instance.instance, klass2)
-        elif instance.instance and not instance.kind:
-            msg = "Instance given in object reference but kind attribute not specified"
-            logger.error(msg + '\n%s' % instance)
-            raise RuntimeError(msg)
-            
-    if hasattr(instance, 'object_info'):
-        instance.object_info = instance.object_info or mistk.data.ObjectInfo()
-        instance.object_info.kind = klass.__name__
-
-    return instance
-            
 
-def _deserialize(data, klass, module=None):
+def _compile_model(klass):
     """
-    Deserializes dict, list, str into an object.
+    Builds the decoder of a model class
+
+    :param klass: class literal.
+    :return: function deserializing a list or dict to the model.
+    """
+    schema = _model_schema(klass)
+    if schema is None:
+        return _deserialize_object
+    attribute_map, swagger_types, module = schema
+
+    fields = tuple((attr, attribute_map[attr], 
+                    _type_decoder(attr_type, module if type(attr_type) == str else None))
+                   for attr, attr_type in six.iteritems(swagger_types))
+    finalize = _compile_finalizer(klass)
+
+    def decode(data):
+        kwargs = {}
+        if data is not None and isinstance(data, (list, dict)):
+            for attr, key, decode_value in fields:
+                if key in data:
+                    kwargs[attr] = decode_value(data[key])
+        return finalize(klass(**kwargs))
+
+    return decode
+
+
+def _compile_finalizer(klass):
+    """
+    Builds the step run on each newly deserialized instance of a model class, which 
+    resolves object reference instances and sets the kind of the object info
+
+    :param klass: class literal.
+    :return: function taking and returning the instance.
+    """
+    # TODO handle alternate module name
+    is_reference = issubclass(klass, mistk.data.ObjectReference)
+    kind = klass.__name__
+
+    def finalize(instance):
+        if is_reference:
+            if instance.instance and instance.kind:
+                assert hasattr(mistk.data, instance.kind), \
+                "ObjectReference has invalid kind value: " + instance.kind
+                klass2 = getattr(mistk.data, instance.kind)
+                instance.instance = deserialize_model(instance.instance, klass2)
+            elif instance.instance and not instance.kind:
+                msg = "Instance given in object reference but kind attribute not specified"
+                logger.error(msg + '\n%s' % instance)
+                raise RuntimeError(msg)
+        if hasattr(instance, 'object_info'):
+            instance.object_info = instance.object_info or mistk.data.ObjectInfo()
+            instance.object_info.kind = kind
+        return instance
+
+    return finalize
+
+
+def _type_decoder(klass, module=None):
+    """
+    Retrieves the decoder of a type, compiling and caching it on first use
 
-    :param data: dict, list or str.
     :param klass: class literal, or string of class name.
+    :param module: The module in which class names are resolved.
+    :return: function deserializing dict, list, str into an object of the type.
+    """
+    key = (klass, module)
+    decoder = _type_decoders.get(key)
+    if decoder is None:
+        decoder = _type_decoders[key] = _compile_type(klass, module)
+    return decoder
 
-    :return: object.
+
+def _compile_type(klass, module=None):
+    """
+    Builds the decoder of a type.  Decoders return None for None. 
+
+    :param klass: class literal, or string of class name.
+    :param module: The module in which class names are resolved.
+    :return: function deserializing dict, list, str into an object of the type.
     """
-    if data is None:
-        return None
-    
     if type(klass) == str:
         if klass.startswith('list['):
-            sub_kls = re.match('list\[(.*)\]', klass).group(1)
-            return [_deserialize(sub_data, sub_kls)
-                    for sub_data in data]
+            decode_item = _type_decoder(re.match(r'list\[(.*)\]', klass).group(1), module)
+            return lambda data: None if data is None else [decode_item(sub_data) for sub_data in data]
 
         if klass.startswith('dict('):
-            sub_kls = re.match('dict\(([^,]*), (.*)\)', klass).group(2)
-            return {k: _deserialize(v, sub_kls)
-                    for k, v in six.iteritems(data)}
+            decode_value = _type_decoder(re.match(r'dict\(([^,]*), (.*)\)', klass).group(2), module)
+            return lambda data: None if data is None else {k: decode_value(v)
+                                                           for k, v in six.iteritems(data)}
 
         # convert str to class
         if klass in NATIVE_TYPES_MAPPING:
             klass = NATIVE_TYPES_MAPPING[klass]
-        else:
+        elif hasattr(module, klass):
             klass = getattr(module, klass)
+        else:
+            name = klass
+            def unresolved(data):
+                if data is None:
+                    return None
+                raise AttributeError("Type %s was not found in module %s" % (name, module))
+            return unresolved
 
     if klass in six.integer_types or klass in (float, str, bool):
-        return _deserialize_primitive(data, klass)
+        return lambda data: None if data is None else _deserialize_primitive(data, klass)
     elif klass == object:
-        return _deserialize_object(data)
+        return _deserialize_object
     elif klass == datetime.date:
-        return _deserialize_date(data)
+        return lambda data: None if data is None else _deserialize_date(data)
     elif klass == datetime.datetime:
-        return _deserialize_datetime(data)
+        return lambda data: None if data is None else _deserialize_datetime(data)
     elif hasattr(klass, '__origin__'):
         if klass.__origin__ == list or klass.__origin__ == typing.List:
-            return _deserialize_list(data, klass.__args__[0])
+            decode_item = _type_decoder(klass.__args__[0])
+            return lambda data: None if data is None else [decode_item(sub_data) for sub_data in data]
         if klass.__origin__ == dict or klass.__origin__ == typing.Dict:
-            return _deserialize_dict(data, klass.__args__[1])
+            decode_value = _type_decoder(klass.__args__[1])
+            return lambda data: None if data is None else {k: decode_value(v)
+                                                           for k, v in six.iteritems(data)}
+        return lambda data: None
     else:
-        return deserialize_model(data, klass)
+        return lambda data: None if data is None else deserialize_model(data, klass)
+
+
+def _deserialize(data, klass, module=None):
+    """
+    Deserializes dict, list, str into an object.
+
+    :param data: dict, list or str.
+    :param klass: class literal, or string of class name.
+    :param module: The module in which class names are resolved.
+
+    :return: object.
+    """
+    return _type_decoder(klass, module)(data)
 
 
 def _deserialize_primitive(data, klass):
@@ -231,8 +379,8 @@ def _deserialize_list(data, boxed_type):
     :return: deserialized list.
     :rtype: list
     """
-    return [_deserialize(sub_data, boxed_type)
-            for sub_data in data]
+    decode_item = _type_decoder(boxed_type)
+    return [decode_item(sub_data) for sub_data in data]
 
 
 def _deserialize_dict(data, boxed_type):
@@ -246,8 +394,8 @@ def _deserialize_dict(data, boxed_type):
     :return: deserialized dict.
     :rtype: dict
     """
-    return {k: _deserialize(v, boxed_type)
-            for k, v in six.iteritems(data)}        
+    decode_value = _type_decoder(boxed_type)
+    return {k: decode_value(v) for k, v in six.iteritems(data)}
         
     
 def convert_client_object(obj, cls=None):
@@ -257,13 +405,133 @@ def convert_client_object(obj, cls=None):
     :param obj: The object to convert
     :param cls: Defaults to None
     """
-    #TODO This is pretty inefficient
-    if cls:
-        return deserialize_model(json.loads(PresumptiveJSONEncoder().encode(obj)), cls)
-    else:
+    if not cls:
         clsname = obj.__class__.__name__
-        if hasattr(mistk.data, clsname):
-            cls = getattr(mistk.data, clsname)
-            return deserialize_model(json.loads(PresumptiveJSONEncoder().encode(obj)), cls)
-        else:
+        if not hasattr(mistk.data, clsname):
             return obj
+        cls = getattr(mistk.data, clsname)
+    if not (hasattr(obj, 'swagger_types') and hasattr(obj, 'attribute_map')):
+        return deserialize_model(_to_plain(obj), cls)
+    key = (obj.__class__, cls)
+    converter = _model_converters.get(key)
+    if converter is None:
+        converter = _model_converters[key] = _compile_converter(obj.__class__, cls)
+    return converter(obj)
+
+
+def _compile_converter(source_cls, klass):
+    """
+    Builds the converter of objects of one swagger model class into another, matching 
+    attributes by their json names.  The result is the same as serializing the object to 
+    json and deserializing it, without the serialization.
+
+    :param source_cls: The class of the objects to convert
+    :param klass: The class to convert them into
+    :return: function converting an object of the source class into the model.
+    """
+    schema = _model_schema(klass)
+    if schema is None:
+        return _to_plain
+    attribute_map, swagger_types, module = schema
+    source_attrs = {key: attr for attr, key in six.iteritems(source_cls.attribute_map)
+                    if attr in source_cls.swagger_types}
+
+    fields = tuple((attr, source_attrs[attribute_map[attr]],
+                    _type_converter(attr_type, module if type(attr_type) == str else None))
+                   for attr, attr_type in six.iteritems(swagger_types)
+                   if attribute_map[attr] in source_attrs)
+    finalize = _compile_finalizer(klass)
+
+    def convert(obj):
+        kwargs = {}
+        for attr, source_attr, convert_value in fields:
+            value = getattr(obj, source_attr)
+            if value is not None:
+                kwargs[attr] = convert_value(value)
+        return finalize(klass(**kwargs))
+
+    return convert
+
+
+def _type_converter(klass, module=None):
+    """
+    Retrieves the converter of values into a type, compiling and caching it on first use
+
+    :param klass: class literal, or string of class name.
+    :param module: The module in which class names are resolved.
+    :return: function converting a value into the type.
+    """
+    key = (klass, module)
+    converter = _type_converters.get(key)
+    if converter is None:
+        converter = _type_converters[key] = _compile_type_converter(klass, module)
+    return converter
+
+
+def _compile_type_converter(klass, module=None):
+    """
+    Builds the converter of values into a type.  Swagger objects are converted directly, 
+    anything else is converted to plain data and decoded.
+
+    :param klass: class literal, or string of class name.
+    :param module: The module in which class names are resolved.
+    :return: function converting a value into the type.
+    """
+    if type(klass) == str:
+        if klass.startswith('list['):
+            convert_item = _type_converter(re.match(r'list\[(.*)\]', klass).group(1), module)
+            return lambda value: None if value is None else [convert_item(item) for item in value]
+        if klass.startswith('dict('):
+            convert_value = _type_converter(re.match(r'dict\(([^,]*), (.*)\)', klass).group(2), module)
+            return lambda value: None if value is None else {k: convert_value(v)
+                                                             for k, v in six.iteritems(value)}
+        if klass in NATIVE_TYPES_MAPPING:
+            klass = NATIVE_TYPES_MAPPING[klass]
+        elif hasattr(module, klass):
+            klass = getattr(module, klass)
+    elif hasattr(klass, '__origin__'):
+        if klass.__origin__ == list or klass.__origin__ == typing.List:
+            convert_item = _type_converter(klass.__args__[0])
+            return lambda value: None if value is None else [convert_item(item) for item in value]
+        if klass.__origin__ == dict or klass.__origin__ == typing.Dict:
+            convert_value = _type_converter(klass.__args__[1])
+            return lambda value: None if value is None else {k: convert_value(v)
+                                                             for k, v in six.iteritems(value)}
+
+    if inspect.isclass(klass) and hasattr(klass, 'swagger_types'):
+        def convert_model(value):
+            if value is None:
+                return None
+            if hasattr(value, 'swagger_types') and hasattr(value, 'attribute_map'):
+                return convert_client_object(value, klass)
+            return deserialize_model(_to_plain(value), klass)
+        return convert_model
+
+    decode = _type_decoder(klass, module)
+    if klass in (datetime.date, datetime.datetime):
+        return lambda value: value if isinstance(value, klass) else decode(_to_plain(value))
+    return lambda value: decode(_to_plain(value))
+
+
+def _to_plain(value):
+    """
+    Converts a value into plain (json compatible) data, in the same way as serializing 
+    it to json and parsing it back
+
+    :param value: The value to convert
+    :return: The plain data
+    """
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _to_plain(v) for k, v in six.iteritems(value)}
+    if hasattr(value, 'swagger_types') and hasattr(value, 'attribute_map'):
+        plain = {}
+        for attr, key in _swagger_fields(value):
+            item = getattr(value, attr)
+            if item is not None:
+                plain[key] = _to_plain(item)
+        return plain
+    return json.loads(encode(value))
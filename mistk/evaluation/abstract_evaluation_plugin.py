@@ -19,8 +19,12 @@ from transitions.extensions import LockedMachine as Machine
 from transitions import State
 
 from abc import ABCMeta, abstractmethod
+import json
+import os
 
 from mistk.evaluation.service import EvaluationPluginEndpoint
+from mistk.evaluation.cache import EvaluationCache
+from mistk.evaluation.util.leaderboard import set_names, write_leaderboard
 import mistk.evaluation
 from mistk import logger
 
@@ -43,11 +47,13 @@ class AbstractEvaluationPlugin (metaclass=ABCMeta):
         
         self.state = None
         self._endpoint_service = None
+        self._cache = None
         states = [State(n, on_enter='new_state_entered') for n in _evaluation_states]
         self._machine = Machine(model=self, states=states, initial='started', auto_transitions=False)
         self._machine.add_transition(trigger='fail', source=list(_evaluation_states-{'terminated'}), dest='failed')
         self._machine.add_transition(trigger='ready', source=['started', 'evaluating'], dest='ready')
         self._machine.add_transition(trigger='evaluate', source=['started', 'ready'], dest='evaluating', after='_do_evaluate')
+        self._machine.add_transition(trigger='evaluate_batch', source=['started', 'ready'], dest='evaluating', after='_do_evaluate_batch')
         self._machine.add_transition(trigger='terminate', source=list(_evaluation_states-{'terminating', 'terminated', 'failed'}), dest='terminating', after='_do_terminate')
         self._machine.add_transition(trigger='terminated', source='terminating', dest='terminated')
     
@@ -75,6 +81,16 @@ class AbstractEvaluationPlugin (metaclass=ABCMeta):
         """
         self._endpoint_service = endpoint_service
         
+    @property
+    def cache(self) -> EvaluationCache:
+        """
+        Returns the cache in which evaluation inputs and metric results can be stored
+        to be reused by later evaluations of the same files
+        """
+        if self._cache is None:
+            self._cache = EvaluationCache()
+        return self._cache
+        
     def new_state_entered(self, *args, **kwargs):
         """
         Notifies the endpoint service that the current state of the state machine has been update 
@@ -118,13 +134,24 @@ class AbstractEvaluationPlugin (metaclass=ABCMeta):
         """
         pass
     
+    def evaluate_batch(self, assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, evaluation_path, properties):
+        """
+        Triggers the model to enter the evaluation state.  A subsequent call to
+        do_evaluate_batch with the given parameters will be made as a result.
+
+        This method should not be implemented or overwritten by subclasses.  It will be 
+        created by the state machine.
+        """
+        pass
+    
     def metrics(self):
         """
         Metrics that can be performed by the evaluate method
         """
         logger.debug("metrics started")
+        metrics_list = []
         try:
-            metrics_list = self.plugin_manager.get_metrics_list()
+            metrics_list = self.endpoint_service.plugin_manager.get_metrics_list()
             logger.debug("metrics complete")
         except Exception as ex:
             logger.exception("Error running metrics")
@@ -138,11 +165,7 @@ class AbstractEvaluationPlugin (metaclass=ABCMeta):
         """
         types = []
         try:
-            metrics_list = self.plugin_manager.get_metrics_list()
-            for metric in metrics_list:
-                for assessment_types in metric.assessment_types():
-                    if type not in assessment_types:
-                        types.append(type)
+            types = self.endpoint_service.plugin_manager.get_assessment_types()
         except Exception as ex:
             logger.exception("Error running metrics")
             self.fail(str(ex))
@@ -222,7 +245,73 @@ class AbstractEvaluationPlugin (metaclass=ABCMeta):
     :param ground_truth_path: The directory path where the ground_truth.csv file is located
     :param evaluation_path: A directory path to where the evaluation.json output file will be stored
     :param properties: A dictionary of key value pairs for evaluation plugin arguments. 
+    :returns: The path of the JSON file the assessment results were stored in
     """
         pass
     
     
+    
+    def _do_evaluate_batch(self, assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, evaluation_path, properties):
+        """
+    Performs metrics' evaluation of several prediction sets against the same ground truth.
+    Stores the assessment results of each set and a leaderboard.json file combining them 
+    in the evaluation_path
+    
+    :param assessment_type: The evaluation type. One of {'BinaryClassification', 
+        'MultilabelClassification', 'MulticlassClassification', 'Regression'}
+    :param metrics: Specific metrics to evaluate against instead of all metrics defined by assessment_type
+    :param input_data_paths: Paths to the input data of each prediction set
+    :param evaluation_input_format: The format of the input data
+    :param ground_truth_path: The directory path where the ground_truth.csv file is located
+    :param evaluation_path: A directory path to where the output files will be stored
+    :param properties: A dictionary of key value pairs for evaluation plugin arguments. 
+    """
+    
+        logger.debug("_do_evaluate_batch started")
+        try:
+            logger.info("Calling do_evaluate_batch method.")
+            self.do_evaluate_batch(assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, evaluation_path, properties)
+            self.ready()
+        except Exception as ex: #pylint: disable=broad-except
+            logger.exception("Error running do_evaluate_batch")
+            self.fail(str(ex))
+        logger.debug("_do_evaluate_batch complete")
+        
+    def do_evaluate_batch(self, assessment_type, metrics, input_data_paths, evaluation_input_format, ground_truth_path, evaluation_path, properties):
+        """
+    Performs metrics' evaluation of several prediction sets against the same ground truth.
+    Stores the assessment results of each set and a leaderboard.json file combining them 
+    in the evaluation_path
+    
+    The results of each set are stored in a sub directory of evaluation_path named after 
+    the set, as do_evaluate stores them.  By default, each set is evaluated in turn by 
+    do_evaluate, and the file whose path it returns is combined in the leaderboard.  Plugins 
+    able to share the ground truth between the sets or to evaluate them in parallel should 
+    override this method, keeping this layout.
+    
+    :param assessment_type: The evaluation type. One of {'BinaryClassification', 
+        'MultilabelClassification', 'MulticlassClassification', 'Regression'}
+    :param metrics: Specific metrics to evaluate against instead of all metrics defined by assessment_type
+    :param input_data_paths: Paths to the input data of each prediction set
+    :param evaluation_input_format: The format of the input data
+    :param ground_truth_path: The directory path where the ground_truth.csv file is located
+    :param evaluation_path: A directory path to where the output files will be stored
+    :param properties: A dictionary of key value pairs for evaluation plugin arguments. 
+    """
+        sets = []
+        for name, input_data_path in zip(set_names(input_data_paths), input_data_paths):
+            set_path = os.path.join(evaluation_path, name)
+            os.makedirs(set_path, exist_ok=True)
+            logger.info("Evaluating prediction set " + name)
+            results_file = self.do_evaluate(assessment_type, metrics, input_data_path, evaluation_input_format, ground_truth_path, set_path, properties)
+            
+            # plugins not returning their results file are listed without results
+            results = None
+            if results_file:
+                with open(results_file) as reader:
+                    results = json.load(reader)
+            else:
+                logger.warning("do_evaluate returned no results file for prediction set " + name)
+            sets.append((name, input_data_path, results_file, results))
+        
+        write_leaderboard(evaluation_path, sets, assessment_type, ground_truth_path)
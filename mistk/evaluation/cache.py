@@ -0,0 +1,259 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Content addressed cache of evaluation inputs and metric results.
+
+Entries are pickled to files named after the hash of their key in the directory set by 
+the 'mistk.evaluation.cache.path' property of the EVALUATION section of the MISTK config
+file, or a directory of the current user in the system's temporary directory.  When the 
+entries exceed 'mistk.evaluation.cache.size' megabytes, the least recently used are removed.
+A size of 0 disables the cache.
+
+Since entries are unpickled, the cache is only used if its directory is owned by the 
+current user and cannot be written by other users.
+
+Keys include the version of the layout of the entries, so the entries stored by an earlier 
+version of this module are never read.  Callers add the versions of the libraries the values
+depend on to the parts of their keys.
+"""
+
+import getpass, hashlib, json, os, pickle, stat, tempfile, threading
+from collections import OrderedDict
+
+from mistk import logger
+import mistk.cfg as cfg
+
+_MISSING = object()
+
+# the version of the layout of the entries, to be changed whenever the stored values change
+_SCHEMA = 1
+
+# the number of files whose hash is remembered
+_MAX_FILE_HASHES = 256
+
+
+class EvaluationCache:
+    """
+    On-disk cache of evaluation inputs and metric results with least recently used eviction
+    """
+    
+    def __init__(self, path=None, max_size=None):
+        """
+        Initializes the cache
+        
+        :param path: The directory of the cache, defaults to the configured directory
+        :param max_size: The maximum size of the cache in bytes, defaults to the configured size
+        """
+        self.path = path or cfg.get('EVALUATION', 'mistk.evaluation.cache.path') or \
+            os.path.join(tempfile.gettempdir(), 'mistk-evaluation-cache-' + _user())
+        if max_size is None:
+            max_size = int(float(cfg.get('EVALUATION', 'mistk.evaluation.cache.size', 1024) or 0) * 2**20)
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+        # whether the directory was found safe to use, checked on first use
+        self._trusted = None
+        # (size, modification time, hash) of the files by path, least recently used first
+        self._file_hashes = OrderedDict()
+    
+    @property
+    def enabled(self):
+        """
+        Whether the cache stores entries
+        """
+        if self.max_size <= 0:
+            return False
+        if self._trusted is None:
+            with self._lock:
+                if self._trusted is None:
+                    self._trusted = self._check_directory()
+        return self._trusted
+    
+    def file_hash(self, path):
+        """
+        Returns the hash of the content of a file.  The hash is computed again only if the 
+        size or modification time of the file changed.
+        
+        :param path: The path of the file
+        :return: The hexadecimal SHA-256 digest of the file
+        """
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known = self._file_hashes.get(path)
+            if known and known[:2] == stamp:
+                self._file_hashes.move_to_end(path)
+                return known[2]
+        sha = hashlib.sha256()
+        with open(path, 'rb') as reader:
+            for block in iter(lambda: reader.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self._lock:
+            self._file_hashes[path] = stamp + (digest,)
+            self._file_hashes.move_to_end(path)
+            while len(self._file_hashes) > _MAX_FILE_HASHES:
+                self._file_hashes.popitem(last=False)
+        return digest
+    
+    def key(self, *parts):
+        """
+        Returns the key of an entry made of the given parts, which should be json serializable
+        
+        :param parts: The parts identifying the entry, e.g. input hashes and metric arguments
+        :return: The hexadecimal key
+        """
+        text = json.dumps((_SCHEMA,) + parts, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode('UTF-8')).hexdigest()
+    
+    def get(self, key, default=None):
+        """
+        Returns the value of an entry and marks it as recently used
+        
+        :param key: The key of the entry
+        :param default: The value returned if there is no entry for the key
+        """
+        if not self.enabled:
+            return default
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as reader:
+                value = pickle.load(reader)
+            os.utime(entry)
+            return value
+        except FileNotFoundError:
+            return default
+        except Exception:  #pylint: disable=broad-except
+            logger.warning("Discarding unreadable evaluation cache entry %s", entry, exc_info=True)
+            self._remove(entry)
+            return default
+    
+    def put(self, key, value):
+        """
+        Stores the value of an entry, removing the least recently used entries if the cache
+        is full
+        
+        :param key: The key of the entry
+        :param value: The picklable value
+        """
+        if not self.enabled:
+            return
+        entry = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry), mode=0o700, exist_ok=True)
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as writer:
+                pickle.dump(value, writer, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, entry)
+        except Exception:  #pylint: disable=broad-except
+            logger.warning("Could not store evaluation cache entry %s", entry, exc_info=True)
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size += os.path.getsize(entry)
+            self._evict()
+    
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            for entry, _, _ in self._entries():
+                self._remove(entry)
+            self._size = 0
+    
+    def _check_directory(self):
+        """
+        Creates the directory of the cache, readable by the current user only, if it does 
+        not exist, and checks it is owned by the current user and cannot be written by 
+        other users
+        
+        :return: True if the directory can be trusted, False otherwise
+        """
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            info = os.lstat(self.path)
+        except OSError:
+            logger.warning("Disabling the evaluation cache, cannot create %s", self.path, exc_info=True)
+            return False
+        if not stat.S_ISDIR(info.st_mode):
+            logger.warning("Disabling the evaluation cache, %s is not a directory", self.path)
+            return False
+        if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+            logger.warning("Disabling the evaluation cache, %s is owned by another user", self.path)
+            return False
+        if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            logger.warning("Disabling the evaluation cache, %s can be written by other users", self.path)
+            return False
+        return True
+    
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + '.pkl')
+    
+    def _entries(self):
+        """
+        Lists the (path, size, last use) of the entries
+        """
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for folder in os.scandir(self.path):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith('.pkl'):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+    
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits its maximum size
+        """
+        if self._size is not None and self._size <= self.max_size:
+            return
+        entries = self._entries()
+        self._size = sum(size for _, size, _ in entries)
+        if self._size <= self.max_size:
+            return
+        for entry, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            self._remove(entry)
+            self._size -= size
+            if self._size <= self.max_size:
+                break
+    
+    def _remove(self, entry):
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
+
+def _user():
+    """
+    Returns the id, or where there are no user ids the name, of the current user
+    """
+    if hasattr(os, 'getuid'):
+        return str(os.getuid())
+    try:
+        return getpass.getuser()
+    except Exception:  #pylint: disable=broad-except
+        return 'default'
+
@@ -19,19 +19,77 @@ import importlib
 import json
 import sys
 import os.path, shutil
+import threading
 from pathlib import Path
 from configparser import ConfigParser
 from mistk import logger
 from mistk.model.client import Metric, MistkMetric
 import mistk.data.utils as datautils
 
+# the metric methods resolved in this process, by 'package.method'
+_callables = {}
+_callables_lock = threading.Lock()
+
+def resolve_metric(package, method):
+    """
+    Returns the callable of a metric method, importing its package on first use.  
+    Resolved callables are kept for the life of the process, so a package is only 
+    imported once however many metrics or evaluations use it.  Failures are not kept, 
+    so a package installed later is found on the next call.
+    
+    :param package: The name of the package of the method
+    :param method: The name of the method
+    :return: The callable, or None if the package cannot be imported or lacks the method
+    """
+    name = package + '.' + method
+    resolved = _callables.get(name)
+    if resolved is not None:
+        return resolved
+    with _callables_lock:
+        resolved = _callables.get(name)
+        if resolved is None:
+            module = _import(package)
+            resolved = getattr(module, method, None) if module else None
+            if resolved is None:
+                if module:
+                    logger.warning(method + " does not exist in " + package)
+                return None
+            logger.debug("Resolved metric " + name)
+            _callables[name] = resolved
+    return resolved
+
+def _import(name):
+    """
+    Imports a module.  The finder caches are only invalidated, and the import tried again, 
+    if the module is not found, since invalidating them costs every later import a rescan.
+    
+    :param name: The name of the module
+    :return: The module, or None if it cannot be imported
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        # the module may have been installed since the finders cached their directories
+        importlib.invalidate_caches()
+    except Exception:
+        logger.exception("Exception importing plugin module " + name)
+        return None
+    try:
+        return importlib.import_module(name)
+    except Exception:
+        logger.exception("Exception importing plugin module " + name)
+        return None
+
 class EREPluginManager(object):
         
     def __init__(self, module):  
         self._metric_dict = {}
         self._metric_list = []
+        self._metrics_by_name = {}
         self._default_metrics = {}
         self._plugins_path = ''
+        self._metrics_mtime = None
+        self._reload_lock = threading.Lock()
         
         self._module_loaded = module
         path = Path(module.__file__)
@@ -40,29 +98,100 @@ class EREPluginManager(object):
         self.reload()
                     
     def get_default_metrics_list(self, assessment_type):
-        return self._default_metrics.get(assessment_type, [])
+        """
+        Returns the default metrics of an assessment type, which are all the metrics 
+        supporting it
+        
+        :param assessment_type: The assessment type
+        """
+        return self.get_metrics_for_assessment_type(assessment_type)
     
     def get_metrics_list(self):
+        self._refresh()
         return self._metric_list
+    
+    def get_metrics_for_assessment_type(self, assessment_type):
+        """
+        Returns the metrics supporting an assessment type, in the order of the metrics file
+        
+        :param assessment_type: The assessment type
+        :return: The list of metrics, empty if the assessment type is unknown
+        """
+        self._refresh()
+        return self._default_metrics.get(assessment_type, [])
+    
+    def get_metrics_version(self):
+        """
+        Returns the version of the metrics, which changes whenever the metrics file is 
+        read again
+        
+        :return: The modification time of the metrics file, in nanoseconds
+        """
+        self._refresh()
+        return self._metrics_mtime
+    
+    def get_assessment_types(self):
+        """
+        Returns the assessment types supported by at least one metric, in the order 
+        they are first found in the metrics file
+        """
+        self._refresh()
+        return list(self._default_metrics)
         
     def get_object_for_metric(self, metric):
+        self._refresh()
         return self._metric_dict.get(metric, None)
     
+    def get_metric_by_name(self, name):
+        """
+        Returns a metric by its object name
+        
+        :param name: The name of the metric
+        :return: The metric, or None if there is no metric of this name
+        """
+        self._refresh()
+        return self._metrics_by_name.get(name, None)
+    
     def get_plugin(self, name):
-        try:
-            importlib.invalidate_caches()
-            return importlib.import_module(name)
-        except Exception as e:
-            logger.exception("Exception importing plugin module " + name)
+        return _import(name)
+    
+    def get_callable(self, metric):
+        """
+        Returns the callable of a metric's method, imported on first use
+        
+        :param metric: The MistkMetric
+        :return: The callable, or None if it cannot be resolved
+        """
+        if not metric.package or not metric.method:
             return None
+        return resolve_metric(metric.package, metric.method)
         
     def reload(self):
+        """
+        Reads the metrics file again if it was modified since it was last read
+        """
         new_path = self._get_metrics_uri()
-        if new_path != self._plugins_path:
-            self._plugins_path = new_path
-            sys.path.append(new_path)
+        with self._reload_lock:
+            if new_path != self._plugins_path:
+                self._plugins_path = new_path
+                self._metrics_mtime = None
+                # the directory of the metrics file, so the plugin modules next to it can be imported
+                directory = os.path.dirname(new_path)
+                if directory not in sys.path:
+                    sys.path.append(directory)
+            
+            self._read_metrics(new_path)
     
-        self._read_metrics(new_path)
+    def _refresh(self):
+        """
+        Reloads the metrics if the metrics file was modified
+        """
+        try:
+            modified = os.stat(self._plugins_path).st_mtime_ns != self._metrics_mtime
+        except OSError:
+            modified = False
+        if modified:
+            self.reload()
     
     def _get_metrics_uri(self):
         return os.path.join(self._module_directory, "metrics.json")
@@ -79,19 +208,35 @@ class EREPluginManager(object):
             src=os.path.join(os.path.dirname(__file__), "metrics.json")
             shutil.copy(src, uri)
         
+        mtime = os.stat(uri).st_mtime_ns
+        if mtime == self._metrics_mtime:
+            logger.debug('Metrics file %s is unchanged' % uri)
+            return
+        
         with self._read(uri) as reader:
             metric_dict_list = json.load(reader)
-            self._default_metrics = metric_dict_list
-            
-            for metric_dict in metric_dict_list:
-                logger.info('metric json loading: ' + str(metric_dict))
-                metric_object = datautils.deserialize_model(metric_dict, MistkMetric)
-                logger.info('metric loaded: ' + str(metric_object))
-                if metric_object.package and metric_object.method:
-                    self._metric_dict[metric_object.package + '.' + metric_object.method] = metric_object
-                else:
-                    self._metric_dict[metric_object.object_info.name] = metric_object
-                self._metric_list.append(metric_object)
-    
-        logger.info('Metrics loaded.')
-  
+        
+        # built aside and then swapped, so readers never see a partial or duplicated list
+        metric_dict = {}
+        metric_list = []
+        metrics_by_name = {}
+        default_metrics = {}
+        for metric_dict_entry in metric_dict_list:
+            logger.debug('metric json loading: ' + str(metric_dict_entry))
+            metric_object = datautils.deserialize_model(metric_dict_entry, MistkMetric)
+            if metric_object.package and metric_object.method:
+                metric_dict[metric_object.package + '.' + metric_object.method] = metric_object
+            else:
+                metric_dict[metric_object.object_info.name] = metric_object
+            if metric_object.object_info and metric_object.object_info.name:
+                metrics_by_name.setdefault(metric_object.object_info.name, metric_object)
+            for assessment_type in metric_object.assessment_types or []:
+                default_metrics.setdefault(assessment_type, []).append(metric_object)
+            metric_list.append(metric_object)
+        
+        self._metrics_by_name = metrics_by_name
+        self._default_metrics = default_metrics
+        self._metric_dict = metric_dict
+        self._metric_list = metric_list
+        self._metrics_mtime = mtime
+        logger.info('%d metrics loaded.' % len(metric_list))
@@ -23,7 +23,6 @@ import uuid
 import connexion as cx
 import pkg_resources
 import yaml
-import wsgiserver
 
 from flask import Response
 from rwlock.rwlock import RWLock
@@ -31,12 +30,15 @@ from rwlock.rwlock import RWLock
 
 import mistk.data.utils
 from mistk.watch import watch_manager
-from mistk.data import MistkMetric, EvaluationSpecificationInitParams, EvaluationInstanceStatus, ObjectInfo, ServiceError
+from mistk.watch.status_publisher import StatusPublisher
+from mistk.utils import server_utils
+from mistk.data import MistkMetric, MistkMetricList, EvaluationSpecificationInitParams, EvaluationBatchSpecificationInitParams, EvaluationInstanceStatus, ObjectInfo, ServiceError
 
 from mistk.evaluation.server.controllers import evaluation_plugin_endpoint_controller
 from mistk.evaluation.plugin_manager import EREPluginManager
 import connexion
 from mistk import logger
+import mistk.cfg as cfg
 
 class EvaluationPluginTask:
     """
@@ -82,6 +84,8 @@ class EvaluationPluginEndpoint():
         self._current_task = None
         
         self._status_lock = RWLock() 
+        self._status_publisher = StatusPublisher(self._publish_state, 
+            float(cfg.get('WATCH', 'mistk.watch.status.interval', 0.1) or 0))
         self._task_lock = RWLock()
          
         self._old_tasks = list()
@@ -100,8 +104,19 @@ class EvaluationPluginEndpoint():
         
         :param port: The port on which to start the server, defaults to 8080
         """
-        self.http_server = wsgiserver.WSGIServer(self.app, port=port)
+        self.http_server = server_utils.create_server(self.app, port=port, 
+            status_watch=self._watch_status)
         self.http_server.start()
+        
+    def _watch_status(self, resource_version):
+        """
+        Creates a watch on the status to be consumed from the event loop of the http server
+        
+        :param resource_version: The minimum resource version to watch, or None
+        :return: An asynchronous generator of the serialized watch events
+        """
+        with self._status_lock.reader_lock:
+            return watch_manager.async_watch('status', resource_version, self._status)
 
     def _load_api_spec(self):
         """
@@ -177,7 +192,7 @@ class EvaluationPluginEndpoint():
             task.id = uuid.uuid4().hex
             task.status = 'queued'
             task.submitted = datetime.now()
-            ops = ['metrics', 'evaluate', 'terminate'] 
+            ops = ['metrics', 'evaluate', 'evaluate_batch', 'terminate'] 
                          
             if not task.operation in ops:
                 msg = "Operation %s must be one of %s" % (str(task.operation), str(ops))
@@ -210,6 +225,19 @@ class EvaluationPluginEndpoint():
         """
         Updates the state of the EvaluationEndpointService
         
+        :param state: The new state. If not given, the current state will be used.
+        :param payload: Additional data to attach to the state
+        """
+        if state is None and self._status_publisher.submit(payload):
+            return
+        # publish any pending payload first, so it cannot arrive after the new state
+        self._status_publisher.flush()
+        return self._publish_state(state, payload)
+
+    def _publish_state(self, state=None, payload=None):
+        """
+        Publishes a new status of the EvaluationEndpointService
+        
         :param state: The new state. If not given, the current state will be used.
         :param payload: Additional data to attach to the state
         """
@@ -263,6 +291,9 @@ class EvaluationPluginEndpoint():
                         mimetype="application/json")
                 else:         
                     return self._status
+        except watch_manager.ResourceExpiredError as ex:
+            logger.warning(str(ex))
+            return ServiceError(410, str(ex)), 410
         except RuntimeError as inst:
             msg = "Runtime Error while retrieving status of evaluation plugin: %s" % str(inst)
             logger.exception(msg)
@@ -328,15 +359,52 @@ class EvaluationPluginEndpoint():
         
         self.add_task(task)
         
-    def get_metrics(self):
+    def evaluate_batch(self, initParams):  # noqa: E501
+        """
+        Performs the evaluation defined for this plugin on several prediction sets
+        against the same ground truth
+    
+        :param initParams: Init Parameters for the evaluation. Based on EvaluationBatchSpecificationInitParams specification
+        :type initParams: dict | bytes
+    
+        :rtype: None
+        """
+        logger.debug("evaluate batch called")
+         
+        try:
+            if not isinstance(initParams, EvaluationBatchSpecificationInitParams) and cx.request.is_json:
+                initParams = mistk.data.utils.deserialize_model(cx.request.get_json(), EvaluationBatchSpecificationInitParams)
+            assert isinstance(initParams, EvaluationBatchSpecificationInitParams)
+            
+            task = EvaluationPluginTask(operation='evaluate_batch',
+                parameters={"ground_truth_path": initParams.ground_truth_path, 
+                            "input_data_paths": initParams.input_data_paths,
+                            "evaluation_input_format": initParams.evaluation_input_format,
+                            "evaluation_path": initParams.evaluation_path,
+                            "assessment_type": initParams.assessment_type,
+                            "metrics": initParams.metrics,
+                            "properties": initParams.properties})
+        except RuntimeError as inst:
+            msg = "Runtime Error while performing batch evaluation for plugin: %s" % str(inst)
+            logger.exception(msg)
+            return ServiceError(500, msg), 500
+        except Exception as ex:
+            msg = "Exception while performing batch evaluation for plugin: %s" % str(ex)
+            logger.exception(msg)
+            return ServiceError(500, msg), 500
+        
+        self.add_task(task)
+        
+    def get_metrics(self, assessmentType=None):
         """
         Returns metrics that can be evaluated for this plugin
     
+        :param assessmentType: Only return the metrics supporting this assessment type
         :rtype: List[Metric]
         """
         logger.debug("get_metrics called")
         try:
-            return self.plugin_manager._metric_list
+            return self._find_metrics(assessmentType)
         except RuntimeError as inst:
             msg = "Runtime Error while performing evaluation for plugin: %s" % str(inst)
             logger.exception(msg)
@@ -346,6 +414,63 @@ class EvaluationPluginEndpoint():
             logger.exception(msg)
             return ServiceError(500, msg), 500
         
+    def list_metrics(self, limit=None, continueToken=None, stream=None, assessmentType=None):
+        """
+        Returns a page of the metrics that can be evaluated for this plugin
+    
+        :param limit: The maximum number of metrics to return, defaults to all remaining metrics
+        :param continueToken: The continue token of the previous page
+        :param stream: Whether the metrics should be streamed as newline delimited json
+        :param assessmentType: Only list the metrics supporting this assessment type
+        :rtype: MistkMetricList
+        """
+        logger.debug("list_metrics called")
+        try:
+            # the version is read first, so a reload while listing expires the token
+            # rather than pairing an offset with metrics it was not computed on
+            version = self.plugin_manager.get_metrics_version()
+            metrics = self._find_metrics(assessmentType)
+            start = 0
+            if continueToken:
+                try:
+                    token_version, start = (int(part) for part in continueToken.split(':'))
+                except ValueError:
+                    token_version, start = version, -1
+                if token_version != version:
+                    msg = ("The metrics were reloaded since continueToken '%s' was returned, "
+                           "the metrics should be listed again without a continueToken"
+                           % continueToken)
+                    logger.warning(msg)
+                    return ServiceError(410, msg), 410
+                if not 0 <= start <= len(metrics):
+                    msg = "Invalid continueToken '%s'" % continueToken
+                    logger.warning(msg)
+                    return ServiceError(400, msg), 400
+            end = len(metrics) if not limit else min(start + limit, len(metrics))
+            if stream:
+                return Response(watch_manager.object_stream(metrics[i] for i in range(start, end)),
+                                mimetype="application/x-ndjson")
+            token = '%d:%d' % (version, end) if end < len(metrics) else None
+            return MistkMetricList(items=metrics[start:end], continue_token=token)
+        except RuntimeError as inst:
+            msg = "Runtime Error while listing metrics for plugin: %s" % str(inst)
+            logger.exception(msg)
+            return ServiceError(500, msg), 500
+        except Exception as ex:
+            msg = "Exception while listing metrics for plugin: %s" % str(ex)
+            logger.exception(msg)
+            return ServiceError(500, msg), 500
+        
+    def _find_metrics(self, assessment_type=None):
+        """
+        Returns the metrics supporting an assessment type, from the index of the plugin manager
+        
+        :param assessment_type: The assessment type, or None for all metrics
+        """
+        if assessment_type:
+            return self.plugin_manager.get_metrics_for_assessment_type(assessment_type)
+        return self.plugin_manager.get_metrics_list()
+        
     def get_api_version(self):
         """
         Returns the version of the MISTK API
@@ -0,0 +1,429 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Metric accumulators, which compute metrics from predictions fed in chunks, with memory 
+bounded by the number of labels rather than by the number of predictions
+"""
+
+from collections import Counter
+import itertools
+import logging
+import math
+import traceback
+
+import numpy as np
+
+from mistk.evaluation.util.align import align_chunks
+from mistk.evaluation.util.convert import csv_Predictions_to_DataFrames, csv_Groundtruth_to_DataFrames
+
+_logger = logging.getLogger(__name__)
+
+_AVERAGE_ARGS = {'average', 'pos_label', 'zero_division'}
+
+# the sklearn.metrics methods computed by the accumulators, with the arguments they support
+_CLASSIFICATION_METRICS = {
+    'accuracy_score': {'normalize'},
+    'hamming_loss': set(),
+    'confusion_matrix': set(),
+    'precision_score': _AVERAGE_ARGS,
+    'recall_score': _AVERAGE_ARGS,
+    'f1_score': _AVERAGE_ARGS,
+    'fbeta_score': _AVERAGE_ARGS | {'beta'},
+}
+_REGRESSION_METRICS = {
+    'mean_squared_error': {'multioutput'},
+    'mean_absolute_error': {'multioutput'},
+    'mean_squared_log_error': {'multioutput'},
+    'r2_score': {'multioutput'},
+    'explained_variance_score': {'multioutput'},
+}
+
+
+def accumulates(assessment_type, metric):
+    """
+    Returns whether a metric can be computed by accumulating predictions in chunks
+    
+    :param assessment_type: The evaluation assessment type
+    :param metric: The MistkMetric
+    """
+    methods = _REGRESSION_METRICS if assessment_type == 'Regression' else _CLASSIFICATION_METRICS
+    if metric.package != 'sklearn.metrics' or metric.method not in methods:
+        return False
+    parameters = metric.data_parameters
+    if (not parameters or not parameters.truth_labels or not parameters.prediction_labels
+            or parameters.truth_bounds or parameters.prediction_scores or parameters.prediction_bounds):
+        return False
+    args = metric.default_args or {}
+    if not set(args) <= methods[metric.method]:
+        return False
+    return (args.get('average') in (None, 'binary', 'micro', 'macro', 'weighted')
+            and args.get('multioutput', 'uniform_average') in ('raw_values', 'uniform_average'))
+
+
+def accumulate_metrics(assessment_type, metrics, predictions_path, ground_truth_path, 
+                       chunk_size, work_dir=None):
+    """
+    Computes metrics from the predictions and ground truth files read in chunks.  The 
+    files are aligned by id as by align_predictions, through temporary partition files 
+    when they have more rows than chunk_size.
+    
+    :param assessment_type: The evaluation assessment type
+    :param metrics: The MistkMetrics, which must be accumulated
+    :param predictions_path: The path of the predictions csv file
+    :param ground_truth_path: The path of the ground truth csv file
+    :param chunk_size: The number of rows read at once, which also bounds the size of 
+        the partitions
+    :param work_dir: The directory of the partition files, defaults to the system's 
+        temporary directory
+    :return: The tuple of the list of the ('ok', result) or ('error', traceback) of each 
+        metric, and of the label classes (None if not classification)
+    """
+    rows = max(_count_lines(predictions_path), _count_lines(ground_truth_path))
+    partitions = int(math.ceil(rows / float(chunk_size)))
+    accumulator = create_accumulator(assessment_type)
+    
+    stats = Counter()
+    chunks = align_chunks(csv_Predictions_to_DataFrames(predictions_path, chunk_size),
+                          csv_Groundtruth_to_DataFrames(ground_truth_path, chunk_size),
+                          partitions, work_dir)
+    try:
+        for results_df, truth_df, alignment in chunks:
+            stats.update(alignment)
+            accumulator.update(truth_df['labels'], results_df['labels'])
+    except ValueError:
+        # labels the metrics cannot be computed from, which fail every metric as they 
+        # would if computed at once
+        error = traceback.format_exc()
+        return [('error', error) for _ in metrics], None
+    finally:
+        chunks.close()
+    _logger.info('Aligned predictions with ground truth in %d partitions: %s' % (partitions, dict(stats)))
+    
+    results = []
+    for metric in metrics:
+        try:
+            results.append(('ok', accumulator.result(metric.method, metric.default_args or {})))
+        except Exception:
+            results.append(('error', traceback.format_exc()))
+    return results, accumulator.classes
+
+
+def create_accumulator(assessment_type):
+    """
+    Creates the accumulator of an assessment type.  Binary classifications have a single 
+    label per row, as the other classifications are assessed label by label.
+    
+    :param assessment_type: The evaluation assessment type
+    """
+    if assessment_type == 'Regression':
+        return RegressionAccumulator()
+    return ClassificationAccumulator(multilabel=assessment_type != 'BinaryClassification')
+
+
+class ClassificationAccumulator(object):
+    """
+    Accumulates the true positive, false positive and false negative counts of each label, 
+    the number of rows whose labels are all right and, of binary classifications, the 
+    confusion counts.  Metrics are computed, and fail, as sklearn computes them from label 
+    indicator matrices when multilabel, or from the labels otherwise.
+    """
+    
+    def __init__(self, multilabel=True):
+        """
+        Initializes the accumulator
+        
+        :param multilabel: Whether rows may have several labels
+        """
+        self.multilabel = multilabel
+        self.count = 0
+        self.exact = 0
+        self._labels = set()
+        self._tp = Counter()
+        self._fp = Counter()
+        self._fn = Counter()
+        self._confusion = Counter()
+    
+    @property
+    def classes(self):
+        """
+        Returns the sorted labels found in the ground truth or predictions
+        """
+        return sorted(self._labels)
+    
+    def update(self, truth_labels, prediction_labels):
+        """
+        Adds aligned rows of labels
+        
+        :param truth_labels: Series of the space separated ground truth labels of each row
+        :param prediction_labels: Series of the space separated predicted labels of each row
+        """
+        # the label of a binary classification row is its whole value, spaces included
+        parse = _label_set if self.multilabel else _label
+        truth = [parse(value) for value in truth_labels]
+        predictions = [parse(value) for value in prediction_labels]
+        if None in truth or None in predictions:
+            raise ValueError("Classification rows must have labels")
+        
+        self.count += len(truth)
+        self.exact += sum(1 for t, p in zip(truth, predictions) if t == p)
+        self._labels.update(itertools.chain.from_iterable(truth))
+        self._labels.update(itertools.chain.from_iterable(predictions))
+        self._tp.update(itertools.chain.from_iterable(t & p for t, p in zip(truth, predictions)))
+        self._fp.update(itertools.chain.from_iterable(p - t for t, p in zip(truth, predictions)))
+        self._fn.update(itertools.chain.from_iterable(t - p for t, p in zip(truth, predictions)))
+        if not self.multilabel:
+            self._confusion.update((next(iter(t)), next(iter(p))) for t, p in zip(truth, predictions))
+    
+    def result(self, method, args):
+        """
+        Computes a metric from the accumulated rows
+        
+        :param method: The name of the sklearn.metrics method
+        :param args: The arguments of the method, other than the labels
+        """
+        if not self.count:
+            raise ValueError("No predictions matched the ground truth")
+        if self.multilabel and len(self._labels) == 1:
+            # sklearn reads an indicator matrix of a single label as the binary labels 0 and 1
+            return self._indicator().result(method, args)
+        if method == 'accuracy_score':
+            return self.exact / float(self.count) if args.get('normalize', True) else float(self.exact)
+        if method == 'hamming_loss':
+            if not self.multilabel:
+                return 1 - self.exact / float(self.count)
+            wrong = sum(self._fp.values()) + sum(self._fn.values())
+            return wrong / float(self.count * len(self._labels))
+        if method == 'confusion_matrix':
+            if self.multilabel:
+                raise ValueError("multilabel-indicator is not supported")
+            classes = self.classes
+            return np.array([[self._confusion[(truth, prediction)] for prediction in classes] 
+                             for truth in classes], dtype=np.int64)
+        return self._score(method, args)
+    
+    def _indicator(self):
+        """
+        Returns the accumulator of the binary labels, 1 where the single label is found 
+        and 0 where it is not, of an accumulator of a single label
+        """
+        label, = self._labels
+        tp, fp, fn = self._tp[label], self._fp[label], self._fn[label]
+        tn = self.count - tp - fp - fn
+        binary = ClassificationAccumulator(multilabel=False)
+        binary.count = self.count
+        binary.exact = self.exact
+        binary._labels = {value for value, rows in ((1, tp + fp + fn), (0, tn + fp + fn)) if rows}
+        binary._tp = Counter({1: tp, 0: tn})
+        binary._fp = Counter({1: fp, 0: fn})
+        binary._fn = Counter({1: fn, 0: fp})
+        binary._confusion = Counter({(1, 1): tp, (1, 0): fn, (0, 1): fp, (0, 0): tn})
+        return binary
+    
+    def _score(self, method, args):
+        """
+        Computes a precision, recall or F-beta score
+        """
+        classes = self.classes
+        tp = np.array([self._tp[label] for label in classes], dtype=np.float64)
+        fp = np.array([self._fp[label] for label in classes], dtype=np.float64)
+        fn = np.array([self._fn[label] for label in classes], dtype=np.float64)
+        average = args.get('average', 'binary')
+        zero_division = args.get('zero_division', 'warn')
+        zero_division = 0.0 if zero_division == 'warn' else float(zero_division)
+        
+        if average == 'binary':
+            if self.multilabel or len(classes) > 2:
+                raise ValueError("Target is %s but average='binary'. Please choose another average setting" 
+                                 % ('multilabel-indicator' if self.multilabel else 'multiclass'))
+            # the labels are strings, which a pos_label of another type does not match
+            pos_label = args.get('pos_label', 1)
+            if pos_label not in classes and len(classes) >= 2:
+                raise ValueError("pos_label=%r is not a valid label. It should be one of %s" % (pos_label, classes))
+            # sklearn compares a single label with a pos_label not found as strings
+            index = next((index for index, label in enumerate(classes) 
+                          if label == pos_label or len(classes) == 1 and str(label) == str(pos_label)), None)
+            if index is None:
+                # a label missing from both the ground truth and the predictions
+                tp = fp = fn = np.zeros(1)
+            else:
+                tp, fp, fn = tp[index:index + 1], fp[index:index + 1], fn[index:index + 1]
+        elif average == 'micro':
+            tp, fp, fn = tp.sum(keepdims=True), fp.sum(keepdims=True), fn.sum(keepdims=True)
+        
+        if method == 'precision_score':
+            scores = _divide(tp, tp + fp, zero_division)
+        elif method == 'recall_score':
+            scores = _divide(tp, tp + fn, zero_division)
+        else:
+            beta2 = float(args.get('beta', 1.0)) ** 2 if method == 'fbeta_score' else 1.0
+            scores = _divide((1 + beta2) * tp, (1 + beta2) * tp + beta2 * fn + fp, zero_division)
+        
+        if average is None:
+            return scores
+        if average == 'weighted':
+            support = tp + fn
+            return float(np.average(scores, weights=support)) if support.sum() else zero_division
+        return float(scores.mean())
+
+
+class RegressionAccumulator(object):
+    """
+    Accumulates the count, mean and sum of squared deviations of the ground truth and of 
+    the residuals of each output, merged chunk by chunk so they are as accurate as when 
+    computed at once, and the sums of squared, absolute and squared log residuals.
+    """
+    
+    classes = None
+    
+    def __init__(self):
+        self.count = 0
+        self._sums = None
+    
+    def update(self, truth_labels, prediction_labels):
+        """
+        Adds aligned rows of values
+        
+        :param truth_labels: Series of the space separated ground truth values of each row
+        :param prediction_labels: Series of the space separated predicted values of each row
+        """
+        truth = _float_matrix(truth_labels)
+        predictions = _float_matrix(prediction_labels)
+        if truth.shape != predictions.shape:
+            raise ValueError("Ground truth and predictions have %d and %d outputs" 
+                             % (truth.shape[1], predictions.shape[1]))
+        if not len(truth):
+            return
+        residuals = truth - predictions
+        with np.errstate(invalid='ignore'):
+            log_residuals = np.log1p(truth) - np.log1p(predictions)
+        chunk = {'truth_mean': truth.mean(axis=0),
+                 'truth_m2': ((truth - truth.mean(axis=0)) ** 2).sum(axis=0),
+                 'residual_mean': residuals.mean(axis=0),
+                 'residual_m2': ((residuals - residuals.mean(axis=0)) ** 2).sum(axis=0),
+                 'squared': (residuals ** 2).sum(axis=0),
+                 'absolute': np.abs(residuals).sum(axis=0),
+                 'squared_log': (log_residuals ** 2).sum(axis=0),
+                 'negative': bool((truth < 0).any() or (predictions < 0).any())}
+        
+        if self._sums is None:
+            self._sums = chunk
+        elif self._sums['truth_mean'].shape != chunk['truth_mean'].shape:
+            raise ValueError("Rows have %d and %d outputs" 
+                             % (len(self._sums['truth_mean']), len(chunk['truth_mean'])))
+        else:
+            sums = self._sums
+            count, added = self.count, len(truth)
+            total = float(count + added)
+            for name in ('truth', 'residual'):
+                # pairwise merge of the means and sums of squared deviations
+                delta = chunk[name + '_mean'] - sums[name + '_mean']
+                sums[name + '_mean'] = sums[name + '_mean'] + delta * added / total
+                sums[name + '_m2'] = sums[name + '_m2'] + chunk[name + '_m2'] + delta ** 2 * count * added / total
+            for name in ('squared', 'absolute', 'squared_log'):
+                sums[name] = sums[name] + chunk[name]
+            sums['negative'] = sums['negative'] or chunk['negative']
+        self.count += len(truth)
+    
+    def result(self, method, args):
+        """
+        Computes a metric from the accumulated rows
+        
+        :param method: The name of the sklearn.metrics method
+        :param args: The arguments of the method, other than the values
+        """
+        if not self.count:
+            raise ValueError("No predictions matched the ground truth")
+        sums = self._sums
+        if method == 'mean_squared_error':
+            scores = sums['squared'] / self.count
+        elif method == 'mean_absolute_error':
+            scores = sums['absolute'] / self.count
+        elif method == 'mean_squared_log_error':
+            if sums['negative']:
+                raise ValueError("Mean Squared Logarithmic Error cannot be used when targets contain negative values.")
+            scores = sums['squared_log'] / self.count
+        elif self.count < 2:
+            scores = np.full(len(sums['squared']), np.nan)
+        elif method == 'r2_score':
+            scores = _explained(sums['squared'], sums['truth_m2'])
+        else:
+            scores = _explained(sums['residual_m2'], sums['truth_m2'])
+        
+        if args.get('multioutput', 'uniform_average') == 'raw_values':
+            return scores
+        return float(scores.mean())
+
+
+def _explained(residual, total):
+    """
+    Computes 1 - residual / total as sklearn does, 1 if both are zero and 0 if only the 
+    total is zero
+    """
+    scores = np.ones(len(total))
+    nonzero = total != 0
+    scores[nonzero] = 1 - residual[nonzero] / total[nonzero]
+    scores[~nonzero & (residual != 0)] = 0.0
+    return scores
+
+
+def _divide(numerator, denominator, zero_division):
+    """
+    Divides arrays, with zero_division where the denominator is zero
+    """
+    result = np.full(len(numerator), zero_division, dtype=np.float64)
+    nonzero = denominator != 0
+    result[nonzero] = numerator[nonzero] / denominator[nonzero]
+    return result
+
+
+def _label_set(value):
+    """
+    Returns the set of the space separated labels of a value, None if missing
+    """
+    return frozenset(value.split()) if isinstance(value, str) else None
+
+
+def _label(value):
+    """
+    Returns the set of the single label of a value, None if missing
+    """
+    return frozenset((value,)) if isinstance(value, str) else None
+
+
+def _float_matrix(values):
+    """
+    Returns the (rows, outputs) float array of a Series of space separated values
+    """
+    if not len(values):
+        return np.empty((0, 1))
+    if values.dtype.kind in 'biuf':
+        matrix = values.values.astype(np.float64)
+    else:
+        matrix = np.array([value.split() for value in values], dtype=np.float64)
+    return matrix.reshape(len(values), -1)
+
+
+def _count_lines(path):
+    """
+    Counts the lines of a file without holding it in memory
+    """
+    lines = 0
+    with open(path, 'rb') as reader:
+        for block in iter(lambda: reader.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return lines
@@ -0,0 +1,140 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Utilities for aligning predictions with their ground truth
+"""
+
+import logging
+import os
+import pickle
+import tempfile
+
+import pandas
+
+_logger = logging.getLogger(__name__)
+
+
+def align_predictions(results_df, truth_df, id_column='rowid'):
+    """
+    Aligns the ground truth rows with the prediction rows by joining them on their ids. 
+    The join looks the prediction ids up in a hash index of the ground truth ids, so 
+    neither frame is sorted.  Only the first row of a duplicate id is kept, and rows 
+    whose id is missing from the other frame are dropped.
+    
+    :param results_df: The predictions DataFrame
+    :param truth_df: The ground truth DataFrame
+    :param id_column: The name of the id column of both frames, defaults to 'rowid'
+    :returns: The (results_df, truth_df, stats) tuple of the aligned frames, in the order 
+        of the predictions, and a dictionary of the number of predictions, ground truth, 
+        matched, unmatched and duplicate ids
+    """
+    duplicate_results = results_df[id_column].duplicated()
+    duplicate_truth = truth_df[id_column].duplicated()
+    results_df = results_df[~duplicate_results.values]
+    truth_df = truth_df[~duplicate_truth.values]
+    truth_count = len(truth_df)
+    
+    positions = pandas.Index(truth_df[id_column]).get_indexer(results_df[id_column])
+    matched = positions >= 0
+    results_df = results_df[matched].reset_index(drop=True)
+    truth_df = truth_df.iloc[positions[matched]].reset_index(drop=True)
+    
+    count = len(results_df)
+    stats = {
+        'predictions': len(matched),
+        'ground_truth': truth_count,
+        'matched': count,
+        'unmatched_predictions': len(matched) - count,
+        'unmatched_ground_truth': truth_count - count,
+        'duplicate_predictions': int(duplicate_results.sum()),
+        'duplicate_ground_truth': int(duplicate_truth.sum()),
+    }
+    if stats['unmatched_predictions'] or stats['duplicate_predictions'] or stats['duplicate_ground_truth']:
+        _logger.warning("Predictions and ground truth do not match one to one: %s" % stats)
+    return results_df, truth_df, stats
+
+
+def align_chunks(results_chunks, truth_chunks, partitions, work_dir=None, id_column='rowid'):
+    """
+    Aligns predictions with their ground truth read in chunks, without holding either 
+    in memory at once.  The rows of both are hash partitioned on their ids into temporary 
+    files, so the rows sharing an id fall in the same partition, and the partitions are 
+    then aligned one at a time as by align_predictions.
+    
+    :param results_chunks: Iterable of the predictions DataFrames
+    :param truth_chunks: Iterable of the ground truth DataFrames
+    :param partitions: The number of partitions, chosen so a partition fits in memory.  
+        Chunks are concatenated in memory, rather than partitioned, if there is only one.
+    :param work_dir: The directory of the temporary files, defaults to the system's
+    :param id_column: The name of the id column of both frames, defaults to 'rowid'
+    :returns: Generator of the (results_df, truth_df, stats) tuple of each partition
+    """
+    if partitions <= 1:
+        yield align_predictions(_concat(results_chunks, id_column), _concat(truth_chunks, id_column), id_column)
+        return
+    
+    with tempfile.TemporaryDirectory(prefix='mistk-align-', dir=work_dir) as directory:
+        results_files = _partition(results_chunks, partitions, directory, 'predictions', id_column)
+        truth_files = _partition(truth_chunks, partitions, directory, 'ground_truth', id_column)
+        for results_file, truth_file in zip(results_files, truth_files):
+            yield align_predictions(_concat(_load(results_file), id_column), 
+                                    _concat(_load(truth_file), id_column), id_column)
+            for path in (results_file, truth_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _partition(chunks, partitions, directory, name, id_column):
+    """
+    Appends the rows of each chunk to the file of their partition
+    
+    :returns: The list of the partition file paths, which only exist for non empty partitions
+    """
+    paths = [os.path.join(directory, '%s-%d.pickle' % (name, index)) for index in range(partitions)]
+    for df in chunks:
+        hashes = pandas.util.hash_pandas_object(df[id_column], index=False).values
+        for index, part in df.groupby(hashes % partitions, sort=False):
+            with open(paths[index], 'ab') as writer:
+                pickle.dump(part, writer, protocol=pickle.HIGHEST_PROTOCOL)
+    return paths
+
+
+def _load(path):
+    """
+    Loads the frames appended to a partition file
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as reader:
+        while True:
+            try:
+                yield pickle.load(reader)
+            except EOFError:
+                return
+
+
+def _concat(frames, id_column):
+    """
+    Concatenates frames in order, with a new index
+    """
+    frames = list(frames)
+    if not frames:
+        return pandas.DataFrame(columns=[id_column, 'labels'])
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    return pandas.concat(frames, ignore_index=True)
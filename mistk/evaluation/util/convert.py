@@ -1,5 +1,8 @@
+from collections.abc import Sequence
 import csv
+import itertools
 import logging
+import warnings
 import pandas
 import numpy as np
 from  mistk.model.client import MistkDataRecord
@@ -8,52 +11,117 @@ _logger = logging.getLogger(__name__)
 
 def csv_Predictions_to_DataFrame(csv_file):
     logging.info("Reading predictions from " + csv_file)
-    results_csv = []
     possible_cols = ['rowid', 'labels', 'confidence', 'bounds']
+    results_df = _read_csv(csv_file, possible_cols)
+    return _mask_blank(results_df)
+
+def csv_Groundtruth_to_DataFrame(csv_file):
+    logging.info("Reading ground truth from " + csv_file)
+    possible_cols = ['rowid', 'labels', 'bounds']
+    return _read_csv(csv_file, possible_cols, short_rows=True)
+
+def csv_Predictions_to_DataFrames(csv_file, chunk_size):
+    """
+    Reads the predictions in DataFrames of at most chunk_size rows, so the file 
+    is never held in memory at once
+    """
+    logging.info("Reading predictions in chunks from " + csv_file)
+    possible_cols = ['rowid', 'labels', 'confidence', 'bounds']
+    for results_df in _read_csv_chunks(csv_file, possible_cols, chunk_size):
+        yield _mask_blank(results_df)
+
+def csv_Groundtruth_to_DataFrames(csv_file, chunk_size):
+    """
+    Reads the ground truth in DataFrames of at most chunk_size rows, so the file 
+    is never held in memory at once
+    """
+    logging.info("Reading ground truth in chunks from " + csv_file)
+    possible_cols = ['rowid', 'labels', 'bounds']
+    return _read_csv_chunks(csv_file, possible_cols, chunk_size)
+
+def _mask_blank(df):
+    """
+    Replaces the blank values of a DataFrame by missing values
+    """
+    for col in df.columns:
+        values = df[col]
+        if pandas.api.types.is_string_dtype(values):
+            blank = values.str.strip() == ''
+            if blank.any():
+                df[col] = values.mask(blank)
+    return df
+
+def _read_csv(csv_file, possible_cols, short_rows=False):
+    """
+    Reads a csv file, with or without a header line, into a DataFrame of strings.  The 
+    leading columns are named after the possible columns, in order, and the possible 
+    columns missing from the file are added with NaN values.
+
+    :param csv_file: The path of the csv file
+    :param possible_cols: The names of the leading columns
+    :param short_rows: Whether the values missing from rows shorter than the longest row
+        must be None.  Otherwise they may be empty strings, as are empty values.
+    :return: The DataFrame
+    """
     with open(csv_file) as fp:
         # Check if the file has a header line, skip if necessary
         has_header = csv.Sniffer().has_header(fp.read(2048))
         fp.seek(0)  # Rewind.
-        reader = csv.reader(fp)
-        # ignore header for now
-        if has_header:
-            next(reader)
-        for data in reader:
-            results_csv.append(data)        
-    results_df = pandas.DataFrame(results_csv)
-    # rename columns
-    for i, _ in enumerate(results_df.columns.values):
-        if i < len(possible_cols):
-            results_df.rename(columns = {i : possible_cols[i]}, inplace = True)
-    # create columns if they do not exist
-    for nancol in possible_cols[len(results_df.columns):len(possible_cols)]:
-        results_df[nancol] = np.nan
-    results_df = results_df.replace(r'^\s*$', np.nan, regex=True)
-    return results_df
+        try:
+            df = pandas.read_csv(fp, header=None, skiprows=1 if has_header else 0, dtype=object,
+                                 na_filter=False, skip_blank_lines=False, engine='c')
+            # the C parser fills the values missing from short rows with empty strings
+            if short_rows and len(df.columns) and (df[df.columns[-1]] == '').any():
+                df = None
+        except pandas.errors.ParserError:
+            # rows longer than the first
+            df = None
+        except pandas.errors.EmptyDataError:
+            df = pandas.DataFrame()
+        if df is None:
+            fp.seek(0)
+            reader = csv.reader(fp)
+            # ignore header for now
+            if has_header:
+                next(reader)
+            df = pandas.DataFrame(list(reader))
+    return _name_columns(df, possible_cols)
 
-def csv_Groundtruth_to_DataFrame(csv_file):
-    logging.info("Reading ground truth from " + csv_file)
-    truth_csv = []
-    possible_cols = ['rowid', 'labels', 'bounds']
+def _read_csv_chunks(csv_file, possible_cols, chunk_size):
+    """
+    Reads a csv file, with or without a header line, into DataFrames of strings of at 
+    most chunk_size rows.  The columns are named as by _read_csv, and the values missing 
+    from short rows are None.
+
+    :param csv_file: The path of the csv file
+    :param possible_cols: The names of the leading columns
+    :param chunk_size: The maximum number of rows of each DataFrame
+    :return: Generator of the DataFrames
+    """
     with open(csv_file) as fp:
         # Check if the file has a header line, skip if necessary
         has_header = csv.Sniffer().has_header(fp.read(2048))
         fp.seek(0)  # Rewind.
         reader = csv.reader(fp)
-        # ignore header for now
         if has_header:
-            next(reader)
-        for data in reader:
-            truth_csv.append(data) 
-    truth_df = pandas.DataFrame(truth_csv)
+            next(reader, None)
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            yield _name_columns(pandas.DataFrame(rows), possible_cols)
+
+def _name_columns(df, possible_cols):
+    """
+    Names the leading columns of a DataFrame after the possible columns, and adds the 
+    possible columns missing from it with NaN values
+    """
     # rename columns
-    for i, _ in enumerate(truth_df.columns.values):
-        if i < len(possible_cols):
-            truth_df.rename(columns = {i : possible_cols[i]}, inplace = True)
+    df.columns = possible_cols[:len(df.columns)] + list(df.columns[len(possible_cols):])
     # create columns if they do not exist
-    for nancol in possible_cols[len(truth_df.columns):len(possible_cols)]:
-        truth_df[nancol] = np.nan
-    return truth_df
+    for nancol in possible_cols[len(df.columns):]:
+        df[nancol] = np.nan
+    return df
 
 def csv_Predictions_to_MistkDataRecord(csv_file, set_id):
     """
@@ -95,7 +163,7 @@ def csv_Predictions_to_MistkDataRecord(csv_file, set_id):
                 _logger.debug(err)
                 raise Exception(err)
             if label_index is None:
-                err = "CSV header does not contain 'label' or 'labels' column for labels in file: " + str(csv)
+                err = "CSV header does not contain 'label' or 'labels' column for labels in file: " + str(csv_file)
                 _logger.debug(err)
                 raise Exception(err)
             
@@ -106,21 +174,20 @@ def csv_Predictions_to_MistkDataRecord(csv_file, set_id):
                 recordId = data[id_index].strip()
                 record_data = []
                 labels = data[label_index].strip()
-                i = 0 
+                # split the data related to the labels once per row
+                values = [(column, data[inds[0]].strip().split(' ')) for column, inds in indices.items()]
+                # bounds are special due to 4 values per bounding box
+                bounds = _split_bounds(data[bounds_index].strip()) if bounds_index else None
                 # labeled data may have more than one label per recordId
-                for label in labels.split(' '):
+                for i, label in enumerate(labels.split(' ')):
                     label_dict={}
                     label_dict['label'] = label
                     # append data related to each label
-                    for column, inds in indices.items(): 
-                        val = data[inds[0]].strip()
-                        label_dict[column] = val.split(' ')[i] 
-                    # bounds are special due to 4 values per bounding box
+                    for column, vals in values: 
+                        label_dict[column] = vals[i] 
                     if bounds_index:
-                        bounds = _split_bounds(data[bounds_index].strip())
                         label_dict['bounds'] = bounds[i]                     
                     record_data.append(label_dict)   
-                    i += 1
                 record = MistkDataRecord(record_id=recordId, referenced_set_id=set_id, values=record_data)
                 recordList.append(record)  
         # no header
@@ -132,23 +199,217 @@ def csv_Predictions_to_MistkDataRecord(csv_file, set_id):
                 confs = None
                 bounds = None
                 if len(data) > 2:
-                    confs = data[2].strip()
+                    confs = data[2].strip().split(' ') if data[2].strip() else None
                 if len(data) > 3:
-                    bounds = data[3].strip()
-                i = 0
-                for label in labels.split(' '):
+                    bounds = _split_bounds(data[3].strip()) if data[3].strip() else None
+                for i, label in enumerate(labels.split(' ')):
                     label_dict={}
                     label_dict['label'] = label
                     if confs:
-                        label_dict['confidence'] = confs.split(' ')[i]   
+                        label_dict['confidence'] = confs[i]   
                     if bounds:
-                        label_dict['bounds'] = _split_bounds(bounds)[i]
+                        label_dict['bounds'] = bounds[i]
                     record_data.append(label_dict)    
-                    i += 1  
                 record = MistkDataRecord(record_id=recordId, referenced_set_id=set_id, values=record_data)
                 recordList.append(record)
     return recordList
 
+def csv_Predictions_to_Columns(csv_file):
+    """
+    Convert csv to flat prediction columns, without creating an object per label.  
+    Confidences and bounds are parsed into float arrays, the other columns are kept as 
+    the string of each row.  The records of the columns are those of 
+    csv_Predictions_to_MistkDataRecord.
+    """
+    _logger.debug('Converting csv file ' + str(csv_file) + ' to prediction columns')
+    with open(csv_file) as fp:
+        # Check if the file has a header line, skip if necessary
+        has_header = csv.Sniffer().has_header(fp.read(2048)) # Size of buffer for header
+        fp.seek(0)  # Rewind.
+        try:
+            df = pandas.read_csv(fp, header=None, dtype=object, na_filter=False,
+                                 skip_blank_lines=True, engine='c')
+        except pandas.errors.ParserError:
+            # rows longer than the first
+            fp.seek(0)
+            df = pandas.DataFrame([data for data in csv.reader(fp) if data])
+        except pandas.errors.EmptyDataError:
+            df = pandas.DataFrame()
+    if has_header:
+        header, df = df.iloc[0].tolist(), df.iloc[1:]
+        id_index = label_index = bounds_index = None
+        indices = {}
+        # check for defined headers, the first of duplicate columns is used
+        for i, col in reversed(list(enumerate(header))):
+            if col in ('id', 'recordId'):
+                id_index = i
+            elif col in ('label', 'labels'):
+                label_index = i
+            elif col == 'bounds':
+                bounds_index = i
+            elif col is not None:
+                indices[col] = i
+        if id_index is None:
+            err = "CSV header does not contain 'id' or 'recordId' column for label id in file: " + str(csv_file)
+            _logger.debug(err)
+            raise Exception(err)
+        if label_index is None:
+            err = "CSV header does not contain 'label' or 'labels' column for labels in file: " + str(csv_file)
+            _logger.debug(err)
+            raise Exception(err)
+        confidence_index = indices.pop('confidence', None)
+    else:
+        id_index, label_index, confidence_index, bounds_index = 0, 1, 2, 3
+        indices = {}
+    
+    def column(index):
+        if index is None or index >= len(df.columns):
+            return np.full(len(df), '')
+        return np.char.strip(df[df.columns[index]].fillna('').to_numpy(dtype=str))
+    
+    record_ids = column(id_index)
+    # the labels of all the rows are split at once
+    labels = column(label_index)
+    counts = np.char.count(labels, ' ').astype(np.int64) + 1
+    label_offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(counts, out=label_offsets[1:])
+    labels = np.array(' '.join(labels).split(' ') if len(labels) else [], dtype=object)
+    
+    confidences = bounds = None
+    raw_columns = {}
+    if confidence_index is not None:
+        raw_columns['confidence'] = column(confidence_index)
+        confidences = _parse_floats(raw_columns['confidence'], counts, 1)
+    if bounds_index is not None:
+        raw_columns['bounds'] = column(bounds_index)
+        bounds = _parse_floats(raw_columns['bounds'], counts, 4).reshape(-1, 4)
+    for name, index in indices.items():
+        raw_columns[name] = column(index)
+    return PredictionColumns(record_ids, label_offsets, labels, confidences, bounds, raw_columns)
+
+def _parse_floats(values, counts, width):
+    """
+    Parses the space separated numbers of each row into the given number of values per 
+    label, and flattens them into a single float array.  The numbers of all the rows are 
+    parsed at once, blank rows are NaN.
+    
+    :param values: Array of the stripped string of each row
+    :param counts: Array of the number of labels of each row
+    :param width: The number of values per label
+    :return: The float array of count * width values per row
+    """
+    needed = counts * width
+    flat = np.full(needed.sum(), np.nan)
+    filled = values != ''
+    if not filled.any():
+        return flat
+    text = values[filled]
+    found = np.char.count(text, ' ').astype(np.int64) + 1
+    short = np.flatnonzero(found < needed[filled])
+    if len(short):
+        row = np.flatnonzero(filled)[short[0]]
+        raise ValueError("Row %d has %d labels but only %d values in a column with %d values per label"
+                         % (row, counts[row], found[short[0]], width))
+    with warnings.catch_warnings():
+        # numpy warns of, rather than rejects, text which is not numbers
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            numbers = np.fromstring(' '.join(text), dtype=np.float64, sep=' ')
+        except (DeprecationWarning, ValueError):
+            numbers = None
+    if numbers is None or len(numbers) != found.sum():
+        raise ValueError("Column with %d values per label has values which are not numbers "
+                         "separated by single spaces" % width)
+    # the first needed values of each filled row, the others are ignored
+    needed = needed[filled]
+    offsets = np.arange(needed.sum()) - np.repeat(np.cumsum(needed) - needed, needed)
+    flat_starts = (np.cumsum(counts * width) - counts * width)[filled]
+    number_starts = np.cumsum(found) - found
+    flat[np.repeat(flat_starts, needed) + offsets] = numbers[np.repeat(number_starts, needed) + offsets]
+    return flat
+
+
+class PredictionColumns(object):
+    """
+    Predictions held in flat columns. The labels of record i, and their confidences and 
+    bounds, are at positions label_offsets[i] to label_offsets[i + 1]. 
+    """
+    
+    def __init__(self, record_ids, label_offsets, labels, confidences=None, bounds=None, raw_columns=None):
+        """
+        Initializes the prediction columns
+        
+        :param record_ids: Array of the record ids
+        :param label_offsets: Array of the offsets of the labels of each record, with one more 
+            entry than record_ids
+        :param labels: Array of the labels
+        :param confidences: Optional float array of the confidence of each label, NaN if missing
+        :param bounds: Optional (n, 4) float array of the bounds of each label, NaN if missing
+        :param raw_columns: Optional dictionary of column names, including 'confidence' and 
+            'bounds', to arrays of the string of each record in the file, empty if missing
+        """
+        self.record_ids = record_ids
+        self.label_offsets = label_offsets
+        self.labels = labels
+        self.confidences = confidences
+        self.bounds = bounds
+        self.raw_columns = raw_columns or {}
+    
+    def __len__(self):
+        return len(self.record_ids)
+    
+    def records(self, set_id):
+        """
+        Returns a sequence of the predictions as MistkDataRecords, which are created 
+        when accessed
+        
+        :param set_id: The referenced set id of the records
+        """
+        return _MistkDataRecordView(self, set_id)
+    
+    def record(self, index, set_id):
+        """
+        Creates the MistkDataRecord of a prediction, as csv_Predictions_to_MistkDataRecord 
+        does.  Values are the strings of the file, missing values are left out.
+        
+        :param index: The index of the prediction
+        :param set_id: The referenced set id of the record
+        """
+        first, last = self.label_offsets[index], self.label_offsets[index + 1]
+        record_data = [{'label': label} for label in self.labels[first:last]]
+        for column, values in self.raw_columns.items():
+            if not values[index]:
+                continue
+            split = values[index].split(' ')
+            if column == 'bounds':
+                split = _split_bounds(values[index])
+            for label_dict, value in zip(record_data, split):
+                label_dict[column] = value
+        return MistkDataRecord(record_id=str(self.record_ids[index]), referenced_set_id=set_id, 
+                               values=record_data)
+
+
+class _MistkDataRecordView(Sequence):
+    """
+    Read-only sequence of MistkDataRecords created from prediction columns on access
+    """
+    
+    def __init__(self, columns, set_id):
+        self._columns = columns
+        self._set_id = set_id
+    
+    def __len__(self):
+        return len(self._columns)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('record index out of range')
+        return self._columns.record(index, self._set_id)
+
 def _split_bounds(bounds):
     bounding_boxes = []
     bounds_split = bounds.split(' ')
@@ -0,0 +1,102 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Utilities for combining the evaluation results of several prediction sets into a leaderboard
+"""
+
+import json
+import math
+import os
+import re
+
+# metrics whose name ends with one of these words are better when lower
+_LOWER_IS_BETTER = re.compile(r'(loss|error)$', re.IGNORECASE)
+
+
+def set_names(input_data_paths):
+    """
+    Names prediction sets after the last component of their input data paths.  Sets 
+    sharing a name are told apart by a numeric suffix.
+    
+    :param input_data_paths: The input data paths of the prediction sets
+    :returns: The list of the set names, in the order of the paths
+    """
+    names = []
+    used = set()
+    for path in input_data_paths:
+        base = os.path.basename(os.path.normpath(path)) or 'set'
+        name = base
+        suffix = 1
+        while name in used:
+            suffix += 1
+            name = '%s_%d' % (base, suffix)
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def rank_sets(results):
+    """
+    Ranks the prediction sets on each of their numeric metrics, best first.  Metrics 
+    whose name ends with 'loss' or 'error' are ranked in ascending order, the others 
+    in descending order.  Sets without a numeric value for a metric are left out of 
+    its ranking.
+    
+    :param results: Dictionary of the metric results of each set, by set name
+    :returns: Dictionary of the set names in rank order, by metric name
+    """
+    scores = {}
+    for name, metrics in results.items():
+        for metric, value in (metrics or {}).items():
+            if (isinstance(value, (int, float)) and not isinstance(value, bool) 
+                    and math.isfinite(value)):
+                scores.setdefault(metric, []).append((value, name))
+    
+    rankings = {}
+    for metric, values in scores.items():
+        lower_is_better = _LOWER_IS_BETTER.search(metric.rstrip()) is not None
+        values.sort(key=lambda entry: entry[0], reverse=not lower_is_better)
+        rankings[metric] = [name for _, name in values]
+    return rankings
+
+
+def write_leaderboard(evaluation_path, sets, assessment_type=None, ground_truth_path=None):
+    """
+    Writes the leaderboard.json file combining the results of several prediction sets
+    
+    :param evaluation_path: The directory in which the leaderboard is written
+    :param sets: List of (name, input_data_path, results_file, results) tuples of each set, 
+        results being the dictionary of its metric results
+    :param assessment_type: The assessment type of the evaluation
+    :param ground_truth_path: The ground truth path shared by the sets
+    :returns: The path of the leaderboard file
+    """
+    leaderboard = {
+        'assessment_type': assessment_type,
+        'ground_truth_path': ground_truth_path,
+        'sets': {name: {'input_data_path': input_data_path,
+                        'results_file': results_file,
+                        'metrics': results}
+                 for name, input_data_path, results_file, results in sets},
+    }
+    leaderboard['rankings'] = rank_sets({name: results for name, _, _, results in sets})
+    
+    filename = os.path.join(evaluation_path, 'leaderboard.json')
+    with open(filename, mode='w') as writer:
+        writer.write(json.dumps(leaderboard, indent=2))
+    return filename
@@ -0,0 +1,71 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Utilities for building the matrices passed to evaluation metrics
+"""
+
+import itertools
+import numpy as np
+
+
+def build_confidence_matrix(labels, confidences, classes, sparse=False):
+    """
+    Builds the matrix of the confidence of each class (column) for each prediction (row). 
+    Classes not predicted for a row have a confidence of 0.  If a class is predicted more 
+    than once for a row, the last confidence is used.
+    
+    :param labels: The predicted labels of each row, as a sequence of sequences
+    :param confidences: The confidences of the labels of each row, as a sequence of sequences 
+        of numbers or of strings representing numbers
+    :param classes: The class of each column, e.g. the classes_ of a MultiLabelBinarizer
+    :param sparse: Whether a scipy.sparse CSR matrix should be built instead of a dense array, 
+        defaults to False
+    :returns: The (rows, classes) confidence matrix
+    :raises ValueError: If a label is not one of the classes or a row has fewer 
+        confidences than labels
+    """
+    index = {label: column for column, label in enumerate(classes)}
+    counts = np.fromiter((len(row) for row in labels), dtype=np.int64, count=len(labels))
+    total = int(counts.sum())
+    try:
+        columns = np.fromiter((index[label] for label in itertools.chain.from_iterable(labels)),
+                              dtype=np.int64, count=total)
+    except KeyError as ex:
+        raise ValueError("Predicted label %s is not one of the classes" % ex)
+    values = np.array(list(itertools.chain.from_iterable(
+        row_confidences[:count] for row_confidences, count in zip(confidences, counts))),
+        dtype=np.float64)
+    if len(values) != total:
+        raise ValueError("Found %d confidences for %d predicted labels" % (len(values), total))
+    rows = np.repeat(np.arange(len(labels), dtype=np.int64), counts)
+    shape = (len(labels), len(index))
+    
+    if not sparse:
+        matrix = np.zeros(shape)
+        # the last of repeated indices is assigned
+        matrix[rows, columns] = values
+        return matrix
+    
+    from scipy.sparse import csr_matrix
+    keys = rows * shape[1] + columns
+    if len(np.unique(keys)) != len(keys):
+        # keep the last of the repeated entries, which csr_matrix would add up
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        rows, columns, values = rows[keep], columns[keep], values[keep]
+    return csr_matrix((values, (rows, columns)), shape=shape)
@@ -70,6 +70,7 @@ class AbstractModel (metaclass=ABCMeta):
         
         self._model_built = False
         self._response = None
+        self._concurrent_inference = False
         
     def update_status(self, payload):
         """
@@ -80,6 +81,25 @@ class AbstractModel (metaclass=ABCMeta):
         """
         self.endpoint_service.update_state(state=None, payload=payload)
                 
+    @property
+    def concurrent_inference(self) -> bool:
+        """
+        Returns whether this Model serves stream predictions concurrently
+        """
+        return self._concurrent_inference
+    
+    @concurrent_inference.setter
+    def concurrent_inference(self, enabled: bool):
+        """
+        Enables or disables concurrent inference.  Models whose do_stream_predict 
+        is thread-safe may enable this in their constructor, in which case stream predictions 
+        are run directly from a pool of worker threads while the model stays in the ready 
+        state, without any state transitions or status updates per request.
+        
+        :param enabled: True to serve stream predictions concurrently
+        """
+        self._concurrent_inference = enabled
+        
     @property
     def endpoint_service(self) -> ModelInstanceEndpoint:
         """
@@ -554,12 +574,31 @@ class AbstractModel (metaclass=ABCMeta):
             self.endpoint_service.put_response(ServiceError(500, msg))
             self.fail(str(ex))
     
+    def _do_concurrent_stream_predict(self, data_map: dict, details: bool=False):
+        """
+        Performs stream predictions without transitioning the state machine. Used in place 
+        of the stream_predict trigger when concurrent inference is enabled, so it may be
+        called from several threads at once. Errors are returned to the caller and do not
+        fail the model.
+        
+        :param data_map: Dictionary for streaming data. Generally, the key would be the data id or file name and the 
+            value would be the base64 encoded data.
+        :param details: Optional parameter for the model to provide additional details (in Markdown or HTML) within 
+            the response dictionary under the key 'details'.
+        :return: Dictionary of ids to predicted values
+        """
+        if self.state != 'ready':
+            raise RuntimeError("Stream predictions require the model to be 'ready', but it is '%s'" % self.state)
+        return self.do_stream_predict(data_map, details)
+    
     @abstractmethod
     def do_stream_predict(self, data_map: dict, details: bool=False):
         """
         Executes/resumes the prediction activity
 
-        :param data_map: A dictionary of ID keys to base64 encoded data
+        :param data_map: A dictionary of ID keys to base64 encoded data. Data sent to the 
+            streamPredictBinary endpoint is instead passed as read-only memoryviews, or 
+            NumPy arrays for payloads in the .npy format.
         :param details: Optional parameter for the model to provide additional details
         """
         pass
@@ -0,0 +1,228 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Module for gathering concurrent stream prediction requests into micro-batches
+"""
+
+import concurrent.futures
+from concurrent.futures import Future
+from queue import Queue, Empty
+import threading, time
+
+from mistk import logger
+
+# raised when setting the result of a future cancelled concurrently, before python 3.8 
+# the result is set without error
+_InvalidStateError = getattr(concurrent.futures, 'InvalidStateError', RuntimeError)
+
+
+class StreamPredictRequest:
+    """
+    A single caller's stream prediction request waiting to be batched.
+    """
+
+    def __init__(self, data_map, details=None):
+        """
+        Initializes the stream prediction request
+
+        :param data_map: Dictionary of IDs to the data to predict on
+        :param details: Optional flag indicating whether prediction details were requested
+        """
+        self.data_map = data_map or {}
+        self.details = details
+        self.future = Future()
+
+
+class StreamPredictBatcher:
+    """
+    Gathers concurrent stream prediction requests for a short window (or until a maximum
+    batch size is reached), merges their data maps into a single prediction call and
+    splits the response back out to each caller.
+    """
+
+    def __init__(self, predict, window=0.0, max_size=32):
+        """
+        Initializes the stream prediction batcher
+
+        :param predict: The function called with a merged data map and details flag
+            which returns the dictionary of IDs to predictions for the batch
+        :param window: The maximum time, in seconds, to wait for additional requests
+            to join a batch. A window of 0 only merges requests that are already waiting.
+        :param max_size: The maximum number of data items merged into a single batch
+        """
+        self._predict = predict
+        self._window = max(0.0, window)
+        self._max_size = max(1, max_size)
+
+        self._requests = Queue()
+        self._held = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(1)
+
+    def use_executor(self, executor, max_in_flight):
+        """
+        Dispatches batches on the executor provided so that several batches can be predicted
+        at once. By default, batches are predicted one at a time on the dispatcher thread.
+
+        :param executor: The executor on which batches will be predicted
+        :param max_in_flight: The maximum number of batches predicted at once. Requests
+            arriving while all batches are in flight are merged into the next batch.
+        """
+        self._executor = executor
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+
+    def predict(self, data_map, details=None, timeout=None):
+        """
+        Submits a stream prediction request and blocks until its batch has been predicted
+
+        :param data_map: Dictionary of IDs to the data to predict on
+        :param details: Optional flag indicating whether prediction details should be included
+        :param timeout: Optional time in seconds to wait for the prediction. A request 
+            which times out is withdrawn from its batch, or from the queue if it is not 
+            yet part of one.
+        :return: Dictionary of IDs to predictions for the data submitted by this caller
+        :raises concurrent.futures.TimeoutError: If the prediction is not available in time
+        """
+        request = StreamPredictRequest(data_map, details)
+        self._start()
+        self._requests.put(request)
+        try:
+            return request.future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if request.future.cancel():
+                raise
+            # the prediction arrived just as the wait timed out
+            return request.future.result()
+
+    def _start(self):
+        """
+        Starts the dispatcher thread if it is not already running
+        """
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stream-predict-batcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+        Dispatches batches of requests for as long as the process is running
+        """
+        while True:
+            slots = self._slots
+            slots.acquire()
+            batch = self._next_batch()
+            if self._executor:
+                self._executor.submit(self._dispatch, batch, slots)
+            else:
+                self._dispatch(batch, slots)
+
+    def _next_batch(self):
+        """
+        Collects the next batch of requests. Requests asking for prediction details are never
+        merged, as the details describe the whole batch. A request whose IDs collide with
+        IDs already in the batch, or which would exceed the maximum size, is held over
+        for the next batch.
+
+        :return: The list of requests in the batch
+        """
+        first = self._held or self._requests.get()
+        self._held = None
+        while first.future.cancelled():
+            # the caller gave up waiting before the request was batched
+            first = self._requests.get()
+        batch = [first]
+        if first.details:
+            return batch
+
+        keys = set(first.data_map)
+        deadline = time.monotonic() + self._window
+        while len(keys) < self._max_size:
+            timeout = deadline - time.monotonic()
+            try:
+                request = self._requests.get(timeout > 0, max(timeout, 0))
+            except Empty:
+                break
+            if request.future.cancelled():
+                continue
+            if (request.details or not keys.isdisjoint(request.data_map)
+                    or len(keys) + len(request.data_map) > self._max_size):
+                self._held = request
+                break
+            keys.update(request.data_map)
+            batch.append(request)
+        return batch
+
+    def _dispatch(self, batch, slots):
+        """
+        Runs the prediction for a batch, hands each caller its share of the response and
+        releases the batch's in-flight slot
+
+        :param batch: The list of requests in the batch
+        :param slots: The semaphore the in-flight slot was acquired from
+        """
+        try:
+            self._predict_batch(batch)
+        except Exception as ex:  #pylint: disable=broad-except
+            logger.exception("Error occurred dispatching stream prediction batch")
+            for request in batch:
+                if not request.future.done():
+                    try:
+                        request.future.set_exception(ex)
+                    except _InvalidStateError:
+                        pass
+        finally:
+            slots.release()
+
+    def _predict_batch(self, batch):
+        """
+        Runs the prediction for a batch and hands each caller its share of the response
+
+        :param batch: The list of requests in the batch
+        """
+        if len(batch) == 1:
+            _set_result(batch[0].future, self._predict(batch[0].data_map, batch[0].details))
+            return
+
+        merged = {}
+        for request in batch:
+            merged.update(request.data_map)
+        logger.debug('Predicting batch of %d requests with %d items', len(batch), len(merged))
+        response = self._predict(merged, batch[0].details)
+
+        for request in batch:
+            if isinstance(response, dict):
+                # keys the model added that are not data ids go to every caller
+                result = {k: v for k, v in response.items()
+                          if k in request.data_map or k not in merged}
+            else:
+                result = response
+            _set_result(request.future, result)
+
+
+def _set_result(future, result):
+    """
+    Sets the result of a request's future, unless its caller has stopped waiting on it
+    """
+    if future.cancelled():
+        return
+    try:
+        future.set_result(result)
+    except _InvalidStateError:
+        logger.debug('Discarding stream prediction result, the request timed out')
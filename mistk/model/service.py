@@ -15,30 +15,49 @@
 #
 ##############################################################################
 
+from concurrent.futures import Future, CancelledError, TimeoutError as FutureTimeoutError
 from concurrent.futures.thread import ThreadPoolExecutor
+from collections import deque
 from datetime import datetime
-import inspect, itertools, uuid
-import yaml, os, sys, pkg_resources, wsgiserver
+import heapq, inspect, itertools, threading, uuid
+import yaml, os, sys, pkg_resources
 
 import connexion as cx
-from queue import Queue
 from flask import Response
 from rwlock.rwlock import RWLock
 
 from mistk import logger
+import mistk.cfg as cfg
 from mistk.data import ModelInstanceInitParams as InitParams
 from mistk.data import ObjectInfo, ModelInstanceStatus, ServiceError, MistkDataset
 from mistk.watch import watch_manager
+from mistk.watch.status_publisher import StatusPublisher
+from mistk.model.batcher import StreamPredictBatcher
+from mistk.utils import frame_utils, server_utils
 from mistk.model.server.controllers import model_instance_endpoint_controller
 import mistk.data.utils as datautils
 
+# The task operations which return a response to the caller
+_response_operations = {'stream_predict'}
+
+# The priorities of task operations submitted without one, defaults to 0.  Stream
+# predictions have a caller waiting on them, so they skip ahead of queued tasks.
+_default_priorities = {'stream_predict': 10}
+
 class ModelInstanceTask:
     """
     A task to be submitted to the Model Instance that will be performed and report status of.
     """
     
+    # the task parameters are deliberately left out of the serialized task
+    swagger_types = {'id': str, 'operation': str, 'priority': int, 'submitted': datetime,
+                     'completed': datetime, 'status': str, 'message': str}
+    attribute_map = {'id': 'id', 'operation': 'operation', 'priority': 'priority', 
+                     'submitted': 'submitted', 'completed': 'completed', 'status': 'status', 
+                     'message': 'message'}
+    
     def __init__(self, operation, parameters = None, submitted = None, 
-                 completed = None, status = None, message = None):
+                 completed = None, status = None, message = None, priority = None):
         """
         Initializes the Model Instance Task
         
@@ -48,13 +67,17 @@ class ModelInstanceTask:
         :param completed: Optional flag indicating whether the task was completed
         :param status: Optional status of the task
         :param message: Optional text message regarding the status of the task        
+        :param priority: Optional priority of the task. Queued tasks with a higher priority 
+            are run first, tasks of equal priority are run in the order submitted.
         """
+        self.id = None
         self.operation = operation
         self.parameters = parameters
         self.submitted = submitted
         self.completed = completed
         self.status = status
         self.message = message
+        self.priority = priority if priority is not None else _default_priorities.get(operation, 0)
      
 class ModelInstanceEndpoint():
     
@@ -75,11 +98,26 @@ class ModelInstanceEndpoint():
         self._current_task = None
         
         self._status_lock = RWLock() 
+        self._status_publisher = StatusPublisher(self._publish_state, 
+            float(cfg.get('WATCH', 'mistk.watch.status.interval', 0.1) or 0))
         self._task_lock = RWLock()
-        
-        self._response_queue = Queue()
+        # held shared by concurrent stream predictions and exclusively by tasks
+        self._inference_lock = RWLock()
+        
+        # futures for the responses of in-flight tasks, keyed by task id
+        self._responses = {}
+        self._response_lock = threading.Lock()
+        self._response_timeout = float(cfg.get('MODEL', 'mistk.model.stream.timeout', 0) or 0) or None
+        self._task_context = threading.local()
+        self._stream_batcher = StreamPredictBatcher(self._stream_predict_batch,
+            window=float(cfg.get('MODEL', 'mistk.model.stream.batch.window', 0.0) or 0),
+            max_size=int(cfg.get('MODEL', 'mistk.model.stream.batch.size', 32) or 1))
          
-        self._old_tasks = list()
+        # queued tasks are kept in a heap of (-priority, sequence, task)
+        self._task_queue = []
+        self._task_sequence = itertools.count()
+        self._task_runner_active = False
+        self._old_tasks = deque(maxlen=int(cfg.get('MODEL', 'mistk.model.task.history', 100) or 1))
         self._thread_pool = ThreadPoolExecutor()
         
         info = ObjectInfo('ModelInstanceStatus', resource_version=1)
@@ -91,8 +129,19 @@ class ModelInstanceEndpoint():
         
         :param port: The port on which to start the server, defaults to 8080
         """
-        self.http_server = wsgiserver.WSGIServer(self.app, port=port)
+        self.http_server = server_utils.create_server(self.app, port=port, 
+            status_watch=self._watch_status)
         self.http_server.start()
+        
+    def _watch_status(self, resource_version):
+        """
+        Creates a watch on the status to be consumed from the event loop of the http server
+        
+        :param resource_version: The minimum resource version to watch, or None
+        :return: An asynchronous generator of the serialized watch events
+        """
+        with self._status_lock.reader_lock:
+            return watch_manager.async_watch('status', resource_version, self._status)
 
     def _load_api_spec(self):
         """
@@ -137,13 +186,19 @@ class ModelInstanceEndpoint():
         :param model: the new model to set
         """
         self._model = model
+        if getattr(model, 'concurrent_inference', False):
+            workers = int(cfg.get('MODEL', 'mistk.model.stream.workers', 4) or 1)
+            logger.info('Serving stream predictions concurrently with %d workers', workers)
+            self._stream_batcher.use_executor(
+                ThreadPoolExecutor(workers, thread_name_prefix='stream-predict'), workers)
                 
-    def initialize_model(self, initializationParameters):
+    def initialize_model(self, initializationParameters, priority=None):
         """
         Creates and returns an Task which initializes the model with the 
         optional parameters provided
         
         :param initializationParameters: The parameters used for initialization
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         logger.debug("Initialize model called")
@@ -156,37 +211,41 @@ class ModelInstanceEndpoint():
             task = ModelInstanceTask(operation='initialize',
                 parameters={"objectives": params.objectives, 
                             "props": params.model_properties, 
-                            "hparams": params.hyperparameters})
+                            "hparams": params.hyperparameters},
+                priority=priority)
             logger.debug('Created initialize model task', extra={'model_task': task})
         except RuntimeError as inst:
             msg = "Error during model initialization: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500
         
-        self.add_task(task)
+        return self.add_task(task)
         
-    def build_model(self, modelPath=None):
+    def build_model(self, modelPath=None, priority=None):
         """
         Creates and returns a Task which builds the model using the modelPath provided
         
         :param modelPath: The path to where the model image can be found
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         logger.debug("build model called")
         try:
             task = ModelInstanceTask(operation="build_model", 
-                                        parameters = {"path": modelPath})
-            self.add_task(task)
+                                        parameters = {"path": modelPath},
+                                        priority=priority)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while building model: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500    
         
-    def load_data(self, datasets):
+    def load_data(self, datasets, priority=None):
         """
         Creates and returns a Task which loads data into a model using the bindings provided
         
         :param datasets: dictionary mapping dataset function to dataset
+        :param priority: Optional priority of the task in the task queue
         :return: The create Task object
         """
         logger.debug("Load data called")
@@ -196,52 +255,57 @@ class ModelInstanceEndpoint():
                             key, ds in cx.request.get_json().items()}
                         
             task = ModelInstanceTask(operation="load_data",
-                        parameters = {"dataset_map": datasets})
-            self.add_task(task)
+                        parameters = {"dataset_map": datasets},
+                        priority=priority)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while loading data into model: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500 
 
-    def train(self):
+    def train(self, priority=None):
         """
         Creates and returns a Task which kicks off a training activity
         
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         logger.debug("Train called")
         try:
-            self.add_task(ModelInstanceTask(operation="train"))
+            return self.add_task(ModelInstanceTask(operation="train", priority=priority))
         except RuntimeError as inst:
             msg = "Error while kicking off training activity: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500
         
-    def save_model(self, modelPath):
+    def save_model(self, modelPath, priority=None):
         """
         Creates and returns a Task which saves the model to the path provided
         
         :param modelPath: The path where the model will be saved. 
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         try:
             task = ModelInstanceTask(operation="save_model", 
-                                    parameters = {"path": modelPath})
-            self.add_task(task)
+                                    parameters = {"path": modelPath},
+                                    priority=priority)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while saving model to path provided: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500            
         
-    def predict(self):
+    def predict(self, priority=None):
         """
         Creates and returns a Task which kicks off a prediction activity
         
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         logger.debug("Predict called")
         try:
-            self.add_task(ModelInstanceTask(operation="predict"))
+            return self.add_task(ModelInstanceTask(operation="predict", priority=priority))
         except RuntimeError as inst:
             msg = "Error while kicking off prediction activity: %s" % str(inst)
             logger.exception(msg)
@@ -249,88 +313,157 @@ class ModelInstanceEndpoint():
         
     def stream_predict(self, dataMap, details=None):
         """
-        Creates a Task which kicks off a stream prediction activity
+        Submits the data to the stream prediction batcher, which merges concurrent 
+        requests into a single Task that kicks off a stream prediction activity
         
         :param dataMap: Dictionary of IDs to b64 encoded data
         :return: Dictionary of IDs to predictions
         """
         try:
-            task = ModelInstanceTask(operation="stream_predict", 
-                                     parameters = {"data_map": dataMap,
-                                                  "details": details})
-            self.add_task(task)
-            resp = self._get_response()
+            resp = self._stream_batcher.predict(dataMap, details, timeout=self._response_timeout)
             logger.debug('Stream predict response ready.')
             # check if error from model queue response  
             if isinstance(resp, ServiceError):
-                return resp, 500
+                return resp, resp.code or 500
             else:
                 return resp
+        except FutureTimeoutError:
+            msg = "Timed out after %s seconds waiting for stream prediction" % self._response_timeout
+            logger.error(msg)
+            return ServiceError(504, msg), 504
         except RuntimeError as inst:
             msg = "Error while kicking off stream prediction activity: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500
 
-    def update_stream_properties(self, props):
+    def stream_predict_binary(self, dataFrames, details=None):
+        """
+        Decodes binary framed data without copying the payloads and submits it to the
+        stream prediction batcher, in the same way as stream_predict
+
+        :param dataFrames: The framed IDs and data, as described in mistk.utils.frame_utils
+        :return: Dictionary of IDs to predictions
+        """
+        try:
+            data_map = frame_utils.decode_frames(dataFrames)
+        except ValueError as ex:
+            msg = "Error while decoding stream prediction frames: %s" % str(ex)
+            logger.exception(msg)
+            return ServiceError(400, msg), 400
+        return self.stream_predict(data_map, details)
+
+    def _stream_predict_batch(self, data_map, details=None):
+        """
+        Creates a Task which kicks off a stream prediction activity for a batch of 
+        data and waits for the model's response
+        
+        :param data_map: Dictionary of IDs to b64 encoded data for the whole batch
+        :param details: Optional flag indicating whether prediction details should be included
+        :return: Dictionary of IDs to predictions, or a ServiceError
+        """
+        if getattr(self.model, 'concurrent_inference', False):
+            return self._concurrent_stream_predict(data_map, details)
+        
+        task = ModelInstanceTask(operation="stream_predict", 
+                                 parameters = {"data_map": data_map,
+                                              "details": details})
+        result = self.add_task(task)
+        if result is not task:
+            # the task was rejected, pass the reason back to each caller
+            err, code = result
+            return err if isinstance(err, ServiceError) else ServiceError(code, err)
+        return self._get_response(task, timeout=self._response_timeout)
+
+    def _concurrent_stream_predict(self, data_map, details=None):
+        """
+        Runs stream predictions directly on the model, bypassing the task and state 
+        machine, for models that have enabled concurrent inference
+        
+        :param data_map: Dictionary of IDs to b64 encoded data for the whole batch
+        :param details: Optional flag indicating whether prediction details should be included
+        :return: Dictionary of IDs to predictions, or a ServiceError
+        """
+        if not self._inference_lock.reader_lock.acquire(blocking=False):
+            with self._task_lock.reader_lock:
+                status = self._current_task.status if self._current_task else 'unknown'
+                operation = self._current_task.operation if self._current_task else 'unknown'
+            return ServiceError(400, "Cannot stream predict while a %s task is %s" % (operation, status))
+        try:
+            return self.model._do_concurrent_stream_predict(data_map, details)
+        except Exception as ex:  #pylint: disable=broad-except
+            msg = "Unexpected error occurred while running stream predict: %s" % str(ex)
+            logger.exception(msg)
+            return ServiceError(500, msg)
+        finally:
+            self._inference_lock.reader_lock.release()
+
+    def update_stream_properties(self, props, priority=None):
         """
         Creates a task for updating the streaming prediction properties.
 
         :param props: Dictionary of metadata properties to be used by the model
+        :param priority: Optional priority of the task in the task queue
         """
         try:
             task = ModelInstanceTask(operation="update_stream_properties",
-                                     parameters={"props": props})
-            self.add_task(task)
+                                     parameters={"props": props},
+                                     priority=priority)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while kicking off stream prediction activity: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500
         
-    def save_predictions(self, dataPath):
+    def save_predictions(self, dataPath, priority=None):
         """
         Creates and returns a Task which saves the predictions generated by a model
         to the path specified
         
         :param dataPath: The location in which to save the model predictions
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         try:
             task = ModelInstanceTask(
                 operation="save_predictions",
-                parameters = {"dataPath": dataPath})
+                parameters = {"dataPath": dataPath},
+                priority=priority)
 
-            self.add_task(task)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while saving predictions generated by model on path specified: %s" % str(inst)
             logger.exception(msg)
             return ServiceError(500, msg), 500 
 
-    def generate(self):
+    def generate(self, priority=None):
         """
         Creates and returns a Task which kicks off a generation activity
         
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         logger.debug("Generate called")
         try:
-            self.add_task(ModelInstanceTask(operation="generate"))
+            return self.add_task(ModelInstanceTask(operation="generate", priority=priority))
         except RuntimeError as inst:
             return ServiceError(500, str(inst)), 500
     
-    def save_generations(self, dataPath):
+    def save_generations(self, dataPath, priority=None):
         """
         Creates and returns a Task which saves the generations generated by a model
         to the path specified
         
         :param dataPath: The location in which to save the model generations
+        :param priority: Optional priority of the task in the task queue
         :return: The created Task object
         """
         try:
             task = ModelInstanceTask(
                 operation="save_generations",
-                parameters = {"dataPath": dataPath})
+                parameters = {"dataPath": dataPath},
+                priority=priority)
 
-            self.add_task(task)
+            return self.add_task(task)
         except RuntimeError as inst:
             msg = "Error while saving generations created by model on path specified: %s" % str(inst)
             logger.exception(msg)
@@ -405,6 +538,9 @@ class ModelInstanceEndpoint():
                         mimetype="application/json")
                 else:         
                     return self._status
+        except watch_manager.ResourceExpiredError as ex:
+            logger.warning(str(ex))
+            return ServiceError(410, str(ex)), 410
         except RuntimeError as inst:
             msg = "Error while retrieving status for ModelEndpointService: %s" % str(inst)
             logger.exception(msg)
@@ -425,22 +561,65 @@ class ModelInstanceEndpoint():
             return ServiceError(500, msg), 500
         
       
-    def delete_task(self, task):
+    def get_tasks(self):
         """
-        Deletes the specified Task.
-        This function is currently not supported
+        Retrieves the tasks of this ModelEndpointService: the queued tasks in the order
+        they will be run, the running task, and then the most recently completed tasks. 
         
-        :param task: The task to delete
+        :return: The list of tasks
         """
-        logger.debug("Ignoring delete task request", extra={'task':task})
-        return ServiceError(501, "Not currently supported"), 501
+        with self._task_lock.reader_lock:
+            tasks = [task for _, _, task in sorted(self._task_queue)]
+            if self._current_task and self._current_task.status == 'running':
+                tasks.append(self._current_task)
+            tasks.extend(self._old_tasks)
+        return tasks
+    
+    def delete_task(self, taskId):
+        """
+        Cancels the specified Task.  Only tasks which are still queued can be cancelled.
+        
+        :param taskId: The id of the task to cancel
+        :return: The cancelled task
+        """
+        logger.debug("Delete task called for task %s", taskId)
+        with self._task_lock.writer_lock:
+            task = self._dequeue_task(taskId, 'Cancelled before it was run')
+            if task:
+                return task
+            if self._current_task and self._current_task.id == taskId:
+                msg = "Cannot cancel task %s, it is %s" % (taskId, self._current_task.status)
+                return ServiceError(400, msg), 400
+            task = next((t for t in self._old_tasks if t.id == taskId), None)
+            if task:
+                msg = "Cannot cancel task %s, it is %s" % (taskId, task.status)
+                return ServiceError(400, msg), 400
+        return ServiceError(404, "Task %s was not found" % taskId), 404
+     
+    def _dequeue_task(self, task_id, message):
+        """
+        Removes a task from the queue and marks it cancelled, if it has not started yet.  
+        Must be called while holding the task writer lock.
+        
+        :param task_id: The id of the task
+        :param message: The reason the task was cancelled
+        :return: The cancelled task, or None if it was not queued
+        """
+        entry = next((e for e in self._task_queue if e[2].id == task_id), None)
+        if entry is None:
+            return None
+        self._task_queue.remove(entry)
+        heapq.heapify(self._task_queue)
+        self._finish_task(entry[2], 'cancelled', message)
+        return entry[2]
      
     def add_task(self, task):
         """
-        Adds a task to this ModelEndpointService and starts it using a pool of worker threads
+        Adds a task to the task queue of this ModelEndpointService.  Queued tasks are run one 
+        at a time, highest priority first, using a pool of worker threads.
         
-        :param task: The Task to register and start
-        :return: The running task
+        :param task: The Task to queue
+        :return: The queued task
         """
         try:
             task.id = uuid.uuid4().hex
@@ -456,16 +635,14 @@ class ModelInstanceEndpoint():
                 return ServiceError(400, msg), 400
          
             with self._task_lock.writer_lock:
-                if isinstance(self._current_task, ModelInstanceTask):
-                    status = self._current_task.status
-                    if not status == 'complete' and not status == 'failed':
-                        return "Cannot submit a task while current task is not complete.  Current task status is " + status, 400
-                if self._current_task:
-                    self._old_tasks.insert(0, self._current_task)
-                self._current_task = task
-                task.status = 'running'
-
-            self._thread_pool.submit(self._process_task)
+                if task.operation in _response_operations:
+                    with self._response_lock:
+                        self._responses[task.id] = Future()
+                heapq.heappush(self._task_queue, (-task.priority, next(self._task_sequence), task))
+                logger.debug('Queued %s task %s with priority %s', task.operation, task.id, task.priority)
+                if not self._task_runner_active:
+                    self._task_runner_active = True
+                    self._thread_pool.submit(self._run_tasks)
             return task
         
         except RuntimeError as inst:
@@ -477,6 +654,19 @@ class ModelInstanceEndpoint():
         """
         Updates the state of the ModelEndpointService
         
+        :param state: The new state. If not given, the current state will be used.
+        :param payload: Additional data to attach to the state
+        """
+        if state is None and self._status_publisher.submit(payload):
+            return
+        # publish any pending payload first, so it cannot arrive after the new state
+        self._status_publisher.flush()
+        return self._publish_state(state, payload)
+
+    def _publish_state(self, state=None, payload=None):
+        """
+        Publishes a new status of the ModelEndpointService
+        
         :param state: The new state. If not given, the current state will be used.
         :param payload: Additional data to attach to the state
         """
@@ -492,35 +682,131 @@ class ModelInstanceEndpoint():
             logger.exception(msg)
             return ServiceError(500, msg), 500
         
-    def put_response(self, response):
+    def put_response(self, response, task_id=None):
+        """
+        Completes the response of a task that is waiting on one
+        
+        :param response: The response of the task
+        :param task_id: The id of the task the response belongs to. Defaults to the
+            task being processed by the calling thread.
+        """
+        task_id = task_id or getattr(self._task_context, 'task_id', None)
+        with self._response_lock:
+            future = self._responses.get(task_id)
+            if future is None or future.done() or not future.set_running_or_notify_cancel():
+                logger.warning('Discarding response for task %s, nothing is waiting on it', task_id)
+                return
+            future.set_result(response)
+        
+    def cancel_response(self, task_id):
+        """
+        Cancels the response of a task so that it will be discarded once the 
+        task completes
+        
+        :param task_id: The id of the task
+        :return: True if the response was cancelled, False otherwise
         """
-        Adds a response to the response queue
+        with self._response_lock:
+            future = self._responses.pop(task_id, None)
+        return future is not None and future.cancel()
+        
+    def _get_response(self, task, timeout=None):
         """
-        self._response_queue.put(response)
+        Waits for the response of the task provided
         
-    def _get_response(self):
+        :param task: The task to wait on
+        :param timeout: Optional time in seconds to wait for the response. The response
+            is cancelled if it is not available in time, and the task is removed from 
+            the queue if it has not started yet. 
+        :return: The response of the task, or a ServiceError
         """
-        Pops the latest response on the response queue
-        """        
-        return self._response_queue.get()
+        with self._response_lock:
+            future = self._responses.get(task.id)
+        if future is None:
+            return ServiceError(500, "No response is expected for task %s" % task.id)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if not self.cancel_response(task.id) and future.done():
+                # the response arrived just as the wait timed out
+                return future.result()
+            msg = "Timed out after %s seconds waiting for %s task %s" % (timeout, task.operation, task.id)
+            logger.error(msg)
+            # nobody will read the response, so the model should not spend time on it
+            with self._task_lock.writer_lock:
+                dequeued = self._dequeue_task(task.id, msg)
+            if dequeued:
+                logger.debug('Removed %s task %s from the queue', task.operation, task.id)
+            return ServiceError(504, msg)
+        except CancelledError:
+            return ServiceError(500, "Response for task %s was cancelled" % task.id)
+        finally:
+            with self._response_lock:
+                self._responses.pop(task.id, None)
                      
-    def _process_task(self):
+    def _run_tasks(self):
+        """
+        Runs the queued Tasks one at a time until the queue is empty
         """
-        Processes the currently queued Task and updates its status as appropriate        
+        while True:
+            with self._task_lock.writer_lock:
+                if not self._task_queue:
+                    self._task_runner_active = False
+                    return
+                _, _, task = heapq.heappop(self._task_queue)
+                self._current_task = task
+                task.status = 'running'
+            self._process_task(task)
+            
+    def _finish_task(self, task, status, message=None):
         """
+        Marks a Task as finished and adds it to the task history.  Must be called while 
+        holding the task writer lock. 
+        
+        :param task: The finished Task
+        :param status: The final status of the task
+        :param message: Optional text message regarding the status of the task
+        """
+        task.status = status
+        task.completed = datetime.now()
+        if message:
+            task.message = message
+        self._old_tasks.appendleft(task)
+        if status == 'cancelled':
+            self.cancel_response(task.id)
+        
+    def _process_task(self, task):
+        """
+        Processes a Task and updates its status as appropriate.  If the model fails, 
+        the tasks still queued are cancelled.
+        
+        :param task: The Task to process
+        """
+        self._task_context.task_id = task.id
         try:
-            logger.info('Processing task %s', self._current_task.operation)
-            m = getattr(self.model, self._current_task.operation)
-            m(**(self._current_task.parameters or {}))
+            logger.info('Processing task %s', task.operation)
+            m = getattr(self.model, task.operation)
+            with self._inference_lock.writer_lock:
+                m(**(task.parameters or {}))
             with self._task_lock.writer_lock:
-                self._current_task.status = 'complete'
-                self._current_task.completed = datetime.now()
+                self._finish_task(task, 'complete')
             logger.info('Processing of task is complete')
         except Exception as ex:  #pylint: disable=broad-except
             logger.exception("Error occurred running task")
-            self._current_task.status = 'failed'
-            self._current_task.message = str(ex)
-            raise
+            with self._task_lock.writer_lock:
+                self._finish_task(task, 'failed', str(ex))
+        finally:
+            if getattr(self.model, 'state', None) == 'failed':
+                with self._task_lock.writer_lock:
+                    for _, _, queued in self._task_queue:
+                        self._finish_task(queued, 'cancelled', 'Cancelled after the model failed')
+                    self._task_queue.clear()
+            self._task_context.task_id = None
+            # make sure nothing is left waiting on a task that never responded
+            with self._response_lock:
+                future = self._responses.get(task.id)
+            if future is not None and not future.done():
+                self.put_response(ServiceError(500, "Task %s completed without a response" % task.id), task.id)
 
 
 def initializeEndpointController(handler, *modules):
@@ -23,7 +23,6 @@ import uuid
 import connexion as cx
 import pkg_resources
 import yaml
-import wsgiserver
 
 from flask import Response
 from rwlock.rwlock import RWLock
@@ -31,12 +30,15 @@ from rwlock.rwlock import RWLock
 
 import mistk.data.utils
 from mistk.watch import watch_manager
+from mistk.watch.status_publisher import StatusPublisher
+from mistk.utils import server_utils
 from mistk.data import TransformSpecificationInitParams, TransformInstanceStatus, ObjectInfo, ServiceError
 
 from mistk.transform.server.controllers import transform_plugin_endpoint_controller
 import mistk.transform
 import connexion
 from mistk import logger
+import mistk.cfg as cfg
 
 class TransformPluginTask:
     """
@@ -82,6 +84,8 @@ class TransformPluginEndpoint():
         self._current_task = None
         
         self._status_lock = RWLock() 
+        self._status_publisher = StatusPublisher(self._publish_state, 
+            float(cfg.get('WATCH', 'mistk.watch.status.interval', 0.1) or 0))
         self._task_lock = RWLock()
          
         self._old_tasks = list()
@@ -97,8 +101,19 @@ class TransformPluginEndpoint():
         
         :param port: The port on which to start the server, defaults to 8080
         """
-        self.http_server = wsgiserver.WSGIServer(self.app, port=port)
+        self.http_server = server_utils.create_server(self.app, port=port, 
+            status_watch=self._watch_status)
         self.http_server.start()
+        
+    def _watch_status(self, resource_version):
+        """
+        Creates a watch on the status to be consumed from the event loop of the http server
+        
+        :param resource_version: The minimum resource version to watch, or None
+        :return: An asynchronous generator of the serialized watch events
+        """
+        with self._status_lock.reader_lock:
+            return watch_manager.async_watch('status', resource_version, self._status)
 
     def _load_api_spec(self):
         """
@@ -194,6 +209,19 @@ class TransformPluginEndpoint():
         """
         Updates the state of the TransformPluginService
         
+        :param state: The new state. If not given, the current state will be used.
+        :param payload: Additional data to attach to the state
+        """
+        if state is None and self._status_publisher.submit(payload):
+            return
+        # publish any pending payload first, so it cannot arrive after the new state
+        self._status_publisher.flush()
+        return self._publish_state(state, payload)
+
+    def _publish_state(self, state=None, payload=None):
+        """
+        Publishes a new status of the TransformPluginService
+        
         :param state: The new state. If not given, the current state will be used.
         :param payload: Additional data to attach to the state
         """
@@ -242,6 +270,9 @@ class TransformPluginEndpoint():
                         mimetype="application/json")
                 else:         
                     return self._status
+        except watch_manager.ResourceExpiredError as ex:
+            logger.warning(str(ex))
+            return ServiceError(410, str(ex)), 410
         except RuntimeError as inst:
             msg = "Error while retrieving status for transform plugin. %s" % str(inst)
             logger.exception(msg)
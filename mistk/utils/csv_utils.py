@@ -15,19 +15,33 @@
 #
 ##############################################################################
 
-import sys, os, csv
-from csvvalidator import CSVValidator, write_problems
+import atexit, sys, os, csv, itertools, threading
+from concurrent.futures import Future, ProcessPoolExecutor
 
 from mistk import logger
+import mistk.cfg as cfg
 
+# columns of files without a header line, by position
+_PREDICTIONS_COLUMNS = {'id': 0, 'confidence': 2, 'bounds': 3}
+_GROUNDTRUTH_COLUMNS = {'id': 0, 'bounds': 2}
+# names of the id column in files with a header line
+_ID_COLUMNS = ('id', 'recordId', 'rowid')
 
-def validate_predictions_csv(file_path):
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def validate_predictions_csv(file_path, max_problems=100, background=False):
     """
     Validates a predictions csv file
     
     :param path: The directory or file path where the predictions 
         csv file can be found
-    :returns: True if the csv file is valid, false otherwise.
+    :param max_problems: The number of problems after which validation stops, 
+        0 to find all problems
+    :param background: Whether the file should be validated in a background process
+    :returns: True if the csv file is valid, false otherwise. A Future of the result 
+        if validated in the background.
     """
     logger.info("Validating Predictions CSV file at %s" % file_path)
     csv_file = ''
@@ -37,17 +51,21 @@ def validate_predictions_csv(file_path):
         csv_file = os.path.join(file_path, "predictions.csv")
     else:
         logger.error("No predictions file exists at %s" % file_path)
-        return False
+        return _result(False, background)
     
-    return _validate_csv(csv_file)
+    return _run(background, _validate_csv, csv_file, _PREDICTIONS_COLUMNS, max_problems)
 
-def validate_groundtruth_csv(file_path):
+def validate_groundtruth_csv(file_path, max_problems=100, background=False):
     """
     Validates a ground truth csv file
     
     :param path: The directory or file path where the ground truth 
         csv file can be found
-    :returns: True if the csv file is valid, false otherwise. 
+    :param max_problems: The number of problems after which validation stops, 
+        0 to find all problems
+    :param background: Whether the file should be validated in a background process
+    :returns: True if the csv file is valid, false otherwise. A Future of the result 
+        if validated in the background.
     """
     logger.info("Validating Ground Truth CSV file at %s" % file_path)
     csv_file = ''
@@ -57,52 +75,159 @@ def validate_groundtruth_csv(file_path):
         csv_file = os.path.join(file_path, "ground_truth.csv")
     else:
         logger.error("No groundtruth file exists at %s" % file_path)
-        return False
+        return _result(False, background)
+    
+    return _run(background, _validate_csv, csv_file, _GROUNDTRUTH_COLUMNS, max_problems)
+
+def _result(value, background):
+    """
+    Returns a result, wrapped in a completed Future if a background result was asked for
+    """
+    if not background:
+        return value
+    future = Future()
+    future.set_result(value)
+    return future
+
+def _run(background, fn, *args):
+    """
+    Calls a function, or submits it to the background process pool
     
-    return _validate_csv(csv_file)
+    :returns: The result of the function, or a Future of it
+    """
+    global _executor
+    if not background:
+        return fn(*args)
+    with _executor_lock:
+        if _executor is None:
+            workers = int(cfg.get('DATA', 'mistk.data.validation.workers', 2) or 1)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            atexit.register(_shutdown)
+    return _executor.submit(fn, *args)
+
+def _shutdown():
+    """
+    Shuts down the background process pool, if it was started, without waiting 
+    for validations still running
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        atexit.unregister(_shutdown)
+        executor.shutdown(wait=False)
 
-def _validate_csv(csv_file, output_file=None):
+def _validate_csv(csv_file, columns, max_problems=100, output_file=None):
     """
-    Validates a CSV file.
+    Validates a CSV file in a single pass, stopping after the given number of problems
     
     :param csv_file: The CSV file to validate
+    :param columns: Dictionary of the 'id', 'confidence' and 'bounds' columns to their 
+        positions in files without a header line
+    :param max_problems: The number of problems after which validation stops, 
+        0 to find all problems
     :param output_file: The optional output file to which problems should
         be written
         
     :returns: True if the CSV file is valid, false otherwise
     """
-    field_names = _get_header(csv_file)
-    
-    validator = CSVValidator(field_names)
-    # basic header and record length checks
-    validator.add_header_check('EX1', 'bad header')
-    validator.add_record_length_check('EX2', 'unexpected record length')
-    
-    with open(csv_file) as fp:
-        data = csv.reader(fp)
-        problems = validator.validate(data)
-    
-        if problems:
-            write_problems(problems, output_file or sys.stdout)
-            return False
-        else:
-            return True
-        
-def _get_header(csv_file):
+    problems = _iter_problems(csv_file, columns)
+    if max_problems:
+        problems = itertools.islice(problems, max_problems)
+    total = _write_problems(problems, output_file or sys.stdout, max_problems)
+    return total == 0
+
+def _iter_problems(csv_file, columns):
     """
-    Retireves the header for a CSV file as a list of column names
-    if it exists. Otherwise, returns None.
+    Generates the problems found in a CSV file: a bad header, unexpected record lengths, 
+    missing or duplicate ids and confidence or bounds values that are not numbers
     
-    :param csv_file: The path to the CSV file
-    
-    :returns: A list of header column names
-    """    
+    :param csv_file: The CSV file to validate
+    :param columns: Dictionary of the 'id', 'confidence' and 'bounds' columns to their 
+        positions in files without a header line
+    :returns: Generator of problem dictionaries, with a code, a message and the row 
+    """
     with open(csv_file) as fp:
-        has_header = csv.Sniffer().has_header(fp.read(2048))
+        try:
+            has_header = csv.Sniffer().has_header(fp.read(2048))
+        except csv.Error:
+            # too irregular to sniff, the rows are checked as they are
+            has_header = False
         fp.seek(0)  # Rewind.
-        reader = csv.reader(fp)
-        # ignore header for now
-        if has_header:
-            return next(reader)
-        else:
-            return None
\ No newline at end of file
+        id_index = columns.get('id')
+        confidence_index = columns.get('confidence')
+        bounds_index = columns.get('bounds')
+        length = None
+        ids = set()
+        for i, record in enumerate(csv.reader(fp)):
+            row = i + 1
+            if i == 0 and has_header:
+                length = len(record)
+                if len(set(record)) != len(record) or not all(col.strip() for col in record):
+                    yield {'code': 'EX1', 'message': 'bad header', 'row': row, 'record': tuple(record)}
+                id_index = next((record.index(col) for col in _ID_COLUMNS if col in record), 0)
+                confidence_index = record.index('confidence') if 'confidence' in record else None
+                bounds_index = record.index('bounds') if 'bounds' in record else None
+                continue
+            if length is None:
+                length = len(record)
+            if len(record) != length:
+                yield {'code': 'EX2', 'message': 'unexpected record length', 'row': row, 
+                       'record': record, 'length': len(record)}
+                continue
+            if id_index is not None and id_index < length:
+                record_id = record[id_index].strip()
+                if not record_id:
+                    yield {'code': 'EX3', 'message': 'missing id', 'row': row, 'record': record}
+                elif record_id in ids:
+                    yield {'code': 'EX3', 'message': 'duplicate id', 'row': row, 'record': record}
+                else:
+                    ids.add(record_id)
+            if confidence_index is not None and confidence_index < length \
+                    and not _are_numbers(record[confidence_index]):
+                yield {'code': 'EX4', 'message': 'confidence is not numeric', 'row': row, 
+                       'record': record}
+            if bounds_index is not None and bounds_index < length:
+                bounds = record[bounds_index].split()
+                if len(bounds) % 4 or not _are_numbers(record[bounds_index]):
+                    yield {'code': 'EX5', 'message': 'bounds are not groups of 4 numbers', 
+                           'row': row, 'record': record}
+
+def _are_numbers(value):
+    """
+    Checks whether all the space separated values of a field are numbers
+    """
+    try:
+        for number in value.split():
+            float(number)
+    except ValueError:
+        return False
+    return True
+
+def _write_problems(problems, file, limit=0):
+    """
+    Writes problems as restructured text to a file, as they are found
+    
+    :param problems: Iterable of problem dictionaries
+    :param file: The file to write to
+    :param limit: The number of problems after which validation stopped, if any
+    :returns: The number of problems written
+    """
+    w = file.write
+    counts = {}
+    total = 0
+    for p in problems:
+        if total == 0:
+            w("\n=================\nValidation Report\n=================\n\nProblems\n========\n")
+        total += 1
+        counts[p['code']] = counts.get(p['code'], 0) + 1
+        title = '%s - %s' % (p['code'], p['message'])
+        w('\n%s\n%s\n' % (title, '-' * len(title)))
+        for k in sorted(set(p) - {'code', 'message'}):
+            w(':%s: %s\n' % (k, p[k]))
+    if total:
+        w("\nSummary\n=======\n\nFound %s%s problem%s in total.\n\n" 
+          % ('at least ' if limit and total >= limit else '', total, 's' if total != 1 else ''))
+        for code in sorted(counts):
+            w(':%s: %s\n' % (code, counts[code]))
+    return total
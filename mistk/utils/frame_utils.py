@@ -0,0 +1,136 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Utilities for the binary framing used to stream prediction data without base64 encoding.
+
+A framed body is a sequence of frames, one per data item, each laid out as::
+
+    uint32 (big-endian)   length of the ID
+    bytes                 UTF-8 encoded ID
+    uint64 (big-endian)   length of the payload
+    bytes                 payload
+
+Payloads holding a NumPy .npy file (see numpy.save) are decoded into arrays, all
+other payloads are handed over as raw bytes.
+"""
+
+import io, struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_ID_LENGTH = struct.Struct('>I')
+_PAYLOAD_LENGTH = struct.Struct('>Q')
+_NPY_MAGIC = b'\x93NUMPY'
+
+
+def encode_frames(data_map):
+    """
+    Encodes a dictionary of IDs to data into a framed binary body
+
+    :param data_map: Dictionary of IDs to bytes-like objects or NumPy arrays.
+        Arrays are framed in the .npy format.
+    :returns: The framed bytes
+    """
+    body = bytearray()
+    for key, value in data_map.items():
+        if np is not None and isinstance(value, np.ndarray):
+            buf = io.BytesIO()
+            np.save(buf, value, allow_pickle=False)
+            value = buf.getbuffer()
+        key = str(key).encode('UTF-8')
+        value = memoryview(value).cast('B')
+        body += _ID_LENGTH.pack(len(key))
+        body += key
+        body += _PAYLOAD_LENGTH.pack(len(value))
+        body += value
+    return bytes(body)
+
+def decode_frames(body, arrays=True):
+    """
+    Decodes a framed binary body into a dictionary of IDs to data. Payloads are not copied,
+    they are read-only views over the body.
+
+    :param body: The framed bytes-like body
+    :param arrays: Whether .npy payloads should be decoded into NumPy arrays,
+        defaults to True. Ignored if NumPy is not installed.
+    :returns: Dictionary of IDs to memoryviews or (read-only) NumPy arrays
+    :raises ValueError: If the body is not validly framed, or has several frames with 
+        the same ID
+    """
+    view = memoryview(body).cast('B')
+    if not view.readonly:
+        view = view.toreadonly()
+    data_map = {}
+    offset, end = 0, len(view)
+    while offset < end:
+        try:
+            key_len, = _ID_LENGTH.unpack_from(view, offset)
+            offset += _ID_LENGTH.size
+            key = bytes(view[offset:offset + key_len]).decode('UTF-8')
+            offset += key_len
+            payload_len, = _PAYLOAD_LENGTH.unpack_from(view, offset)
+            offset += _PAYLOAD_LENGTH.size
+        except (struct.error, UnicodeDecodeError) as ex:
+            raise ValueError("Invalid frame header at offset %d: %s" % (offset, str(ex)))
+        if key in data_map:
+            raise ValueError("Duplicate frame id '%s' at offset %d" % (key, offset))
+        if offset + payload_len > end:
+            raise ValueError("Frame '%s' is truncated, expected %d bytes but found %d"
+                             % (key, payload_len, end - offset))
+        payload = view[offset:offset + payload_len]
+        offset += payload_len
+        if arrays and np is not None and payload[:len(_NPY_MAGIC)] == _NPY_MAGIC:
+            payload = _decode_npy(payload)
+        data_map[key] = payload
+    return data_map
+
+def _decode_npy(payload):
+    """
+    Decodes a .npy payload into a NumPy array backed by the payload's buffer
+
+    :param payload: memoryview holding the .npy file
+    :returns: The NumPy array
+    """
+    # the magic string, the version and the header length precede the header
+    prefix = 10 if len(payload) > 6 and payload[6] == 1 else 12
+    if len(payload) < prefix:
+        raise ValueError("Truncated .npy header, found %d bytes" % len(payload))
+    if prefix == 10:
+        header_end = prefix + struct.unpack_from('<H', payload, 8)[0]
+    else:
+        header_end = prefix + struct.unpack_from('<I', payload, 8)[0]
+    if header_end > len(payload):
+        raise ValueError("Truncated .npy header, expected %d bytes but found %d"
+                         % (header_end, len(payload)))
+    # only the header is copied to be parsed, the array data is used in place
+    header = io.BytesIO(bytes(payload[:header_end]))
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    if dtype.hasobject:
+        raise ValueError("Object arrays cannot be decoded from stream prediction frames")
+    count = 1
+    for dim in shape:
+        count *= dim
+    array = np.frombuffer(payload, dtype=dtype, count=count, offset=header_end)
+    return array.reshape(shape, order='F' if fortran_order else 'C')
@@ -0,0 +1,180 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Utilities for serving the MISTK endpoint services over http.
+
+The server backend is selected with the 'mistk.server.backend' property in the SERVER section
+of the MISTK config file:
+
+- wsgiserver (default): a thread per connection WSGI server
+- asgi: an asyncio server (uvicorn) which serves status watches as coroutines and all other
+  requests from a bounded pool of worker threads. Requires the uvicorn and a2wsgi packages.
+"""
+
+import asyncio, json
+from urllib.parse import parse_qs
+
+import wsgiserver
+
+from mistk import logger
+import mistk.cfg as cfg
+from mistk.watch.watch_manager import ResourceExpiredError
+
+try:
+    import uvicorn
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    uvicorn = None
+
+
+def create_server(app, port=8080, status_watch=None):
+    """
+    Creates an http server for an endpoint service using the configured backend
+
+    :param app: The WSGI application of the endpoint service
+    :param port: The port on which to start the server, defaults to 8080
+    :param status_watch: Optional function taking the minimum resource version to watch
+        and returning an asynchronous generator of status watch events (see
+        mistk.watch.async_watch). Used by the asgi backend to serve status watches.
+    :return: The server, to be started with start()
+    """
+    backend = cfg.get('SERVER', 'mistk.server.backend', 'wsgiserver') or 'wsgiserver'
+    if backend == 'asgi':
+        if uvicorn is None:
+            raise RuntimeError("The asgi server backend requires the uvicorn and a2wsgi packages")
+        workers = int(cfg.get('SERVER', 'mistk.server.workers', 10) or 10)
+        logger.info('Using asgi server backend with %d workers', workers)
+        return AsgiServer(AsgiApp(app, status_watch, workers), port)
+    elif backend == 'wsgiserver':
+        return wsgiserver.WSGIServer(app, port=port)
+    else:
+        raise ValueError("Unknown server backend '%s'" % backend)
+
+
+class AsgiServer:
+    """
+    Asyncio http server for an ASGI application
+    """
+
+    def __init__(self, app, port=8080):
+        """
+        Initializes the server
+
+        :param app: The ASGI application to serve
+        :param port: The port on which to serve, defaults to 8080
+        """
+        self._server = uvicorn.Server(uvicorn.Config(app, host='0.0.0.0', port=port, log_config=None))
+
+    def start(self):
+        """
+        Starts the server, blocking until it is stopped
+        """
+        self._server.run()
+
+    def stop(self):
+        """
+        Signals the server to stop
+        """
+        self._server.should_exit = True
+
+
+class AsgiApp:
+    """
+    ASGI application serving status watches natively on the event loop and passing
+    all other requests to the WSGI application of an endpoint service.
+    """
+
+    def __init__(self, app, status_watch=None, workers=10):
+        """
+        Initializes the ASGI application
+
+        :param app: The WSGI application of the endpoint service
+        :param status_watch: Optional function taking the minimum resource version to watch, 
+            None if not given, and returning an asynchronous generator of status watch events
+        :param workers: The number of threads serving WSGI requests
+        """
+        self._app = WSGIMiddleware(app, workers=workers)
+        self._status_watch = status_watch
+
+    async def __call__(self, scope, receive, send):
+        """
+        Handles an ASGI connection
+        """
+        if self._status_watch and scope['type'] == 'http' and scope['method'] == 'GET' \
+                and scope['path'].rstrip('/').endswith('/status'):
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            if query.get('watch', ['false'])[-1].lower() == 'true':
+                # as in get_status, no resource version watches from the current status only
+                version = query.get('resourceVersion', [''])[-1] or None
+                if version is not None:
+                    try:
+                        version = int(version)
+                    except ValueError:
+                        await self._send_error(send, 400, "Invalid resourceVersion '%s'" % version)
+                        return
+                try:
+                    events = self._status_watch(version)
+                except ResourceExpiredError as ex:
+                    await self._send_error(send, 410, str(ex))
+                    return
+                await self._stream(receive, send, events)
+                return
+        await self._app(scope, receive, send)
+
+    async def _send_error(self, send, code, message):
+        """
+        Sends an error response in the form of a ServiceError
+
+        :param send: The ASGI send function
+        :param code: The http status code
+        :param message: The error message
+        """
+        body = json.dumps({'code': code, 'message': message}).encode('UTF-8')
+        await send({'type': 'http.response.start', 'status': code,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _stream(self, receive, send, events):
+        """
+        Streams watch events to the client until it disconnects
+
+        :param receive: The ASGI receive function
+        :param send: The ASGI send function
+        :param events: The asynchronous generator of watch events
+        """
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+
+        async def pump():
+            async for line in events:
+                if isinstance(line, str):
+                    line = line.encode('UTF-8')
+                await send({'type': 'http.response.body', 'body': line, 'more_body': True})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await events.aclose()
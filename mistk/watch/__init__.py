@@ -15,4 +15,4 @@
 #
 ##############################################################################
 
-from .watch_manager import watch,notify_watch
+from .watch_manager import watch,async_watch,notify_watch,is_expired,ResourceExpiredError
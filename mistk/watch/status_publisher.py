@@ -0,0 +1,95 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Module for coalescing high frequency status payload updates
+"""
+
+import logging, threading, time
+
+logger = logging.getLogger("WATCH")
+
+_NOTHING = object()
+
+
+class StatusPublisher:
+    """
+    Publishes status payload updates from a background thread at most once per interval.
+    Payloads submitted within an interval replace each other, so only the latest is
+    published and submitting a payload never waits on the status lock or the watchers.
+    """
+
+    def __init__(self, publish, interval=0.1):
+        """
+        Initializes the status publisher
+
+        :param publish: The function called with a state of None and the payload to publish
+        :param interval: The time, in seconds, to gather payloads before publishing the latest.
+            An interval of 0 disables coalescing, in which case nothing is submitted.
+        """
+        self._publish = publish
+        self._interval = max(0.0, interval)
+        self._pending = _NOTHING
+        self._lock = threading.Lock()
+        self._has_pending = threading.Condition(self._lock)
+        # held while publishing, so a flush never overtakes a publish in progress
+        self._publish_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, payload):
+        """
+        Submits a payload to be published at the end of the current interval
+
+        :param payload: The status payload
+        :return: True if the payload was submitted, False if coalescing is disabled
+            and the payload should be published directly
+        """
+        if not self._interval:
+            return False
+        with self._lock:
+            self._pending = payload
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='status-publisher', daemon=True)
+                self._thread.start()
+            self._has_pending.notify()
+        return True
+
+    def flush(self):
+        """
+        Publishes the pending payload, if any, right away.  Called before a state change
+        so that the pending payload is not published after it.
+        """
+        with self._publish_lock:
+            with self._lock:
+                payload, self._pending = self._pending, _NOTHING
+            if payload is not _NOTHING:
+                self._publish(None, payload)
+
+    def _run(self):
+        """
+        Publishes the latest pending payload once per interval for as long as the
+        process is running
+        """
+        while True:
+            with self._lock:
+                while self._pending is _NOTHING:
+                    self._has_pending.wait()
+            time.sleep(self._interval)
+            try:
+                self.flush()
+            except Exception:  #pylint: disable=broad-except
+                logger.exception("Error occurred publishing status payload")
@@ -19,15 +19,70 @@
 Module for watching a resource stored in MISTK
 """
 
-import logging
+import asyncio, logging, threading
+from collections import deque
 from pubsub import pub
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 from mistk.data import MistkWatchEvent as WatchEvent
-from mistk.data.utils import PresumptiveJSONEncoder
+from mistk.data.utils import encode, encode_bytes
+import mistk.cfg as cfg
 
 keepalive_time = 5
 logger = logging.getLogger("WATCH")
 
+# the most recent versioned events of each resource, replayed to reconnecting watchers
+history_size = int(cfg.get('WATCH', 'mistk.watch.history', 100) or 0)
+_history = {}
+# the newest resource version of each resource dropped from its history
+_evicted = {}
+# held while publishing so that a new watch sees each event exactly once
+_history_lock = threading.RLock()
+# the number of events queued for a watcher before its oldest events are dropped
+queue_size = int(cfg.get('WATCH', 'mistk.watch.queue.size', 1000) or 0)
+
+
+class ResourceExpiredError(Exception):
+    """
+    Raised when a watch asks for changes older than the history kept of the resource
+    """
+    pass
+
+
+class _Subscriber:
+    """
+    The queue of events for a single watch.  When a slow watcher falls behind, the oldest 
+    queued events are dropped so that it catches up on the latest state of the resource. 
+    """
+    
+    def __init__(self, maxsize=0):
+        """
+        Initializes the subscriber
+        
+        :param maxsize: The maximum number of queued events, 0 for no limit
+        """
+        self.queue = Queue(maxsize)
+        self.qid = hex(id(self.queue))
+        self._lock = threading.Lock()
+        
+    def put(self, item, block=True, timeout=None):
+        """
+        Queues an event, never blocking the publisher.  Mirrors the signature of Queue.put, 
+        which the topic's listeners are validated against.
+        
+        :param item: The watch event
+        """
+        with self._lock:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except Full:
+                    try:
+                        self.queue.get_nowait()
+                        logger.debug("[%s] Watcher is falling behind, dropped its oldest event", self.qid)
+                    except Empty:
+                        pass
+
 
 def watch(rid, resource_version = None, init_value = None, init_value_op = "modified"):
     """
@@ -37,46 +92,169 @@ def watch(rid, resource_version = None, init_value = None, init_value_op = "modi
     :param resource_version: The minimum resource version to check. 
     :param init_value: The initial value of the object to watch
     :param init_value_op: The operation to watch for. One of {created, modified, deleted}
+    :raises ResourceExpiredError: If changes after the resource version are no longer kept
     """
-    queue = Queue()
-    qid = hex(id(queue))
+    subscriber = _Subscriber(queue_size)
+    queue = subscriber.queue
+    qid = subscriber.qid
     ver = resource_version or 0
     logger.debug("[%s] Watching %s for versions > %s", qid, rid, ver)
     
-    if init_value:
-        logger.debug("[%s] Initial value of %s is %s", qid, rid, str(init_value))
-        queue.put(WatchEvent(payload=init_value, event_type=init_value_op))
-        
-    pub.subscribe(queue.put, rid)
+    with _history_lock:
+        _replay(qid, rid, resource_version, subscriber.put)
+        if init_value:
+            logger.debug("[%s] Initial value of %s is %s", qid, rid, str(init_value))
+            subscriber.put(WatchEvent(payload=init_value, event_type=init_value_op))
+        pub.subscribe(subscriber.put, rid)
     
     def generator():
+        last = ver
         try:
             logger.debug("[%s] Taking the black.", qid)
             while True:
                 try:
                     event = queue.get(True, keepalive_time)
-                    event_str = str(PresumptiveJSONEncoder().encode(event))
-                    if hasattr(event.payload, 'object_info') and event.payload.object_info.resource_version > ver:
-                        logger.debug("[%s] yielding watch event %s", qid, event_str)
-                        yield event_str + "\n"
-                    elif hasattr(event.payload, 'resource_version') and event.payload.resource_version > ver:
-                        logger.debug("[%s] yielding watch event %s", qid, event_str)
-                        yield event_str + "\n"
-                    elif not hasattr(event.payload, 'object_info') and not hasattr(event.payload, 'resource_version'):
-                        logger.debug("[%s] yielding watch event %s", qid, event_str)
-                        yield event_str + "\n"
-                    else:
-                        logger.debug("[%s] watch event %s resource_version too low.  Skipping.", qid, event_str)
+                    event_str, last = _filter_event(qid, event, last)
+                    if event_str:
+                        yield event_str
                 except Empty:
                     logger.debug("[%s] Keepalive... this message may get annoying", qid)
                     yield ' '
                     yield ' '  # We do two of them because it takes two to recognize that the connection is closed
         finally:
             logger.debug("[%s] And now your watch has ended.", qid)
-            pub.unsubscribe(queue.put, rid)
+            pub.unsubscribe(subscriber.put, rid)
+            
+    return generator()
+
+def async_watch(rid, resource_version = None, init_value = None, init_value_op = "modified"):
+    """
+    Creates a watch on an object to be consumed from an asyncio event loop.  Events are 
+    handed to the loop as they are published, so a watch costs a coroutine rather than a 
+    thread blocked on a queue.  Must be called from the event loop's thread. 
+    
+    :param rid: The id of the object, used to name the subscriber queue
+    :param resource_version: The minimum resource version to check. 
+    :param init_value: The initial value of the object to watch
+    :param init_value_op: The operation to watch for. One of {created, modified, deleted}
+    :return: An asynchronous generator of the serialized watch events
+    :raises ResourceExpiredError: If changes after the resource version are no longer kept
+    """
+    loop = asyncio.get_event_loop()
+    queue = asyncio.Queue(queue_size)
+    qid = hex(id(queue))
+    ver = resource_version or 0
+    logger.debug("[%s] Watching %s asynchronously for versions > %s", qid, rid, ver)
+    
+    def enqueue(item):
+        # slow watchers drop their oldest events rather than holding up the publisher
+        while queue.full():
+            queue.get_nowait()
+            logger.debug("[%s] Watcher is falling behind, dropped its oldest event", qid)
+        queue.put_nowait(item)
+    
+    # mirrors the signature of Queue.put, which the topic's listeners are validated against
+    def put(item, block=True, timeout=None):
+        loop.call_soon_threadsafe(enqueue, item)
+        
+    with _history_lock:
+        _replay(qid, rid, resource_version, enqueue)
+        if init_value:
+            logger.debug("[%s] Initial value of %s is %s", qid, rid, str(init_value))
+            enqueue(WatchEvent(payload=init_value, event_type=init_value_op))
+        pub.subscribe(put, rid)
+    
+    async def generator():
+        last = ver
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive_time)
+                    event_str, last = _filter_event(qid, event, last)
+                    if event_str:
+                        yield event_str
+                except asyncio.TimeoutError:
+                    yield ' '
+        finally:
+            logger.debug("[%s] Asynchronous watch has ended.", qid)
+            pub.unsubscribe(put, rid)
             
     return generator()
-       
+
+def _event_version(event):
+    """
+    Retrieves the resource version of the payload of a watch event
+    
+    :param event: The watch event
+    :return: The resource version, or None if the payload is not versioned
+    """
+    if hasattr(event.payload, 'object_info'):
+        return event.payload.object_info.resource_version
+    return getattr(event.payload, 'resource_version', None)
+
+def _encode(event):
+    """
+    Serializes a watch event into a line of UTF-8 encoded json.  The line is cached on the 
+    event, so an event is serialized once no matter how many watchers it is delivered to. 
+    
+    :param event: The watch event
+    :return: The serialized event line
+    """
+    line = getattr(event, '_encoded_line', None)
+    if line is None:
+        line = event._encoded_line = encode_bytes(event) + b"\n"
+    return line
+
+def _filter_event(qid, event, ver):
+    """
+    Serializes a watch event if it is newer than the last resource version seen by the watch
+    
+    :param qid: The id of the watch, for logging
+    :param event: The watch event
+    :param ver: The last resource version seen by the watch
+    :return: The serialized event line, or None if the event is too old, and the last 
+        resource version seen including this event
+    """
+    version = _event_version(event)
+    if version is not None and version <= ver:
+        logger.debug("[%s] watch event version %s resource_version too low.  Skipping.", qid, version)
+        return None, ver
+    line = _encode(event)
+    logger.debug("[%s] yielding watch event %s", qid, line)
+    return line, ver if version is None else version
+
+def _replay(qid, rid, resource_version, put):
+    """
+    Replays the events of a resource kept in its history which are newer than the resource
+    version provided. Must be called while holding the history lock. 
+    
+    :param qid: The id of the watch, for logging
+    :param rid: The id of the object being watched
+    :param resource_version: The resource version last seen by the watcher, if any
+    :param put: The function to hand each replayed event to
+    :raises ResourceExpiredError: If changes after the resource version are no longer kept
+    """
+    if resource_version is None:
+        return
+    if is_expired(rid, resource_version):
+        raise ResourceExpiredError("Changes to %s after version %s are no longer available, the oldest "
+                                   "version kept is %s" % (rid, resource_version, _evicted[rid] + 1))
+    events = [e for e in _history.get(rid, ()) if _event_version(e) > resource_version]
+    logger.debug("[%s] Replaying %d events of %s", qid, len(events), rid)
+    for event in events:
+        put(event)
+
+def is_expired(rid, resource_version):
+    """
+    Checks whether changes to an object after the resource version provided are still 
+    kept in its watch history
+    
+    :param rid: The id of the object
+    :param resource_version: The resource version last seen by the watcher
+    :return: True if some of the changes after the resource version are no longer kept
+    """
+    with _history_lock:
+        return resource_version is not None and resource_version < _evicted.get(rid, 0)
 
 def notify_watch(rid, item, operation='modified'):
     """
@@ -87,7 +265,15 @@ def notify_watch(rid, item, operation='modified'):
     :param operation: The operation that triggered this notification
     """
     logger.debug("Notification received to resource %s: %s", rid, str(item))
-    pub.sendMessage(rid, item=WatchEvent(payload=item, event_type=operation))
+    event = WatchEvent(payload=item, event_type=operation)
+    with _history_lock:
+        version = _event_version(event)
+        if version is not None and history_size > 0:
+            history = _history.setdefault(rid, deque())
+            if len(history) == history_size:
+                _evicted[rid] = _event_version(history.popleft())
+            history.append(event)
+        pub.sendMessage(rid, item=event)
 
 def object_stream(objects):
     """
@@ -96,5 +282,5 @@ def object_stream(objects):
     :param objects: The objects to stream
     """
     for obj in objects:
-        yield str(PresumptiveJSONEncoder().encode(obj)) + "\n"
+        yield encode(obj) + "\n"
         
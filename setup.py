@@ -34,15 +34,20 @@ REQUIRES=[
     'six >= 1.12.0',
     'gevent == 1.4.0',
     'bottle == 0.12.16',
-    'flask == 1.0.2',
-    'csvvalidator >= 1.2'
+    'flask == 1.0.2'
 ]
 
+EXTRAS={
+    'asgi': ['uvicorn >= 0.13.0', 'a2wsgi >= 1.4.0'],
+    'json': ['orjson >= 3.0.0']
+}
+
 setuptools.setup(
     name='mistk',
     packages=setuptools.find_packages() + ['conf'],
     package_data={'conf': ['*.ini']},
     include_package_data=True,
     install_requires=REQUIRES,
+    extras_require=EXTRAS,
     use_scm_version = {"root": "..", "relative_to": __file__},
     setup_requires=['setuptools_scm'])
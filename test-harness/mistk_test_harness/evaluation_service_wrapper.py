@@ -58,10 +58,13 @@ class EvaluationServiceWrapper(object):
         """
         self._ti_api.evaluate(init_params=init_params)
         
-    def get_metrics(self):
+    def get_metrics(self, assessment_type=None):
         """
         Get the metrics defined for this specific evaluation that can be used to evaluate a model.
+        
+        :param assessment_type: Only get the metrics supporting this assessment type
         """
-    
+        if assessment_type:
+            return self._ti_api.get_metrics(assessment_type=assessment_type)
         return self._ti_api.get_metrics()
         
\ No newline at end of file
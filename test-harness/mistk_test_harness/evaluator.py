@@ -15,7 +15,7 @@
 #
 ##############################################################################
 
-import importlib
+import itertools
 import json
 import logging
 import os
@@ -28,6 +28,9 @@ from sklearn.preprocessing import MultiLabelBinarizer
 
 import mistk.data.utils as utils
 from mistk.data import Metric
+from mistk.evaluation.plugin_manager import resolve_metric
+from mistk.evaluation.util.align import align_predictions
+from mistk.evaluation.util.matrix import build_confidence_matrix
 
 def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_truth_path, evaluation_path):
     """
@@ -93,12 +96,9 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
     for nancol in possible_cols[len(truth_df.columns):len(possible_cols)]:
         truth_df[nancol] = np.nan
     
-    # match ground truth to results by id 
-    truth_df = truth_df.loc[truth_df['rowid'].isin(results_df['rowid'])]     
-        
-    # sort the rows by id
-    results_df.sort_values(by='rowid', inplace=True)
-    truth_df.sort_values(by='rowid', inplace=True)
+    # match ground truth to results by id
+    results_df, truth_df, alignment = align_predictions(results_df, truth_df)
+    logging.info('Aligned predictions with ground truth: %s' % alignment)
     
     if eval_type == "MultilabelClassification" or eval_type == "MulticlassClassification":
         # create matrices for labels and confidence
@@ -109,7 +109,7 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
         parsed_results_labels = (results_df['labels'].str.split().values.tolist()
                                  if results_df['labels'].dtype == 'object' 
                                  else np.array(np.transpose(np.matrix(results_df['labels'].values))))
-        label_mlb.fit(np.append(parsed_truth_labels, parsed_results_labels, axis=0))
+        label_mlb.fit(itertools.chain(parsed_truth_labels, parsed_results_labels))
         truth_labels_matrix = label_mlb.transform(parsed_truth_labels)
         results_labels_matrix = label_mlb.transform(parsed_results_labels)
         
@@ -117,14 +117,8 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
             parsed_confidence = (results_df['confidence'].str.split().values.tolist()
                                  if results_df['confidence'].dtype == 'object' 
                                  else np.array(np.transpose(np.matrix(results_df['confidence'].values))))
-            confidence_matrix = np.empty(results_labels_matrix.shape)
-            label_classes = label_mlb.classes_.tolist()
-            for row_index, row in enumerate(parsed_results_labels):
-                confidence_row = np.zeros(results_labels_matrix.shape[1])
-                for col_index, col in enumerate(row):
-                    label_pos = label_classes.index(col)
-                    confidence_row[label_pos] = np.float64(parsed_confidence[row_index][col_index])  #pylint: disable=no-member
-                confidence_matrix[row_index] = confidence_row
+            confidence_matrix = build_confidence_matrix(parsed_results_labels, parsed_confidence, 
+                                                        label_mlb.classes_)
     elif eval_type == "Regression":
         if truth_df['labels'].dtype == 'object':
             truth_labels_matrix = truth_df['labels'].str.split().values.tolist()
@@ -158,7 +152,6 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
                              else results_df['confidence'].values)
     
     eval_dict = {}
-    modules_cache = {}
     
     with open(os.path.join(os.path.dirname(__file__), 'defaults.json')) as reader:
         default_metrics = json.load(reader)
@@ -178,20 +171,9 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
     
     for counter, metric in enumerate(metrics_list):
         logging.info(metric.package + " : " +  metric.method)
-        if metric.package not in modules_cache:
-            module = importlib.import_module(metric.package)
-            if module:
-                modules_cache[metric.package] = module
-            else:
-                logging.warn("Cannot load " + metric.package)
-                continue
-        else:
-            logging.debug("Loading cached module")
-            module = modules_cache[metric.package]
-            
-        if hasattr(module, metric.method):
+        method = resolve_metric(metric.package, metric.method)
+        if method is not None:
             logging.debug("Calling " + metric.method + " in " + metric.package)
-            method = getattr(module, metric.method)
             
             args = metric.default_args or {}
             if metric.data_parameters.truth_labels:
@@ -241,7 +223,7 @@ def perform_assessment(eval_type, eval_input_path, eval_input_format, ground_tru
                 else:
                     eval_dict[metric.method] = evalResult
         else:
-            logging.warn(metric.method + " does not exist in " + metric.package)  
+            logging.warn("Cannot load " + metric.package + "." + metric.method)  
             
         logging.info("Completed metric " + str(counter + 1))
             
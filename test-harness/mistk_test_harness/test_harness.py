@@ -248,11 +248,14 @@ class TestHarness(object):
         """
         print('Evaluating...')
         
-        # Validate the input ground truth and predictions csv file
-        if not validate_groundtruth_csv(gt_validation_path):
+        # Validate the input ground truth and predictions csv files in parallel
+        gt_valid = validate_groundtruth_csv(gt_validation_path, background=True)
+        predictions_valid = (validate_predictions_csv(input_data_validation_path, background=True) 
+                             if "predictions" == evaluation_input_format else None)
+        if not gt_valid.result():
             msg = "Failed to validate ground truth csv file at %s" % gt_path
             raise Exception(msg)
-        if "predictions" == evaluation_input_format and not validate_predictions_csv(input_data_validation_path):
+        if predictions_valid and not predictions_valid.result():
             msg = "Failed to validate predictions csv file at %s" % input_data_path
             raise Exception(msg)
         
@@ -276,22 +279,23 @@ class TestHarness(object):
         else:
             assert False, ("Invalid state to start evaluation: %s" % st)
 
-        all_metrics = self._evaluation_service.get_metrics()
-        metrics = []
         # get all metrics for assessment type
+        type_metrics = self._evaluation_service.get_metrics(assessment_type)
         if metrics_names is None:
-            for metric in all_metrics:
-                if assessment_type in metric.assessment_types:
-                    metrics.append(metric)
+            metrics = list(type_metrics)
         # get metrics by name for assessment type
         else:
-            all_metric_names = []
-            for metric in all_metrics:
-                all_metric_names.append(metric.object_info.name)
+            metrics_by_name = {}
+            for metric in type_metrics:
+                metrics_by_name.setdefault(metric.object_info.name, metric)
+            metrics = []
             for metric_name in metrics_names:
-                assert metric_name in all_metric_names, ("Invalid metric name: %s . No metric exists with this name." % metric_name)
-                metric = all_metrics[all_metric_names.index(metric_name)]
-                assert assessment_type in metric.assessment_types, ("Metric %s cannot be evaluated for assessment type %s" % (metric_name, assessment_type))      
+                metric = metrics_by_name.get(metric_name)
+                if metric is None:
+                    # only the whole catalog tells an unknown metric from an unsupported one
+                    all_metric_names = {metric.object_info.name for metric in self._evaluation_service.get_metrics()}
+                    assert metric_name in all_metric_names, ("Invalid metric name: %s . No metric exists with this name." % metric_name)
+                    assert False, ("Metric %s cannot be evaluated for assessment type %s" % (metric_name, assessment_type))      
                 metrics.append(metric)
     
         # evaluate for metrics
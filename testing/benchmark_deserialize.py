@@ -0,0 +1,73 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Micro-benchmark of the swagger model deserialization in mistk.data.utils.
+
+Times the first (compiling) and the steady state deserialization of the payloads
+received on the hot paths of the endpoint services.  Usage:
+
+    python benchmark_deserialize.py [number]
+"""
+
+import json, os, sys, time, timeit
+
+import mistk.data.utils as datautils
+from mistk.data import (EvaluationSpecificationInitParams, MistkDataset, MistkMetric,
+                        ModelInstanceInitParams)
+
+METRICS_FILE = os.path.join(os.path.dirname(__file__), '..', 'test-harness',
+                            'mistk_test_harness', 'metrics.json')
+
+
+def _dataset(name):
+    return {'objectInfo': {'name': name, 'kind': 'MistkDataset'},
+            'dataPath': '/tmp/%s' % name, 'modality': 'image', 'format': 'png'}
+
+def _payloads():
+    with open(METRICS_FILE) as reader:
+        metrics = json.load(reader)
+    return [
+        ('load_data datasets', MistkDataset,
+         {name: _dataset(name) for name in ('train', 'test', 'validation')}, True),
+        ('initialize params', ModelInstanceInitParams,
+         {'objectives': ['training', 'prediction'], 'modelProperties': {'arch': 'densenet'},
+          'hyperparameters': {'lr': 0.01, 'epochs': 10}}, False),
+        ('metric list', MistkMetric, metrics, True),
+        ('evaluation params', EvaluationSpecificationInitParams,
+         {'assessment_type': 'MultiClass', 'metrics': metrics, 'input_data_path': '/tmp/predictions.csv',
+          'evaluation_input_format': 'predictions', 'ground_truth_path': '/tmp/ground_truth.csv',
+          'evaluation_path': '/tmp/eval', 'properties': {}}, False),
+    ]
+
+def _decode(klass, data, many):
+    if not many:
+        return datautils.deserialize_model(data, klass)
+    items = data.values() if isinstance(data, dict) else data
+    return [datautils.deserialize_model(item, klass) for item in items]
+
+def main(number=2000):
+    print('%-20s %14s %14s' % ('payload', 'first (us)', 'cached (us)'))
+    for name, klass, data, many in _payloads():
+        start = time.perf_counter()
+        _decode(klass, data, many)
+        first = (time.perf_counter() - start) * 1e6
+        cached = min(timeit.repeat(lambda: _decode(klass, data, many), number=number, repeat=5))
+        print('%-20s %14.1f %14.1f' % (name, first, cached / number * 1e6))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
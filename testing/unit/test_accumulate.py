@@ -0,0 +1,191 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.util.accumulate
+"""
+
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from mistk.evaluation.util import accumulate
+from mistk.evaluation.util.align import align_predictions
+from mistk.evaluation.util.convert import csv_Predictions_to_DataFrame, csv_Groundtruth_to_DataFrame
+
+try:
+    import sklearn.metrics
+    from sklearn.preprocessing import MultiLabelBinarizer
+except ImportError:
+    sklearn = None
+
+
+class _Object(object):
+    
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _metric(method, **args):
+    parameters = _Object(truth_labels='y_true', prediction_labels='y_pred', truth_bounds=None, 
+                         prediction_scores=None, prediction_bounds=None)
+    return _Object(package='sklearn.metrics', method=method, default_args=args or None, 
+                   data_parameters=parameters)
+
+_AVERAGES = [{}, {'average': 'binary'}, {'average': 'micro'}, {'average': 'macro'}, 
+             {'average': 'weighted'}, {'average': None}, {'average': 'macro', 'zero_division': 1},
+             {'average': 'binary', 'pos_label': '1'}, {'average': 'binary', 'pos_label': 'b'}]
+
+_CLASSIFICATION_METRICS = ([_metric('accuracy_score'), _metric('accuracy_score', normalize=False),
+                            _metric('hamming_loss'), _metric('confusion_matrix')] 
+                           + [_metric(method, **args) for method in ('precision_score', 'recall_score', 'f1_score') 
+                              for args in _AVERAGES]
+                           + [_metric('fbeta_score', beta=0.5, **args) for args in _AVERAGES])
+
+_REGRESSION_METRICS = [_metric(method, **args) 
+                       for method in ('mean_squared_error', 'mean_absolute_error', 'mean_squared_log_error', 
+                                      'r2_score', 'explained_variance_score') 
+                       for args in ({}, {'multioutput': 'raw_values'})]
+
+
+@unittest.skipIf(sklearn is None, 'scikit-learn is not installed')
+class AccumulateTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.predictions_path = os.path.join(self.directory, 'predictions.csv')
+        self.ground_truth_path = os.path.join(self.directory, 'ground_truth.csv')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def _write(self, assessment_type, labels, rows=60, outputs=1, seed=0):
+        """
+        Writes predictions and ground truth of random labels, with duplicate predictions and 
+        ground truth missing predictions
+        """
+        rng = random.Random(seed)
+        def label():
+            if assessment_type == 'Regression':
+                return ' '.join('%.3f' % rng.uniform(*labels) for _ in range(outputs))
+            if assessment_type == 'MultilabelClassification':
+                return ' '.join(rng.sample(labels, rng.randint(1, min(3, len(labels)))))
+            return rng.choice(labels)
+        ids = list(range(rows))
+        rng.shuffle(ids)
+        with open(self.predictions_path, 'w') as writer:
+            for row in ids[:rows - 5] + ids[:3]:
+                writer.write('%d,%s\n' % (row, label()))
+        with open(self.ground_truth_path, 'w') as writer:
+            for row in range(rows + 4):
+                writer.write('%d,%s\n' % (row, label()))
+    
+    def _full(self, assessment_type, metric):
+        """
+        Computes a metric from the files loaded at once, as the sklearn evaluation does
+        """
+        results_df, truth_df, _ = align_predictions(csv_Predictions_to_DataFrame(self.predictions_path), 
+                                                    csv_Groundtruth_to_DataFrame(self.ground_truth_path))
+        if assessment_type in ('MulticlassClassification', 'MultilabelClassification'):
+            truth = truth_df['labels'].str.split().values.tolist()
+            results = results_df['labels'].str.split().values.tolist()
+            binarizer = MultiLabelBinarizer().fit(itertools.chain(truth, results))
+            truth, results = binarizer.transform(truth), binarizer.transform(results)
+        elif assessment_type == 'Regression':
+            truth = [np.array(value.split(), dtype=np.float64) for value in truth_df['labels']]
+            results = [np.array(value.split(), dtype=np.float64) for value in results_df['labels']]
+        else:
+            truth, results = truth_df['labels'].values, results_df['labels'].values
+        return getattr(sklearn.metrics, metric.method)(truth, results, **(metric.default_args or {}))
+    
+    def _assert_matches_full(self, assessment_type, metrics):
+        metrics = [metric for metric in metrics if accumulate.accumulates(assessment_type, metric)]
+        self.assertTrue(metrics)
+        # a single chunk, and chunks aligned through several partitions
+        for chunk_size in (1000, 7):
+            results, classes = accumulate.accumulate_metrics(assessment_type, metrics, self.predictions_path, 
+                                                             self.ground_truth_path, chunk_size, self.directory)
+            for metric, (status, result) in zip(metrics, results):
+                message = '%s %s %s in chunks of %d' % (assessment_type, metric.method, metric.default_args, chunk_size)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    try:
+                        expected = self._full(assessment_type, metric)
+                    except ValueError:
+                        self.assertEqual(status, 'error', message)
+                        continue
+                self.assertEqual(status, 'ok', message + '\n' + str(result))
+                np.testing.assert_allclose(np.asarray(result, dtype=np.float64), 
+                                           np.asarray(expected, dtype=np.float64), err_msg=message)
+            if assessment_type == 'Regression':
+                self.assertIsNone(classes)
+            else:
+                self.assertEqual(classes, sorted(classes))
+    
+    def test_binary_classification(self):
+        for labels in (['0', '1'], ['a', 'b'], ['1'], ['a']):
+            self._write('BinaryClassification', labels, seed=len(labels))
+            self._assert_matches_full('BinaryClassification', _CLASSIFICATION_METRICS)
+    
+    def test_multiclass_classification(self):
+        for labels in (['a', 'b', 'c', 'd', 'e'], ['a']):
+            self._write('MulticlassClassification', labels, seed=len(labels))
+            self._assert_matches_full('MulticlassClassification', _CLASSIFICATION_METRICS)
+    
+    def test_multilabel_classification(self):
+        self._write('MultilabelClassification', ['a', 'b', 'c', 'd', 'e'])
+        self._assert_matches_full('MultilabelClassification', _CLASSIFICATION_METRICS)
+    
+    def test_regression(self):
+        for bounds, outputs in (((0, 10), 1), ((-5, 5), 1), ((0, 10), 2)):
+            self._write('Regression', bounds, outputs=outputs)
+            self._assert_matches_full('Regression', _REGRESSION_METRICS)
+    
+    def test_confusion_matrix_of_label_indicators_fails(self):
+        self._write('MulticlassClassification', ['a', 'b', 'c'])
+        results, _ = accumulate.accumulate_metrics('MulticlassClassification', [_metric('confusion_matrix')], 
+                                                   self.predictions_path, self.ground_truth_path, 1000)
+        (status, result), = results
+        self.assertEqual(status, 'error')
+        self.assertIn('multilabel-indicator is not supported', result)
+    
+    def test_missing_labels_fail_every_metric(self):
+        with open(self.predictions_path, 'w') as writer:
+            writer.write('1,a\n2,\n3,b\n')
+        with open(self.ground_truth_path, 'w') as writer:
+            writer.write('1,a\n2,b\n3,b\n')
+        metrics = [_metric('accuracy_score'), _metric('hamming_loss')]
+        results, classes = accumulate.accumulate_metrics('MultilabelClassification', metrics, 
+                                                         self.predictions_path, self.ground_truth_path, 1000)
+        self.assertEqual([status for status, _ in results], ['error', 'error'])
+        self.assertIsNone(classes)
+    
+    def test_unsupported_arguments_not_accumulated(self):
+        self.assertFalse(accumulate.accumulates('MultilabelClassification', _metric('f1_score', average='samples')))
+        self.assertFalse(accumulate.accumulates('Regression', _metric('mean_squared_error', squared=False)))
+        self.assertFalse(accumulate.accumulates('Regression', _metric('median_absolute_error')))
+        self.assertTrue(accumulate.accumulates('Regression', _metric('r2_score', multioutput='raw_values')))
+
+
+if __name__ == '__main__':
+    unittest.main()
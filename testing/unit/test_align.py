@@ -0,0 +1,99 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.util.align
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas
+
+from mistk.evaluation.util.align import align_predictions, align_chunks
+
+
+def _frame(rows):
+    return pandas.DataFrame(rows, columns=['rowid', 'labels'])
+
+
+class AlignTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_align_predictions(self):
+        results = _frame([('3', 'c'), ('1', 'a'), ('9', 'x'), ('3', 'z'), ('2', 'b')])
+        truth = _frame([('1', 'A'), ('2', 'B'), ('3', 'C'), ('4', 'D'), ('2', 'Z')])
+        results_df, truth_df, stats = align_predictions(results, truth)
+        
+        # in the order of the predictions, keeping the first row of duplicate ids
+        self.assertEqual(results_df['rowid'].tolist(), ['3', '1', '2'])
+        self.assertEqual(results_df['labels'].tolist(), ['c', 'a', 'b'])
+        self.assertEqual(truth_df['rowid'].tolist(), ['3', '1', '2'])
+        self.assertEqual(truth_df['labels'].tolist(), ['C', 'A', 'B'])
+        self.assertEqual(list(results_df.index), [0, 1, 2])
+        self.assertEqual(stats, {'predictions': 4, 'ground_truth': 4, 'matched': 3, 
+                                 'unmatched_predictions': 1, 'unmatched_ground_truth': 1, 
+                                 'duplicate_predictions': 1, 'duplicate_ground_truth': 1})
+        # the frames passed in are left unchanged
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(truth), 5)
+    
+    def test_align_one_to_one(self):
+        results_df, truth_df, stats = align_predictions(_frame([('2', 'b'), ('1', 'a')]), 
+                                                        _frame([('1', 'A'), ('2', 'B')]))
+        self.assertEqual(truth_df['labels'].tolist(), ['B', 'A'])
+        self.assertEqual(stats['matched'], 2)
+        self.assertEqual(sum(value for key, value in stats.items() 
+                             if key.startswith(('unmatched', 'duplicate'))), 0)
+    
+    def test_align_chunks_matches_align_predictions(self):
+        results = _frame([(str(row % 40), 'p%d' % row) for row in range(45)] + [('x', 'none')])
+        truth = _frame([(str(row), 't%d' % row) for row in range(0, 50, 2)] + [('4', 'dup')])
+        expected_results, expected_truth, expected_stats = align_predictions(results, truth)
+        expected = dict(zip(expected_results['rowid'], zip(expected_results['labels'], expected_truth['labels'])))
+        
+        for partitions in (1, 4):
+            aligned = {}
+            stats = dict.fromkeys(expected_stats, 0)
+            chunks = align_chunks((results[start:start + 10] for start in range(0, len(results), 10)), 
+                                  (truth[start:start + 7] for start in range(0, len(truth), 7)), 
+                                  partitions, self.directory)
+            for results_df, truth_df, partition_stats in chunks:
+                self.assertEqual(results_df['rowid'].tolist(), truth_df['rowid'].tolist())
+                aligned.update(zip(results_df['rowid'], zip(results_df['labels'], truth_df['labels'])))
+                for key, value in partition_stats.items():
+                    stats[key] += value
+            self.assertEqual(aligned, expected)
+            self.assertEqual(stats, expected_stats)
+            # the partition files are removed
+            self.assertEqual(os.listdir(self.directory), [])
+    
+    def test_align_chunks_without_rows(self):
+        chunks = list(align_chunks(iter([]), iter([]), 3, self.directory))
+        self.assertTrue(all(len(results_df) == 0 for results_df, _, _ in chunks))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.model.batcher
+"""
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import threading
+import time
+import unittest
+
+from mistk.model.batcher import StreamPredictBatcher
+
+
+class StreamPredictBatcherTest(unittest.TestCase):
+    
+    def test_merges_concurrent_requests(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+        def predict(data_map, details):
+            calls.append(dict(data_map))
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+            return {key: value.upper() for key, value in data_map.items()}
+        batcher = StreamPredictBatcher(predict, window=0.0, max_size=10)
+        
+        results = {}
+        def submit(key):
+            results[key] = batcher.predict({key: key}, timeout=5)
+        # the first request occupies the batcher while the others queue up
+        first = threading.Thread(target=submit, args=('a',))
+        first.start()
+        self.assertTrue(started.wait(5))
+        others = [threading.Thread(target=submit, args=(key,)) for key in 'bcd']
+        for thread in others:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+        
+        self.assertEqual(results, {key: {key: key.upper()} for key in 'abcd'})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[1], {'b': 'b', 'c': 'c', 'd': 'd'})
+    
+    def test_timeout_withdraws_request(self):
+        calls = []
+        release = threading.Event()
+        def predict(data_map, details):
+            calls.append(dict(data_map))
+            release.wait(5)
+            return dict(data_map)
+        batcher = StreamPredictBatcher(predict)
+        
+        # the wedged batch times out its caller
+        with self.assertRaises(FutureTimeoutError):
+            batcher.predict({'a': 1}, timeout=0.1)
+        # a request queued behind the wedged batch times out and is never predicted
+        with self.assertRaises(FutureTimeoutError):
+            batcher.predict({'b': 2}, timeout=0.1)
+        release.set()
+        self.assertEqual(batcher.predict({'c': 3}, timeout=5), {'c': 3})
+        self.assertEqual(calls, [{'a': 1}, {'c': 3}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mistk.evaluation import cache as cache_module
+from mistk.evaluation.cache import EvaluationCache
+
+
+class EvaluationCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache')
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_put_and_get(self):
+        cache = EvaluationCache(self.path, 2**20)
+        key = cache.key('inputs', 'MulticlassClassification', False)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {'label_classes': ['a', 'b']})
+        self.assertEqual(cache.get(key), {'label_classes': ['a', 'b']})
+        self.assertEqual(cache.get(cache.key('inputs', 'MulticlassClassification', True), 'missing'), 
+                         'missing')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o700)
+        cache.clear()
+        self.assertIsNone(cache.get(key))
+    
+    def test_disabled(self):
+        cache = EvaluationCache(self.path, 0)
+        self.assertFalse(cache.enabled)
+        cache.put('key', 1)
+        self.assertIsNone(cache.get('key'))
+        self.assertFalse(os.path.exists(self.path))
+    
+    def test_least_recently_used_evicted(self):
+        cache = EvaluationCache(self.path, 2500)
+        value = b'x' * 1000
+        cache.put('aa', value)
+        cache.put('bb', value)
+        os.utime(cache._entry_path('aa'), (100, 100))
+        os.utime(cache._entry_path('bb'), (200, 200))
+        # reading an entry marks it as recently used
+        self.assertEqual(cache.get('aa'), value)
+        cache.put('cc', value)
+        self.assertIsNone(cache.get('bb'))
+        self.assertEqual(cache.get('aa'), value)
+        self.assertEqual(cache.get('cc'), value)
+    
+    def test_file_hash_follows_content(self):
+        cache = EvaluationCache(self.path, 2**20)
+        data = os.path.join(self.directory, 'predictions.csv')
+        with open(data, 'w') as writer:
+            writer.write('1,cat\n')
+        first = cache.file_hash(data)
+        self.assertEqual(cache.file_hash(data), first)
+        with open(data, 'w') as writer:
+            writer.write('1,dog\n')
+        stat = os.stat(data)
+        os.utime(data, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        second = cache.file_hash(data)
+        self.assertNotEqual(second, first)
+        self.assertNotEqual(cache.key(second, 'Regression'), cache.key(first, 'Regression'))
+    
+    def test_key_follows_schema(self):
+        cache = EvaluationCache(self.path, 2**20)
+        key = cache.key('inputs', 'Regression')
+        with mock.patch.object(cache_module, '_SCHEMA', cache_module._SCHEMA + 1):
+            self.assertNotEqual(cache.key('inputs', 'Regression'), key)
+        self.assertEqual(cache.key('inputs', 'Regression'), key)
+    
+    def test_file_hashes_bounded(self):
+        cache = EvaluationCache(self.path, 2**20)
+        paths = []
+        with mock.patch.object(cache_module, '_MAX_FILE_HASHES', 2):
+            for name in ('a', 'b', 'c'):
+                paths.append(os.path.join(self.directory, name + '.csv'))
+                with open(paths[-1], 'w') as writer:
+                    writer.write(name)
+                cache.file_hash(paths[-1])
+            # the same file is remembered once, whatever its versions
+            with open(paths[-1], 'w') as writer:
+                writer.write('changed')
+            cache.file_hash(paths[-1])
+        self.assertEqual(list(cache._file_hashes), [os.path.abspath(path) for path in paths[1:]])
+    
+    def test_unreadable_entry_discarded(self):
+        cache = EvaluationCache(self.path, 2**20)
+        cache.put('dd', 1)
+        with open(cache._entry_path('dd'), 'wb') as writer:
+            writer.write(b'not a pickle')
+        self.assertIsNone(cache.get('dd'))
+        self.assertFalse(os.path.exists(cache._entry_path('dd')))
+    
+    def test_directory_writable_by_others_not_used(self):
+        os.makedirs(self.path)
+        os.chmod(self.path, 0o777)
+        cache = EvaluationCache(self.path, 2**20)
+        self.assertFalse(cache.enabled)
+        cache.put('ee', 1)
+        self.assertEqual(os.listdir(self.path), [])
+    
+    def test_linked_directory_not_used(self):
+        target = os.path.join(self.directory, 'target')
+        os.makedirs(target, mode=0o700)
+        os.symlink(target, self.path)
+        self.assertFalse(EvaluationCache(self.path, 2**20).enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.util.convert
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from mistk.evaluation.util import convert
+
+
+class ConvertTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def _write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as writer:
+            writer.write(text)
+        return path
+    
+    def test_columns_records_match_data_records(self):
+        paths = [
+            self._write('no_header.csv', 
+                        '1,cat dog,0.90 0.1,1 2 3 4 5 6 7 8\n'
+                        '2,cat,0.5,0 0 1 1\n'
+                        '3,dog,,\n'
+                        '4,bird,0.3,\n'),
+            self._write('header.csv', 
+                        'id,labels,confidence,bounds\n'
+                        '1,cat dog,0.90 0.1,1 2 3 4 5 6 7 8\n'
+                        '2,cat,0.5,0 0 1 1\n'
+                        '3,dog,0.2,0 0 2 2\n'),
+        ]
+        for path in paths:
+            expected = convert.csv_Predictions_to_MistkDataRecord(path, 'set')
+            columns = convert.csv_Predictions_to_Columns(path)
+            self.assertEqual(len(columns), len(expected))
+            self.assertEqual(list(columns.records('set')), expected)
+            self.assertEqual(columns.records('set')[-1], expected[-1])
+            self.assertEqual(columns.records('set')[1:3], expected[1:3])
+        
+        record = convert.csv_Predictions_to_Columns(paths[0]).record(0, 'set')
+        self.assertEqual(record.values[0], {'label': 'cat', 'confidence': '0.90', 
+                                            'bounds': ['1', '2', '3', '4']})
+    
+    def test_columns_parsed_as_floats(self):
+        path = self._write('floats.csv', 
+                           '1,dog,,\n'
+                           '2,cat dog,0.90 0.1 0.5,1 2 3 4 5 6 7 8\n'
+                           '3,cat,0.5,\n'
+                           '4,bird,,0 0 1.5 1\n')
+        columns = convert.csv_Predictions_to_Columns(path)
+        self.assertEqual(columns.labels.tolist(), ['dog', 'cat', 'dog', 'cat', 'bird'])
+        self.assertEqual(columns.label_offsets.tolist(), [0, 1, 3, 4, 5])
+        self.assertEqual(columns.confidences.dtype, np.float64)
+        np.testing.assert_array_equal(columns.confidences, [np.nan, 0.9, 0.1, 0.5, np.nan])
+        self.assertEqual(columns.bounds.shape, (5, 4))
+        np.testing.assert_array_equal(columns.bounds, 
+                                      [[np.nan] * 4, [1, 2, 3, 4], [5, 6, 7, 8], 
+                                       [np.nan] * 4, [0, 0, 1.5, 1]])
+    
+    def test_values_not_numbers_rejected(self):
+        path = self._write('text.csv', '1,cat,high\n2,dog,0.8\n')
+        with self.assertRaises(ValueError):
+            convert.csv_Predictions_to_Columns(path)
+    
+    def test_short_values_rejected(self):
+        path = self._write('short.csv', '1,cat,0.9\n2,dog,0.8\n3,cat dog,0.9\n')
+        with self.assertRaises(ValueError):
+            convert.csv_Predictions_to_Columns(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
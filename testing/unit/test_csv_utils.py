@@ -0,0 +1,117 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.utils.csv_utils
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from mistk.utils import csv_utils
+
+
+class CsvUtilsTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def _write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as writer:
+            writer.write(text)
+        return path
+    
+    def _codes(self, path, columns=csv_utils._PREDICTIONS_COLUMNS):
+        return [(p['code'], p['row']) for p in csv_utils._iter_problems(path, columns)]
+    
+    def test_valid_files(self):
+        paths = [
+            self._write('no_header.csv', 
+                        '1,cat dog,0.90 0.1,1 2 3 4 5 6 7 8\n'
+                        '2,cat,0.5,0 0 1 1\n'
+                        '3,dog,,\n'),
+            self._write('header.csv', 
+                        'id,labels,confidence,bounds\n'
+                        '1,cat dog,0.90 0.1,1 2 3 4 5 6 7 8\n'
+                        '2,cat,0.5,0 0 1 1\n'
+                        '3,dog,0.2,0 0 2 2\n'),
+        ]
+        for path in paths:
+            self.assertEqual(self._codes(path), [])
+            self.assertTrue(csv_utils._validate_csv(path, csv_utils._PREDICTIONS_COLUMNS, 
+                                                    output_file=io.StringIO()))
+            self.assertTrue(csv_utils.validate_predictions_csv(path))
+    
+    def test_bad_header(self):
+        path = self._write('header.csv', 
+                           'id,labels,labels,bounds\n'
+                           '1,cat,dog,0 0 1 1\n'
+                           '2,cat,dog,0 0 2 2\n'
+                           '3,dog,cat,0 0 3 3\n')
+        self.assertEqual(self._codes(path), [('EX1', 1)])
+    
+    def test_record_length(self):
+        path = self._write('length.csv', '1,cat,0.9,0 0 1 1\n2,dog,0.8\n3,cat,0.7,0 0 1 1\n')
+        self.assertEqual(self._codes(path), [('EX2', 2)])
+    
+    def test_missing_and_duplicate_ids(self):
+        path = self._write('ids.csv', '1,cat,0.9,\n,dog,0.8,\n1,cat,0.7,\n')
+        problems = list(csv_utils._iter_problems(path, csv_utils._PREDICTIONS_COLUMNS))
+        self.assertEqual([(p['code'], p['row'], p['message']) for p in problems], 
+                         [('EX3', 2, 'missing id'), ('EX3', 3, 'duplicate id')])
+    
+    def test_confidence_not_numeric(self):
+        path = self._write('confidence.csv', '1,cat,0.9,\n2,dog,high,\n3,cat,0.7 x,\n')
+        self.assertEqual(self._codes(path), [('EX4', 2), ('EX4', 3)])
+    
+    def test_bounds_not_groups_of_four(self):
+        path = self._write('bounds.csv', '1,cat,0.9,0 0 1\n2,dog,0.8,0 0 1 a\n3,cat,0.7,0 0 1 1\n')
+        self.assertEqual(self._codes(path), [('EX5', 1), ('EX5', 2)])
+        # ground truth files have their bounds in the third column
+        path = self._write('truth.csv', '1,cat,0 0 1\n2,dog,0 0 1 1\n')
+        self.assertEqual(self._codes(path, csv_utils._GROUNDTRUTH_COLUMNS), [('EX5', 1)])
+    
+    def test_report_stops_at_max_problems(self):
+        path = self._write('ids.csv', ''.join('1,cat,0.9,\n' for _ in range(10)))
+        output = io.StringIO()
+        self.assertFalse(csv_utils._validate_csv(path, csv_utils._PREDICTIONS_COLUMNS, 
+                                                 max_problems=3, output_file=output))
+        report = output.getvalue()
+        self.assertEqual(report.count('EX3 - duplicate id'), 3)
+        self.assertIn('Found at least 3 problems in total.', report)
+    
+    def test_background_validation(self):
+        path = self._write('length.csv', '1,cat,0.9,0 0 1 1\n2,dog,0.8\n')
+        try:
+            self.assertFalse(csv_utils.validate_predictions_csv(path, background=True).result(60))
+            missing = csv_utils.validate_predictions_csv(os.path.join(self.directory, 'missing'), 
+                                                         background=True)
+            self.assertFalse(missing.result(0))
+        finally:
+            csv_utils._shutdown()
+        self.assertIsNone(csv_utils._executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
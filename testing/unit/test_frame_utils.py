@@ -0,0 +1,90 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.utils.frame_utils
+"""
+
+import io
+import struct
+import unittest
+
+import numpy as np
+
+from mistk.utils import frame_utils
+
+
+class FrameUtilsTest(unittest.TestCase):
+    
+    def test_round_trip(self):
+        data_map = {'bytes': b'\x00\x01payload', 'empty': b'', 'unicode é': b'x',
+                    'ints': np.arange(12, dtype=np.int32).reshape(3, 4),
+                    'fortran': np.asfortranarray(np.arange(6, dtype=np.float64).reshape(2, 3))}
+        decoded = frame_utils.decode_frames(frame_utils.encode_frames(data_map))
+        
+        self.assertEqual(list(decoded), list(data_map))
+        for key in ('bytes', 'empty', 'unicode é'):
+            self.assertIsInstance(decoded[key], memoryview)
+            self.assertEqual(bytes(decoded[key]), data_map[key])
+        for key in ('ints', 'fortran'):
+            np.testing.assert_array_equal(decoded[key], data_map[key])
+            self.assertEqual(decoded[key].dtype, data_map[key].dtype)
+            self.assertFalse(decoded[key].flags.writeable)
+    
+    def test_arrays_left_as_bytes(self):
+        body = frame_utils.encode_frames({'a': np.ones(3)})
+        decoded = frame_utils.decode_frames(body, arrays=False)
+        self.assertIsInstance(decoded['a'], memoryview)
+    
+    def test_payloads_are_not_copied(self):
+        body = bytearray(frame_utils.encode_frames({'a': b'abc'}))
+        decoded = frame_utils.decode_frames(body)
+        body[-1:] = b'z'
+        self.assertEqual(bytes(decoded['a']), b'abz')
+    
+    def test_duplicate_id_rejected(self):
+        body = frame_utils.encode_frames({'a': b'1'}) + frame_utils.encode_frames({'a': b'2'})
+        with self.assertRaisesRegex(ValueError, "Duplicate frame id 'a'"):
+            frame_utils.decode_frames(body)
+    
+    def test_truncated_frames_rejected(self):
+        body = frame_utils.encode_frames({'a': b'payload'})
+        with self.assertRaisesRegex(ValueError, 'truncated'):
+            frame_utils.decode_frames(body[:-1])
+        with self.assertRaisesRegex(ValueError, 'Invalid frame header'):
+            frame_utils.decode_frames(body + struct.pack('>I', 5) + b'ab')
+    
+    def test_object_arrays_rejected(self):
+        buf = io.BytesIO()
+        np.save(buf, np.array([object()]), allow_pickle=True)
+        with self.assertRaisesRegex(ValueError, 'Object arrays'):
+            frame_utils.decode_frames(frame_utils.encode_frames({'a': buf.getvalue()}))
+
+    
+    def test_truncated_npy_headers_rejected(self):
+        buf = io.BytesIO()
+        np.save(buf, np.arange(4))
+        for payload in (b'\x93NUMPY', b'\x93NUMPY\x01\x00\x05', b'\x93NUMPY\x02\x00\x05\x00',
+                        buf.getvalue()[:20]):
+            with self.assertRaisesRegex(ValueError, 'Truncated .npy header'):
+                frame_utils.decode_frames(frame_utils.encode_frames({'a': payload}))
+        with self.assertRaises(ValueError):
+            frame_utils.decode_frames(frame_utils.encode_frames({'a': buf.getvalue()[:-1]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
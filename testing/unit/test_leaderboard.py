@@ -0,0 +1,71 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.util.leaderboard
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mistk.evaluation.util import leaderboard
+
+
+class LeaderboardTest(unittest.TestCase):
+    
+    def test_set_names(self):
+        paths = ['/data/model_a/', '/data/model_b', '/other/model_a', 'model_a', '/']
+        self.assertEqual(leaderboard.set_names(paths), 
+                         ['model_a', 'model_b', 'model_a_2', 'model_a_3', 'set'])
+        # a suffixed name already used by a set is skipped
+        self.assertEqual(leaderboard.set_names(['/a/x_2', '/b/x', '/c/x']), ['x_2', 'x', 'x_3'])
+    
+    def test_rank_sets(self):
+        results = {
+            'first': {'accuracy_score': 0.9, 'log_loss': 0.4, 'mean_squared_error': 2.0, 
+                      'confusion_matrix': [[1, 0], [0, 1]], 'flag': True},
+            'second': {'accuracy_score': 0.7, 'log_loss': 0.2, 'mean_squared_error': float('nan')},
+            'third': {'accuracy_score': 0.8, 'log_loss': 'failed'},
+            'failed': None,
+        }
+        self.assertEqual(leaderboard.rank_sets(results), {
+            'accuracy_score': ['first', 'third', 'second'],
+            'log_loss': ['second', 'first'],
+            'mean_squared_error': ['first'],
+        })
+    
+    def test_write_leaderboard(self):
+        directory = tempfile.mkdtemp()
+        try:
+            sets = [('a', '/data/a', os.path.join(directory, 'a', 'eval_results_1.json'), {'r2_score': 0.5}),
+                    ('b', '/data/b', None, None)]
+            filename = leaderboard.write_leaderboard(directory, sets, 'Regression', '/truth')
+            with open(filename) as reader:
+                written = json.load(reader)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(written['assessment_type'], 'Regression')
+        self.assertEqual(written['sets']['a']['metrics'], {'r2_score': 0.5})
+        self.assertIsNone(written['sets']['b']['results_file'])
+        self.assertEqual(written['rankings'], {'r2_score': ['a']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+"""
+Unit tests of mistk.evaluation.util.matrix
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+from mistk.evaluation.util.matrix import build_confidence_matrix
+
+try:
+    import scipy.sparse
+except ImportError:
+    scipy = None
+
+
+def _reference(labels, confidences, classes):
+    matrix = np.zeros((len(labels), len(classes)))
+    for row, (row_labels, row_confidences) in enumerate(zip(labels, confidences)):
+        for label, confidence in zip(row_labels, row_confidences):
+            matrix[row, list(classes).index(label)] = float(confidence)
+    return matrix
+
+
+class MatrixTest(unittest.TestCase):
+    
+    def setUp(self):
+        rng = random.Random(0)
+        self.classes = ['a', 'b', 'c', 'd']
+        self.labels = [rng.sample(self.classes, rng.randint(0, 3)) for _ in range(50)]
+        self.confidences = [['%.2f' % rng.random() for _ in row] for row in self.labels]
+    
+    def test_dense(self):
+        matrix = build_confidence_matrix(self.labels, self.confidences, self.classes)
+        np.testing.assert_array_equal(matrix, _reference(self.labels, self.confidences, self.classes))
+    
+    @unittest.skipIf(scipy is None, 'scipy is not installed')
+    def test_sparse(self):
+        matrix = build_confidence_matrix(self.labels, self.confidences, self.classes, sparse=True)
+        self.assertTrue(scipy.sparse.issparse(matrix))
+        np.testing.assert_array_equal(matrix.toarray(), 
+                                      _reference(self.labels, self.confidences, self.classes))
+    
+    def test_repeated_label_keeps_last_confidence(self):
+        labels = [['a', 'b', 'a'], ['c']]
+        confidences = [[0.1, 0.2, 0.3], [0.4]]
+        expected = [[0.3, 0.2, 0.0], [0.0, 0.0, 0.4]]
+        np.testing.assert_array_equal(build_confidence_matrix(labels, confidences, ['a', 'b', 'c']), expected)
+        if scipy is not None:
+            matrix = build_confidence_matrix(labels, confidences, ['a', 'b', 'c'], sparse=True)
+            np.testing.assert_array_equal(matrix.toarray(), expected)
+    
+    def test_extra_confidences_ignored(self):
+        matrix = build_confidence_matrix([['b']], [[0.5, 0.9]], ['a', 'b'])
+        np.testing.assert_array_equal(matrix, [[0.0, 0.5]])
+    
+    def test_invalid_rows(self):
+        with self.assertRaises(ValueError):
+            build_confidence_matrix([['a', 'x']], [[0.1, 0.2]], ['a', 'b'])
+        with self.assertRaises(ValueError):
+            build_confidence_matrix([['a', 'b'], ['a']], [[0.1], [0.2]], ['a', 'b'])
+    
+    def test_no_rows(self):
+        self.assertEqual(build_confidence_matrix([], [], ['a', 'b']).shape, (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()